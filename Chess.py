@@ -7,6 +7,10 @@ import pygame
 import stockfish 
 import chess
 import json
+from bitboard import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PROMOTION, BB_SQUARES, square_of, row_col, move_from,
+                      move_to, move_type, promotion_type)
+from position import Position
+from movegen import generate_legal
 
 # --- Constants ---
 WIDTH, HEIGHT = 800, 800
@@ -207,27 +211,39 @@ class Piece:
         self.moves = []
 
 class Pawn(Piece):
+    piece_type = PAWN
+
     def __init__(self, color):
         self.dir = -1 if color == 'white' else 1
         super().__init__('pawn', color, 1.0)
 
 class Knight(Piece):
+    piece_type = KNIGHT
+
     def __init__(self, color):
         super().__init__('knight', color, 3.0)
 
 class Bishop(Piece):
+    piece_type = BISHOP
+
     def __init__(self, color):
         super().__init__('bishop', color, 3.001)
 
 class Rook(Piece):
+    piece_type = ROOK
+
     def __init__(self, color):
         super().__init__('rook', color, 5.0)
 
 class Queen(Piece):
+    piece_type = QUEEN
+
     def __init__(self, color):
         super().__init__('queen', color, 9.0)
 
 class King(Piece):
+    piece_type = KING
+
     def __init__(self, color):
         super().__init__('king', color, 10000.0)
 
@@ -264,6 +280,15 @@ class Move:
     def __eq__(self, other):
         return self.initial == other.initial and self.final == other.final
 
+    # Square indices (a1 = 0), as the movegen modules read moves
+    @property
+    def from_sq(self):
+        return square_of(int(self.initial.y), int(self.initial.x))
+
+    @property
+    def to_sq(self):
+        return square_of(int(self.final.y), int(self.final.x))
+
 # --- Board Class with Stockfish improvements ---
 class Board:
     def __init__(self, enable_stockfish=True, stockfish_level=10):
@@ -315,6 +340,18 @@ class Board:
         self.squares[back_row][6] = Knight(color)
         self.squares[back_row][7] = Rook(color)
 
+    def to_position(self, color):
+        """The movegen Position for this board with `color` to move."""
+        placed, moved = [], 0
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = self.squares[row][col]
+                if piece != 0:
+                    placed.append(((row, col), piece))
+                    if piece.moved:
+                        moved |= BB_SQUARES[square_of(row, col)]
+        return Position.from_squares(self.squares, color, self.last_move, placed, moved)
+
     def set_stockfish(self):
         if self.board_stockfish:
             self.board_stockfish.set_fen_position(self._board.fen())
@@ -793,11 +830,22 @@ class Game:
         self.check_game_over()
 
     def calc_all_valid_moves(self, color):
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board.squares[row][col]
+        if not self.board:
+            return
+        squares = self.board.squares
+        for row in squares:
+            for piece in row:
                 if piece != 0 and piece.color == color:
-                    self.calc_moves(piece, row, col, self.board)
+                    piece.clear_moves()
+        position = self.board.to_position(color)
+        for move in generate_legal(position):
+            # The promotion piece is picked after the pawn lands, so one move per target is enough
+            if move_type(move) == PROMOTION and promotion_type(move) != QUEEN:
+                continue
+            initial_row, initial_col = row_col(move_from(move))
+            final_row, final_col = row_col(move_to(move))
+            squares[initial_row][initial_col].add_move(
+                Move(pygame.math.Vector2(initial_col, initial_row), pygame.math.Vector2(final_col, final_row)))
 
     def calc_moves(self, piece, row, col, board):
         piece.clear_moves()
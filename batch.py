@@ -0,0 +1,122 @@
+# -- Batched evaluation --
+# Scores many positions in one go for analysis jobs, where calling evaluate()
+# once per Position spends most of its time in Python rather than arithmetic.
+# Positions travel as an N x 64 int8 array of piece codes (the Position.board
+# mailbox, a1 first) plus the side to move per row; the piece-square sums and,
+# given a network, the NNUE accumulators and layer stacks are computed for
+# all rows at once. Scores are the ones evaluate() gives the same positions.
+import numpy as np
+
+from bitboard import WHITE, BLACK, PAWN, KING, PIECE_SYMBOLS, make_piece
+from evaluate import PSQ_MG, PSQ_EG, PHASE, PHASE_MAX
+from nnue import PAWN_VALUE, _trunc_div
+from position import Position
+
+# _PSQ[piece code, square] = (midgame, endgame, phase), so one lookup serves all three sums
+_PSQ = np.stack((np.array(PSQ_MG), np.array(PSQ_EG), np.tile(np.array(PHASE)[:, None], 64)),
+                axis=-1).astype(np.int32)
+_SQUARES = np.arange(64)
+
+# FEN placement letter -> piece code, by byte value; '.' and everything else is empty
+_FEN_PIECES = np.zeros(256, dtype=np.int8)
+for _piece_type in range(PAWN, KING + 1):
+    _FEN_PIECES[ord(PIECE_SYMBOLS[_piece_type].upper())] = make_piece(WHITE, _piece_type)
+    _FEN_PIECES[ord(PIECE_SYMBOLS[_piece_type])] = make_piece(BLACK, _piece_type)
+del _piece_type
+# Digits become that many dots, and rank separators go
+_EXPAND = str.maketrans({**{str(n): '.' * n for n in range(1, 9)}, '/': None})
+
+
+def pack_fens(fens):
+    """(boards, turns) for a list of FEN strings, read without building Positions.
+
+    Only the piece placement and side to move are used; raises ValueError
+    for a placement that does not cover 64 squares.
+    """
+    placements, turns = [], np.zeros(len(fens), dtype=np.int8)
+    for row, fen in enumerate(fens):
+        parts = fen.split()
+        placement = parts[0].translate(_EXPAND)
+        if len(placement) != 64:
+            raise ValueError(f"bad FEN placement: {fen!r}")
+        placements.append(placement)
+        turns[row] = BLACK if len(parts) > 1 and parts[1] == 'b' else WHITE
+    codes = _FEN_PIECES[np.frombuffer(''.join(placements).encode('ascii'), dtype=np.uint8)]
+    # FEN lists rank 8 first; the mailbox starts at a1
+    return np.ascontiguousarray(codes.reshape(-1, 8, 8)[:, ::-1].reshape(-1, 64)), turns
+
+
+def pack(positions):
+    """(boards, turns) for a list of Positions or FEN strings: N x 64 int8 and N int8 arrays."""
+    if positions and all(isinstance(pos, str) for pos in positions):
+        return pack_fens(positions)
+    boards = np.zeros((len(positions), 64), dtype=np.int8)
+    turns = np.zeros(len(positions), dtype=np.int8)
+    for row, pos in enumerate(positions):
+        if isinstance(pos, str):
+            pos = Position(pos)
+        boards[row] = pos.board
+        turns[row] = pos.turn
+    return boards, turns
+
+
+class BatchEvaluator:
+    """evaluate() for N positions at once.
+
+    Without a network the score is evaluate.py's tapered piece-square sum;
+    with one (an nnue.Network) it is the network's, as a Position carrying
+    accumulators would get, except for positions missing a king, which keep
+    the piece-square score. Both are centipawns for the side to move.
+    """
+
+    def __init__(self, network=None):
+        self.network = network
+
+    def evaluate(self, positions, turns=None):
+        """Scores as an N int array.
+
+        positions is a list of Positions or FENs, or an N x 64 array of
+        piece codes; with an array, turns gives the side to move per row
+        (WHITE for every row when omitted).
+        """
+        if isinstance(positions, np.ndarray):
+            boards = positions
+            turns = np.full(len(boards), WHITE, dtype=np.int8) if turns is None else np.asarray(turns)
+        else:
+            boards, turns = pack(positions)
+        boards = boards.astype(np.intp)
+        if boards.ndim != 2 or boards.shape[1] != 64:
+            raise ValueError(f"expected an N x 64 array of piece codes, got shape {boards.shape}")
+        if self.network is not None:
+            return self._evaluate_nnue(boards, turns)
+        return self._evaluate_psq(boards, turns)
+
+    def _evaluate_psq(self, boards, turns):
+        mg, eg, phase = _PSQ[boards, _SQUARES].sum(axis=1).T
+        phase = np.minimum(phase, PHASE_MAX)
+        score = (mg * phase + eg * (PHASE_MAX - phase)) // PHASE_MAX
+        return np.where(turns == WHITE, score, -score)
+
+    def _evaluate_nnue(self, boards, turns):
+        # Rows missing a king keep the piece-square score, as such Positions get no accumulators
+        both_kings = (np.any(boards == make_piece(WHITE, KING), axis=1)
+                      & np.any(boards == make_piece(BLACK, KING), axis=1))
+        if both_kings.all():
+            return self._network_scores(boards, turns)
+        scores = self._evaluate_psq(boards, turns)
+        if both_kings.any():
+            scores[both_kings] = self._network_scores(boards[both_kings], turns[both_kings])
+        return scores
+
+    def _network_scores(self, boards, turns):
+        network = self.network
+        white_acc, white_psqt = network.refresh_batch(boards, WHITE)
+        black_acc, black_psqt = network.refresh_batch(boards, BLACK)
+        white_to_move = (turns == WHITE)[:, None]
+        psqt, positional = network.output(np.where(white_to_move, white_acc, black_acc),
+                                          np.where(white_to_move, black_acc, white_acc),
+                                          np.where(white_to_move, white_psqt, black_psqt),
+                                          np.where(white_to_move, black_psqt, white_psqt),
+                                          np.count_nonzero(boards, axis=1))
+        # nnue.blend, then the centipawn scale of AccumulatorStack.evaluate
+        return _trunc_div(125 * psqt + 131 * positional, 128) * 100 // PAWN_VALUE
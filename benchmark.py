@@ -0,0 +1,476 @@
+# -- Headless benchmarks for the board code --
+# Usage:
+#   python benchmark.py clone [--plies 300] [--step 25]
+#   python benchmark.py perft [--depth 3] [--suite bench|kiwipete|all] [--fen FEN] [--divide] [--no-verify]
+#                             [--workers N] [--hash MB]
+#   python benchmark.py search [--depth 4] [--time S] [--nodes N] [--fen FEN] [--hash MB] [--debug-eval]
+#                              [--syzygy DIR]
+#   python benchmark.py smp [--depth 4] [--workers 1,2,4] [--positions 8] [--fen FEN] [--hash MB]
+#   python benchmark.py features [--time 1.0] [--positions 8]
+#   python benchmark.py book [--path book.bin] [--games 100]
+#   python benchmark.py mcts [--time 1.0] [--workers 1,2,4] [--positions 8] [--fen FEN] [--no-prior]
+#   python benchmark.py nnue [--net FILE] [--positions 8] [--stockfish PATH]
+#   python benchmark.py batch [--positions 10000] [--net FILE]
+import os
+import sys
+import copy
+import time
+import argparse
+import random
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import chess
+import evaluate
+from temphf import Board, Move
+from perft import (KIWIPETE_SUITE, PerftTable, perft, divide, parallel_perft, parallel_divide, bench_positions,
+                   position_from_command, reference_perft, reference_divide)
+from search import Searcher, DEFAULT_OPTIONS
+from smp import ParallelSearcher
+from mcts import MCTS
+from bitboard import move_uci
+from book import OpeningBook
+from tbprobe import Tablebases
+from position import Position
+from movegen import generate_legal
+from nnue import Network, to_centipawns
+from batch import BatchEvaluator, pack
+
+# Knights hop out and back so a game can run to any length without ending
+KNIGHT_SHUFFLE = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+
+
+def _time_call(func, repeat=200):
+    """Best-of-five average time of func() in microseconds."""
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+
+def _play(board, uci):
+    move = Move.from_uci(uci)
+    row, col = move.initial
+    board.move(board.squares[row][col], move)
+
+
+def _deep_history_copy(board):
+    # What clone() used to pay on top of the squares: a deep copy of the history
+    copy.deepcopy(board.move_list)
+
+
+def bench_clone(plies=300, step=25):
+    """Per-call clone cost as the game grows from ply 1 to `plies`."""
+    board = Board(enable_stockfish=False)
+    print(f"{'ply':>5} {'clone':>12} {'search clone':>14} {'old history copy':>18}")
+    checkpoints = {1, plies} | set(range(step, plies + 1, step))
+    for ply in range(1, plies + 1):
+        _play(board, KNIGHT_SHUFFLE[(ply - 1) % len(KNIGHT_SHUFFLE)])
+        if ply in checkpoints:
+            shared = _time_call(board.clone)
+            search = _time_call(lambda: board.clone(history=False))
+            deep = _time_call(lambda: _deep_history_copy(board), repeat=20)
+            print(f"{ply:>5} {shared:>10.1f}us {search:>12.1f}us {deep:>16.1f}us")
+
+
+def _reference_board(command):
+    fen, _, moves = command.partition(' moves ')
+    board = chess.Board(fen)
+    for uci in moves.split():
+        board.push_uci(uci)
+    return board
+
+
+def bench_perft(depth=3, suite='all', fen=None, show_divide=False, verify=True, workers=1, hash_mb=0):
+    """Perft over the bench and Kiwipete positions; returns the number of wrong counts.
+
+    Counts are checked against the known values of the Kiwipete suite and,
+    unless verify is off, against python-chess. workers > 1 splits each
+    position across that many processes (0: one per core). hash_mb > 0 adds
+    a PerftTable of that size (one per worker when running in parallel).
+    """
+    workers = workers or os.cpu_count()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    table = PerftTable(hash_mb) if hash_mb and not executor else None
+    try:
+        return _run_perft(depth, suite, fen, show_divide, verify, executor, workers, hash_mb, table)
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def _run_perft(depth, suite, fen, show_divide, verify, executor, workers, hash_mb, table):
+    positions = []
+    if fen:
+        positions.append((fen, None))
+    else:
+        if suite in ('kiwipete', 'all'):
+            positions += [(f, counts) for f, counts in KIWIPETE_SUITE]
+        if suite in ('bench', 'all'):
+            positions += [(command, None) for command in bench_positions()]
+    print(f"{'#':>3} {'depth':>5} {'nodes':>12} {'time':>9} {'nodes/s':>10}  result")
+    total_nodes = total_time = 0
+    failures = 0
+    for index, (command, known) in enumerate(positions, 1):
+        pos_depth = min(depth, len(known)) if known else depth
+        pos = position_from_command(command)
+        start = time.perf_counter()
+        if executor:
+            nodes = parallel_perft(pos, pos_depth, executor, workers, hash_mb)
+        else:
+            nodes = perft(pos, pos_depth, table)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        expected = known[pos_depth - 1] if known else None
+        if expected is None and verify:
+            expected = reference_perft(_reference_board(command), pos_depth)
+        if expected is None:
+            result = '-'
+        elif nodes == expected:
+            result = 'ok'
+        else:
+            result = f"MISMATCH, expected {expected}"
+            failures += 1
+        print(f"{index:>3} {pos_depth:>5} {nodes:>12} {elapsed:>8.2f}s {nodes / max(elapsed, 1e-9):>10.0f}  {result}")
+        if show_divide or (expected is not None and nodes != expected):
+            _print_divide(command, pos, pos_depth, verify, executor, workers)
+    print(f"total {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nodes/s, "
+          f"{failures} mismatches")
+    if table:
+        print(f"hash: {table.entries} entries, {table.memory_bytes / 1024 / 1024:.1f} MB, "
+              f"{table.probes} probes, hit rate {table.hit_rate():.1%}, {table.used():.1%} full")
+    return failures
+
+
+def _print_divide(command, pos, depth, verify, executor=None, workers=1):
+    ours = dict(parallel_divide(pos, depth, executor, workers) if executor else divide(pos, depth))
+    theirs = dict(reference_divide(_reference_board(command), depth)) if verify else {}
+    for uci in sorted(set(ours) | set(theirs)):
+        mark = '' if not verify or ours.get(uci) == theirs.get(uci) else f"  python-chess {theirs.get(uci)}"
+        print(f"      {uci}: {ours.get(uci)}{mark}")
+
+
+def bench_search(depth=4, time_limit=None, max_nodes=None, fen=None, hash_mb=16, syzygy=None):
+    """Fixed-depth (or budgeted) searches over the bench positions.
+
+    Prints the depth reached, nodes and speed per position; nodes to reach a
+    fixed depth is the number move ordering and pruning changes should lower.
+    The transposition table (hash_mb) is kept from one position to the next.
+    With syzygy (a tablebase directory), depth 0 marks a position the tables
+    answered without a search.
+    """
+    commands = [fen] if fen else bench_positions() or [f for f, _ in KIWIPETE_SUITE]
+    tablebases = Tablebases(syzygy) if syzygy else None
+    searcher = Searcher(hash_mb, tablebases=tablebases)
+    print(f"{'#':>3} {'depth':>5} {'score':>7} {'nodes':>10} {'time':>9} {'nodes/s':>9}  best")
+    total_nodes = total_time = total_depth = 0
+    for index, command in enumerate(commands, 1):
+        pos = position_from_command(command)
+        result = searcher.search(pos, depth, max_nodes, time_limit)
+        total_nodes += result.nodes
+        total_time += result.time
+        total_depth += result.depth
+        print(f"{index:>3} {result.depth:>5} {result.score:>7} {result.nodes:>10} {result.time:>8.2f}s "
+              f"{result.nps:>9}  {move_uci(result.move) if result.move else '(none)'}")
+    print(f"total {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nodes/s, "
+          f"average depth {total_depth / len(commands):.2f}")
+    tt = searcher.tt
+    print(f"hash: {tt.entries} entries, {tt.memory_bytes / 1024 / 1024:.1f} MB, {tt.probes} probes, "
+          f"hit rate {tt.hit_rate():.1%}, {tt.collisions} collisions, hashfull {tt.hashfull()}")
+    if tablebases:
+        print(f"tablebases: {len(tablebases)} tables up to {tablebases.max_pieces} pieces, {tablebases.hits} hits")
+
+
+def bench_smp(depth=4, worker_counts=(1, 2, 4), positions=8, fen=None, hash_mb=16):
+    """Time to reach a fixed depth with the parallel search, per worker count.
+
+    Runs the first `positions` bench positions, clearing the shared table
+    before each so every worker count starts cold.
+    """
+    commands = [fen] if fen else (bench_positions() or [f for f, _ in KIWIPETE_SUITE])[:positions]
+    print(f"{os.cpu_count()} cores, depth {depth}, {len(commands)} positions")
+    print(f"{'workers':>7} {'time':>9} {'speedup':>8} {'nodes':>10} {'nodes/s':>9}")
+    base_time = None
+    for workers in worker_counts:
+        total_time = total_nodes = 0
+        with ParallelSearcher(workers, hash_mb) as searcher:
+            for command in commands:
+                searcher.clear()
+                result = searcher.search(position_from_command(command), depth)
+                total_time += result.time
+                total_nodes += result.nodes
+        base_time = base_time or total_time
+        print(f"{workers:>7} {total_time:>8.2f}s {base_time / max(total_time, 1e-9):>7.2f}x {total_nodes:>10} "
+              f"{total_nodes / max(total_time, 1e-9):>9.0f}")
+
+
+def bench_features(time_limit=1.0, positions=8):
+    """Depth reached in a fixed time with each selective search feature switched off in turn.
+
+    Rows: everything on, each feature off on its own, everything off. Each
+    configuration gets a fresh Searcher so no table carries over.
+    """
+    commands = (bench_positions() or [f for f, _ in KIWIPETE_SUITE])[:positions]
+    configurations = [('all on', {})]
+    configurations += [(f"no {name}", {name: False}) for name in DEFAULT_OPTIONS]
+    configurations.append(('all off', dict.fromkeys(DEFAULT_OPTIONS, False)))
+    print(f"{len(commands)} positions, {time_limit:g}s each")
+    print(f"{'configuration':<16} {'depth':>6} {'nodes':>10} {'nodes/s':>9}")
+    for label, options in configurations:
+        searcher = Searcher(options=options)
+        depth = nodes = elapsed = 0
+        for command in commands:
+            result = searcher.search(position_from_command(command), time_limit=time_limit)
+            depth += result.depth
+            nodes += result.nodes
+            elapsed += result.time
+        print(f"{label:<16} {depth / len(commands):>6.2f} {nodes:>10} {nodes / max(elapsed, 1e-9):>9.0f}")
+
+
+def bench_book(path='book.bin', games=100):
+    """Plays book lines from the start position until they run out.
+
+    Reports the entries in the book, the average line length in plies and
+    the time one lookup (probe plus weighted choice) takes.
+    """
+    with OpeningBook(path) as book:
+        plies = lookups = 0
+        elapsed = 0.0
+        for _ in range(games):
+            pos = Position()
+            while True:
+                start = time.perf_counter()
+                move = book.choose(pos)
+                elapsed += time.perf_counter() - start
+                lookups += 1
+                if not move:
+                    break
+                pos.make_move(move)
+                plies += 1
+        print(f"{path}: {book.entries} entries")
+        print(f"{games} games, {plies / games:.1f} book plies per game, "
+              f"{elapsed / lookups * 1e6:.1f} us per lookup")
+
+
+def bench_mcts(time_limit=1.0, worker_counts=(1, 2, 4), positions=8, fen=None, prior=True):
+    """Monte Carlo tree search throughput per worker count.
+
+    Every position gets time_limit seconds; prints total visits, visits per
+    second and the average tree size (nodes created) for each pool size.
+    """
+    commands = [fen] if fen else (bench_positions() or [f for f, _ in KIWIPETE_SUITE])[:positions]
+    print(f"{len(commands)} positions, {time_limit:g}s each, prior {'on' if prior else 'off'}")
+    print(f"{'workers':>7} {'visits':>9} {'visits/s':>9} {'tree':>9}  best moves")
+    for workers in worker_counts:
+        visits = tree_size = 0
+        elapsed = 0.0
+        best = []
+        with MCTS(workers=workers, prior=prior, seed=0) as mcts:
+            for command in commands:
+                result = mcts.search(position_from_command(command), time_limit=time_limit)
+                visits += result.visits
+                tree_size += result.tree_size
+                elapsed += result.time
+                best.append(move_uci(result.move) if result.move else '(none)')
+        print(f"{workers:>7} {visits:>9} {visits / max(elapsed, 1e-9):>9.0f} {tree_size // len(commands):>9}  "
+              f"{' '.join(best)}")
+
+
+def _stockfish_eval(stockfish, net_path, fen):
+    # The white-side 'NNUE evaluation' line of Stockfish's eval command, in centipawns
+    commands = f"uci\nsetoption name EvalFile value {net_path}\nposition fen {fen}\neval\nquit\n"
+    output = subprocess.run([stockfish], input=commands, capture_output=True, text=True, timeout=30).stdout
+    for line in output.splitlines():
+        if line.startswith('NNUE evaluation'):
+            return round(float(line.split()[2]) * 100)
+    return None
+
+
+def bench_nnue(net_path='nn-1c0000000000.nnue', positions=8, stockfish=None):
+    """NNUE load time and evaluations per second, against the classical evaluation.
+
+    Every legal move of each position is played and evaluated: incrementally
+    (the accumulators the search uses), from scratch, and by evaluate.py's
+    piece-square tables. With stockfish (a binary), each position's white-side
+    evaluation is compared with Stockfish's own 'eval' on the same network.
+    """
+    start = time.perf_counter()
+    network = Network(net_path)
+    print(f"{network!r} loaded in {time.perf_counter() - start:.2f}s")
+    commands = (bench_positions() or [f for f, _ in KIWIPETE_SUITE])[:positions]
+    timings = {'incremental': 0.0, 'from scratch': 0.0, 'classical': 0.0}
+    evals = 0
+    for command in commands:
+        pos = position_from_command(command)
+        moves = generate_legal(pos)
+        evals += len(moves)
+        classical = pos.copy()
+        start = time.perf_counter()
+        for move in moves:
+            classical.make_move(move)
+            evaluate.evaluate(classical)
+            classical.unmake_move()
+        timings['classical'] += time.perf_counter() - start
+        start = time.perf_counter()
+        for move in moves:
+            pos.make_move(move)
+            network.evaluate(pos)
+            pos.unmake_move()
+        timings['from scratch'] += time.perf_counter() - start
+        pos.accumulators = network.new_accumulators(pos)
+        start = time.perf_counter()
+        for move in moves:
+            pos.make_move(move)
+            evaluate.evaluate(pos)
+            pos.unmake_move()
+        timings['incremental'] += time.perf_counter() - start
+    print(f"{len(commands)} positions, {evals} evaluations")
+    for label, elapsed in timings.items():
+        print(f"{label:<13} {evals / max(elapsed, 1e-9):>9.0f} evals/s")
+    if not stockfish:
+        return 0
+    mismatches = 0
+    for command in commands:
+        pos = position_from_command(command)
+        if pos.is_check():
+            continue  # Stockfish's eval command does not evaluate positions in check
+        psqt, positional = network.evaluate(pos)
+        ours = to_centipawns(psqt + positional, pos) * (1 if pos.turn == 0 else -1)
+        theirs = _stockfish_eval(stockfish, os.path.abspath(net_path), pos.fen())
+        mark = '' if ours == theirs else '  MISMATCH'
+        mismatches += ours != theirs
+        print(f"  {ours:>6} {theirs if theirs is not None else '?':>6}{mark}  {pos.fen()}")
+    print(f"{mismatches} mismatches against Stockfish")
+    return 1 if mismatches else 0
+
+
+def _random_positions(count, seed=0):
+    # Positions from random games out of the start position, one per ply played
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        pos = Position()
+        for _ in range(200):
+            moves = generate_legal(pos)
+            if not moves or len(positions) == count:
+                break
+            pos.make_move(rng.choice(moves))
+            positions.append(pos.copy())
+    return positions
+
+
+def bench_batch(positions=10000, net_path=None):
+    """Positions per second for BatchEvaluator against evaluate() one position at a time.
+
+    The positions come from random games and are given as FENs, as analysis
+    jobs have them. The scalar path builds a Position per FEN and evaluates
+    it (through fresh accumulators, with a network); the batch path packs
+    all FENs into one array and evaluates that. Both must agree.
+    """
+    network = Network(net_path) if net_path else None
+    fens = [pos.fen() for pos in _random_positions(positions)]
+    print(f"{len(fens)} positions, {repr(network) if network else 'piece-square tables'}")
+    start = time.perf_counter()
+    scalar = []
+    for fen in fens:
+        pos = Position(fen)
+        if network:
+            pos.accumulators = network.new_accumulators(pos)
+        scalar.append(evaluate.evaluate(pos))
+    scalar_time = time.perf_counter() - start
+    evaluator = BatchEvaluator(network)
+    start = time.perf_counter()
+    boards, turns = pack(fens)
+    pack_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = evaluator.evaluate(boards, turns)
+    batch_time = time.perf_counter() - start
+    mismatches = sum(1 for ours, theirs in zip(batched, scalar) if ours != theirs)
+    print(f"{'scalar':<16} {len(fens) / max(scalar_time, 1e-9):>11.0f} positions/s")
+    print(f"{'batch':<16} {len(fens) / max(pack_time + batch_time, 1e-9):>11.0f} positions/s "
+          f"({pack_time:.3f}s packing, {batch_time:.3f}s evaluating)")
+    print(f"speed-up {scalar_time / max(pack_time + batch_time, 1e-9):.1f}x, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the chess board code.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    clone_parser = sub.add_parser('clone', help="Board.clone cost against game length")
+    clone_parser.add_argument('--plies', type=int, default=300)
+    clone_parser.add_argument('--step', type=int, default=25)
+    perft_parser = sub.add_parser('perft', help="move generator node counts and speed")
+    perft_parser.add_argument('--depth', type=int, default=3)
+    perft_parser.add_argument('--suite', choices=['bench', 'kiwipete', 'all'], default='all')
+    perft_parser.add_argument('--fen', help="a single position, optionally followed by 'moves ...'")
+    perft_parser.add_argument('--divide', action='store_true', help="print counts per root move")
+    perft_parser.add_argument('--no-verify', dest='verify', action='store_false',
+                              help="skip the python-chess cross-check")
+    perft_parser.add_argument('--workers', type=int, default=1,
+                              help="processes to split each position across (0: one per core)")
+    perft_parser.add_argument('--hash', type=int, default=0, metavar='MB',
+                              help="perft cache size in MB (0: off)")
+    search_parser = sub.add_parser('search', help="native engine search depth, nodes and speed")
+    search_parser.add_argument('--depth', type=int, default=4)
+    search_parser.add_argument('--time', type=float, help="seconds per position")
+    search_parser.add_argument('--nodes', type=int, help="node budget per position")
+    search_parser.add_argument('--fen', help="a single position, optionally followed by 'moves ...'")
+    search_parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table size in MB")
+    search_parser.add_argument('--debug-eval', action='store_true',
+                               help="check the incremental evaluation against a recount at every leaf")
+    search_parser.add_argument('--syzygy', metavar='DIR', help="Syzygy tablebase directory")
+    smp_parser = sub.add_parser('smp', help="parallel search time-to-depth per worker count")
+    smp_parser.add_argument('--depth', type=int, default=4)
+    smp_parser.add_argument('--workers', default='1,2,4', help="comma-separated worker counts")
+    smp_parser.add_argument('--positions', type=int, default=8)
+    smp_parser.add_argument('--fen', help="a single position, optionally followed by 'moves ...'")
+    smp_parser.add_argument('--hash', type=int, default=16, metavar='MB', help="shared table size in MB")
+    features_parser = sub.add_parser('features', help="depth reached per search feature, on and off")
+    features_parser.add_argument('--time', type=float, default=1.0, help="seconds per position")
+    features_parser.add_argument('--positions', type=int, default=8)
+    book_parser = sub.add_parser('book', help="opening book line length and lookup speed")
+    book_parser.add_argument('--path', default='book.bin', help="Polyglot .bin file")
+    book_parser.add_argument('--games', type=int, default=100)
+    mcts_parser = sub.add_parser('mcts', help="Monte Carlo tree search visits per second per worker count")
+    mcts_parser.add_argument('--time', type=float, default=1.0, help="seconds per position")
+    mcts_parser.add_argument('--workers', default='1,2,4', help="comma-separated rollout pool sizes")
+    mcts_parser.add_argument('--positions', type=int, default=8)
+    mcts_parser.add_argument('--fen', help="a single position, optionally followed by 'moves ...'")
+    mcts_parser.add_argument('--no-prior', dest='prior', action='store_false',
+                             help="expand moves in random order instead of by evaluation")
+    nnue_parser = sub.add_parser('nnue', help="NNUE evaluation speed, optionally checked against Stockfish")
+    nnue_parser.add_argument('--net', default='nn-1c0000000000.nnue', help="Stockfish .nnue file")
+    nnue_parser.add_argument('--positions', type=int, default=8)
+    nnue_parser.add_argument('--stockfish', metavar='PATH', help="Stockfish binary to compare evaluations with")
+    batch_parser = sub.add_parser('batch', help="batched evaluation throughput against the scalar path")
+    batch_parser.add_argument('--positions', type=int, default=10000)
+    batch_parser.add_argument('--net', help="Stockfish .nnue file (default: piece-square tables)")
+    args = parser.parse_args(argv)
+    if args.command == 'clone':
+        bench_clone(args.plies, args.step)
+    elif args.command == 'perft':
+        return 1 if bench_perft(args.depth, args.suite, args.fen, args.divide, args.verify, args.workers,
+                                args.hash) else 0
+    elif args.command == 'search':
+        evaluate.DEBUG = args.debug_eval
+        bench_search(args.depth, args.time, args.nodes, args.fen, args.hash, args.syzygy)
+    elif args.command == 'features':
+        bench_features(args.time, args.positions)
+    elif args.command == 'book':
+        bench_book(args.path, args.games)
+    elif args.command == 'mcts':
+        bench_mcts(args.time, [int(n) for n in args.workers.split(',')], args.positions, args.fen, args.prior)
+    elif args.command == 'nnue':
+        return bench_nnue(args.net, args.positions, args.stockfish)
+    elif args.command == 'batch':
+        return bench_batch(args.positions, args.net)
+    elif args.command == 'smp':
+        bench_smp(args.depth, [int(n) for n in args.workers.split(',')], args.positions, args.fen, args.hash)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# -- Bitboard primitives --
+# Squares are numbered a1 = 0 ... h8 = 63 (the python-chess / Stockfish layout).
+# Board.squares is indexed [row][col] with row 0 on rank 8, so use square_of()
+# and row_col() to move between the two.
+
+# --- Colors and piece types ---
+WHITE, BLACK = 0, 1
+NO_PIECE_TYPE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+ALL_PIECES = 0
+PIECE_TYPE_NAMES = (None, 'pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+PIECE_TYPE_FROM_NAME = {name: pt for pt, name in enumerate(PIECE_TYPE_NAMES) if name}
+COLOR_NAMES = ('white', 'black')
+PIECE_SYMBOLS = '.pnbrqk'
+# Material in pawns, indexed by piece type (Piece.value is signed by color)
+PIECE_VALUES = (0.0, 1.0, 3.0, 3.001, 5.0, 9.0, 10000.0)
+
+# A piece code packs color and type the way Stockfish does: (color << 3) | type
+NO_PIECE = 0
+
+def make_piece(color, piece_type):
+    return (color << 3) | piece_type
+
+def color_of(piece):
+    return piece >> 3
+
+def type_of(piece):
+    return piece & 7
+
+# --- Basic bitboards ---
+BB_EMPTY = 0
+BB_ALL = (1 << 64) - 1
+BB_SQUARES = [1 << sq for sq in range(64)]
+BB_FILES = [0x0101010101010101 << f for f in range(8)]
+BB_RANKS = [0xFF << (8 * r) for r in range(8)]
+BB_FILE_A, BB_FILE_H = BB_FILES[0], BB_FILES[7]
+BB_RANK_1, BB_RANK_2, BB_RANK_7, BB_RANK_8 = BB_RANKS[0], BB_RANKS[1], BB_RANKS[6], BB_RANKS[7]
+
+def square(file, rank):
+    return rank * 8 + file
+
+def square_file(sq):
+    return sq & 7
+
+def square_rank(sq):
+    return sq >> 3
+
+def square_of(row, col):
+    """Square index for a Board.squares (row, col) pair."""
+    return (7 - row) * 8 + col
+
+def row_col(sq):
+    """Board.squares (row, col) pair for a square index."""
+    return 7 - (sq >> 3), sq & 7
+
+def square_name(sq):
+    return chr(97 + (sq & 7)) + str((sq >> 3) + 1)
+
+def parse_square(name):
+    return square(ord(name[0]) - 97, int(name[1]) - 1)
+
+# Precomputed per square so hot paths avoid the arithmetic and string building
+SQUARE_ROW_COL = [row_col(sq) for sq in range(64)]
+SQUARE_NAMES = [square_name(sq) for sq in range(64)]
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+def msb(bb):
+    return bb.bit_length() - 1
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+def scan_forward(bb):
+    while bb:
+        r = bb & -bb
+        yield r.bit_length() - 1
+        bb ^= r
+
+# --- Step attack tables ---
+def _step_attacks(sq, deltas):
+    f, r = sq & 7, sq >> 3
+    bb = 0
+    for df, dr in deltas:
+        nf, nr = f + df, r + dr
+        if 0 <= nf < 8 and 0 <= nr < 8:
+            bb |= 1 << (nr * 8 + nf)
+    return bb
+
+KNIGHT_ATTACKS = [_step_attacks(sq, [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+                  for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+                for sq in range(64)]
+PAWN_ATTACKS = [
+    [_step_attacks(sq, [(-1, 1), (1, 1)]) for sq in range(64)],
+    [_step_attacks(sq, [(-1, -1), (1, -1)]) for sq in range(64)],
+]
+
+# --- Sliding attacks (classical rays with per-square memoisation) ---
+# Directions that increase the square index find their first blocker with lsb,
+# the others with msb.
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+_DIRECTION_DELTAS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+
+def _ray(sq, df, dr):
+    f, r = (sq & 7) + df, (sq >> 3) + dr
+    bb = 0
+    while 0 <= f < 8 and 0 <= r < 8:
+        bb |= 1 << (r * 8 + f)
+        f, r = f + df, r + dr
+    return bb
+
+RAYS = [[_ray(sq, df, dr) for sq in range(64)] for df, dr in _DIRECTION_DELTAS]
+ROOK_DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_WEST, SOUTH_EAST)
+
+def _slide(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            blocker = (blockers & -blockers).bit_length() - 1 if d < SOUTH else blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+def _relevant_mask(sq, directions):
+    # The last square of each ray never changes the attack set, so leaving it
+    # out keeps the number of distinct table keys small.
+    mask = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        if ray:
+            edge = (ray & -ray).bit_length() - 1 if d >= SOUTH else ray.bit_length() - 1
+            mask |= ray & ~(1 << edge)
+    return mask
+
+# BETWEEN[a][b]: squares strictly between two aligned squares.
+# LINE[a][b]: the whole line through two aligned squares. Both are 0 otherwise.
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _a in range(64):
+    for _d in range(8):
+        _line = RAYS[_d][_a] | RAYS[_d ^ 4][_a] | (1 << _a)
+        _ray_bb = RAYS[_d][_a]
+        while _ray_bb:
+            _b = (_ray_bb & -_ray_bb).bit_length() - 1
+            _ray_bb &= _ray_bb - 1
+            BETWEEN[_a][_b] = RAYS[_d][_a] & ~RAYS[_d][_b] & ~(1 << _b)
+            LINE[_a][_b] = _line
+del _a, _d, _b, _line, _ray_bb
+
+ROOK_MASKS = [_relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+_ROOK_TABLE = [{} for _ in range(64)]
+_BISHOP_TABLE = [{} for _ in range(64)]
+
+def rook_attacks(sq, occupied):
+    key = occupied & ROOK_MASKS[sq]
+    table = _ROOK_TABLE[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+def bishop_attacks(sq, occupied):
+    key = occupied & BISHOP_MASKS[sq]
+    table = _BISHOP_TABLE[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+def queen_attacks(sq, occupied):
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+def attacks_bb(piece_type, sq, occupied):
+    """Attack set of a non-pawn piece standing on sq."""
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if piece_type == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(sq, occupied)
+    if piece_type == QUEEN:
+        return queen_attacks(sq, occupied)
+    return KING_ATTACKS[sq]
+
+# --- Move encoding ---
+# Moves are 16-bit ints laid out like Stockfish's Move: bits 0-5 destination,
+# bits 6-11 origin, bits 12-13 promotion piece (knight..queen), bits 14-15 the
+# move type. Castling is stored as the king's two-square step (e1g1), which is
+# also its UCI text.
+MOVE_NONE = 0
+NORMAL = 0
+PROMOTION = 1 << 14
+EN_PASSANT = 2 << 14
+CASTLING = 3 << 14
+
+def make_move(from_sq, to_sq, move_type=NORMAL, promotion=KNIGHT):
+    return move_type | ((promotion - KNIGHT) << 12) | (from_sq << 6) | to_sq
+
+def move_from(move):
+    return (move >> 6) & 63
+
+def move_to(move):
+    return move & 63
+
+def move_type(move):
+    return move & (3 << 14)
+
+def promotion_type(move):
+    return ((move >> 12) & 3) + KNIGHT
+
+def move_uci(move):
+    uci = square_name((move >> 6) & 63) + square_name(move & 63)
+    if move & (3 << 14) == PROMOTION:
+        uci += PIECE_SYMBOLS[((move >> 12) & 3) + KNIGHT]
+    return uci
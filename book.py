@@ -0,0 +1,100 @@
+# -- Polyglot opening books --
+# A .bin book is a sorted array of 16-byte big-endian entries: position key,
+# move, weight and a learn field nobody uses. The file is memory-mapped and
+# searched in place, so even a large book opens instantly and costs no memory
+# beyond the pages a lookup touches. Keys are the Zobrist keys Position keeps
+# (zobrist.py uses Polyglot's numbers).
+import mmap
+import os
+import random
+import struct
+
+from bitboard import MOVE_NONE, PROMOTION, CASTLING
+from movegen import generate_legal
+
+_ENTRY = struct.Struct('>QHHI')  # key, move, weight, learn
+_KEY = struct.Struct('>Q')
+
+
+def polyglot_move(move):
+    """The Polyglot encoding of a packed move.
+
+    Same from/to bits; promotions count knight as 1 up to queen as 4 in bits
+    12-14, and castling is written as the king taking its own rook.
+    """
+    from_sq, to_sq = (move >> 6) & 63, move & 63
+    kind = move & (3 << 14)
+    if kind == CASTLING:
+        to_sq = (to_sq & 56) | (7 if to_sq > from_sq else 0)
+    elif kind == PROMOTION:
+        return (((move >> 12) & 3) + 1) << 12 | from_sq << 6 | to_sq
+    return from_sq << 6 | to_sq
+
+
+class OpeningBook:
+    """A Polyglot book file, opened read-only.
+
+    moves(pos) lists the book moves for a position as legal packed moves;
+    choose(pos) picks one at random in proportion to the weights. Entries
+    whose move is not legal in the position (a key collision or a broken
+    book) are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self.entries = size // _ENTRY.size
+        # mmap refuses empty files; an empty book simply has no moves
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.entries else None
+
+    def _lower_bound(self, key):
+        # Index of the first entry whose key is not below key
+        lo, hi = 0, self.entries
+        data = self._map
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(data, mid * _ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def entries_for(self, key):
+        """(polyglot move, weight) pairs stored for key, in file order."""
+        if self._map is None:
+            return []
+        found = []
+        for index in range(self._lower_bound(key), self.entries):
+            entry_key, move, weight, _ = _ENTRY.unpack_from(self._map, index * _ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+        return found
+
+    def moves(self, pos):
+        """(packed move, weight) for every legal book move in pos."""
+        entries = self.entries_for(pos.key)
+        if not entries:
+            return []
+        legal = {polyglot_move(move): move for move in generate_legal(pos)}
+        return [(legal[move], weight) for move, weight in entries if move in legal]
+
+    def choose(self, pos, rng=random):
+        """A book move for pos, weighted by the book; MOVE_NONE when out of book."""
+        moves = [(move, weight) for move, weight in self.moves(pos) if weight]
+        if not moves:
+            return MOVE_NONE
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
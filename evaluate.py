@@ -0,0 +1,166 @@
+# -- Static evaluation: material plus piece-square tables --
+# Scores are in centipawns from the side to move's point of view, as the
+# search expects. Material is PIECE_VALUES (the values behind Piece.value).
+# Every piece has a midgame and an endgame score; the two are blended by how
+# much non-pawn material is left (the game phase). Position keeps the sums up
+# to date in make_move/unmake_move, so evaluate() does no board scan. A
+# position given NNUE accumulators (nnue.py) is scored by the network instead.
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_VALUES, make_piece
+
+# Set to check every incremental evaluation against a full recount
+DEBUG = False
+
+# Centipawns per piece type; the king is never traded so it carries no material
+MATERIAL = [int(value * 100) for value in PIECE_VALUES[:KING]] + [0]
+
+# Phase weight per piece type; the starting position has PHASE_MAX
+PHASE_WEIGHT = (0, 0, 1, 1, 2, 4, 0)
+PHASE_MAX = 24
+
+# Piece-square bonuses for white, laid out as the board is drawn (rank 8 first).
+# These are the "simplified evaluation function" tables from chessprogramming.org.
+_MIDGAME_TABLES = {
+    PAWN: (
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0,
+    ),
+    KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    ROOK: (
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0,
+    ),
+    QUEEN: (
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+    ),
+    KING: (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20,
+    ),
+}
+
+# In the endgame pawns are worth more the closer they are to promoting and the
+# king belongs in the centre; the other pieces keep their midgame tables
+_ENDGAME_TABLES = dict(_MIDGAME_TABLES)
+_ENDGAME_TABLES[PAWN] = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+_ENDGAME_TABLES[KING] = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+
+def _psq_table(tables):
+    # table[piece code][square]: material plus bonus, signed from white's side
+    table = [[0] * 64 for _ in range(16)]
+    for piece_type, bonus in tables.items():
+        for sq in range(64):
+            # The tables list rank 8 first; sq ^ 56 flips a1-based squares to that order
+            table[make_piece(WHITE, piece_type)][sq] = MATERIAL[piece_type] + bonus[sq ^ 56]
+            table[make_piece(BLACK, piece_type)][sq] = -(MATERIAL[piece_type] + bonus[sq])
+    return table
+
+
+PSQ_MG = _psq_table(_MIDGAME_TABLES)
+PSQ_EG = _psq_table(_ENDGAME_TABLES)
+# PHASE[piece code], so make_move can look it up without splitting the code
+PHASE = [0] * 16
+for _piece_type in range(PAWN, KING + 1):
+    PHASE[make_piece(WHITE, _piece_type)] = PHASE[make_piece(BLACK, _piece_type)] = PHASE_WEIGHT[_piece_type]
+del _piece_type
+
+
+def psq_totals(board):
+    """(midgame, endgame, phase) sums for a 64-entry mailbox, counted from scratch."""
+    mg = eg = phase = 0
+    for sq, piece in enumerate(board):
+        if piece:
+            mg += PSQ_MG[piece][sq]
+            eg += PSQ_EG[piece][sq]
+            phase += PHASE[piece]
+    return mg, eg, phase
+
+
+def _tapered(mg, eg, phase):
+    phase = min(phase, PHASE_MAX)  # extra queens from promotion do not go past the opening
+    return (mg * phase + eg * (PHASE_MAX - phase)) // PHASE_MAX
+
+
+def evaluate(pos):
+    """Static score of pos for the side to move, in centipawns.
+
+    Reads the sums Position maintains. With DEBUG set, they are checked
+    against a recount of the board first.
+    """
+    if pos.accumulators is not None:
+        return pos.accumulators.evaluate(pos)
+    if DEBUG:
+        totals = psq_totals(pos.board)
+        if totals != (pos.psq_mg, pos.psq_eg, pos.phase):
+            raise AssertionError(f"incremental evaluation {(pos.psq_mg, pos.psq_eg, pos.phase)} "
+                                 f"!= {totals} in {pos.fen()}")
+    score = _tapered(pos.psq_mg, pos.psq_eg, pos.phase)
+    return score if pos.turn == WHITE else -score
+
+
+def evaluate_from_scratch(pos):
+    """evaluate() recomputed from the board alone, for checking and comparison."""
+    score = _tapered(*psq_totals(pos.board))
+    return score if pos.turn == WHITE else -score
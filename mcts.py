@@ -0,0 +1,279 @@
+# -- Monte Carlo tree search --
+# A second native opponent, with a different style from the alpha-beta search
+# in search.py: the tree grows towards the moves that have won the most
+# random playouts (UCT: upper confidence bounds applied to trees). Playouts
+# are cut short after a few plies and scored from the static evaluation,
+# since purely random chess games say little about the position they start
+# from. Each round selects a batch of leaves and plays them out together, in
+# a process pool when there are several workers.
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import MOVE_NONE, move_uci
+from evaluate import evaluate
+from movegen import generate_legal
+from position import Position
+
+# Centipawns a rollout's final evaluation is divided by before the logistic
+# curve turns it into a win probability (400 is the Elo scale)
+WIN_PROBABILITY_SCALE = 400
+# Temperature of the softmax that turns evaluations into move priors, in centipawns
+PRIOR_TEMPERATURE = 100
+
+
+def win_probability(score):
+    """Expected result, 0..1, for the side with this centipawn score."""
+    return 1 / (1 + 10 ** (-score / WIN_PROBABILITY_SCALE))
+
+
+def rollout(pos, plies, rng=random):
+    """Random playout of at most `plies` moves from pos, which is changed.
+
+    Returns the result for the side to move at the start: 1 win, 0 loss,
+    0.5 draw, or the evaluation's win probability if the game goes on.
+    """
+    for ply in range(plies + 1):
+        moves = generate_legal(pos)
+        if not moves:
+            result = 0.0 if pos.is_check() else 0.5
+        elif pos.halfmove_clock >= 100:
+            result = 0.5
+        elif ply == plies:
+            result = win_probability(evaluate(pos))
+        else:
+            pos.make_move(rng.choice(moves))
+            continue
+        # result is for the side to move now; flip it back for every ply played
+        return result if ply % 2 == 0 else 1 - result
+
+
+def _rollout_fen(fen, plies, seed):
+    # Worker process entry point: positions travel as FEN strings
+    return rollout(Position(fen), plies, random.Random(seed))
+
+
+class Node:
+    """One position in the tree, reached by `move` from `parent`.
+
+    `wins` are counted for the side that played `move`, so a parent picks
+    the child with the best wins / visits. `prior` is the share of the
+    parent's attention the evaluation gives this move before any visit.
+    """
+    __slots__ = ('move', 'parent', 'children', 'visits', 'wins', 'prior', 'terminal')
+
+    def __init__(self, move=MOVE_NONE, parent=None, prior=1.0):
+        self.move = move
+        self.parent = parent
+        self.children = None  # None until expanded
+        self.visits = 0
+        self.wins = 0.0
+        self.prior = prior
+        self.terminal = None  # the result for the side to move, once known to be game over
+
+    def expand(self, pos, use_prior, rng):
+        """Create a child per legal move; priors from a softmax over the moves' evaluations."""
+        moves = generate_legal(pos)
+        if not moves:
+            self.terminal = 0.0 if pos.is_check() else 0.5
+            self.children = []
+            return
+        if use_prior:
+            scores = []
+            for move in moves:
+                pos.make_move(move)
+                scores.append(-evaluate(pos))
+                pos.unmake_move()
+            top = max(scores)
+            weights = [math.exp((score - top) / PRIOR_TEMPERATURE) for score in scores]
+            total = sum(weights)
+            # Unvisited children are tried best prior first
+            order = sorted(range(len(moves)), key=weights.__getitem__, reverse=True)
+            self.children = [Node(moves[i], self, weights[i] / total) for i in order]
+        else:
+            rng.shuffle(moves)
+            self.children = [Node(move, self, 1 / len(moves)) for move in moves]
+
+    def select(self, exploration, prior_weight):
+        """The child to descend into: the first unvisited one, else the best UCT score."""
+        log_visits = math.log(self.visits)
+        best, best_score = None, -1.0
+        for child in self.children:
+            if not child.visits:
+                return child
+            score = (child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+                     + prior_weight * child.prior / (1 + child.visits))
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+
+class MCTSResult:
+    """The most visited root move, with the tree's statistics."""
+    __slots__ = ('move', 'win_rate', 'visits', 'tree_size', 'rollouts', 'time', 'pv')
+
+    def __init__(self, move=MOVE_NONE, win_rate=0.5, visits=0, tree_size=1, rollouts=0, time=0.0, pv=()):
+        self.move = move
+        self.win_rate = win_rate
+        self.visits = visits
+        self.tree_size = tree_size
+        self.rollouts = rollouts
+        self.time = time
+        self.pv = list(pv)
+
+    @property
+    def visits_per_second(self):
+        return int(self.visits / self.time) if self.time else 0
+
+    def __repr__(self):
+        pv = ' '.join(move_uci(move) for move in self.pv)
+        return (f"MCTSResult(visits={self.visits}, tree_size={self.tree_size}, win_rate={self.win_rate:.3f}, "
+                f"pv='{pv}')")
+
+
+class MCTS:
+    """UCT search over a Position, with rollouts spread over `workers` processes.
+
+    Each round descends `batch` times (default: four per worker) and plays
+    the new leaves out together. A descent adds a visit with no win to
+    every node on its way down (a virtual loss), so the rest of the batch
+    spreads over other lines; the real results are added once the rollouts
+    are back. With `prior`, children start from a softmax over their static
+    evaluations, so good-looking moves are visited first and more often.
+    One worker (the default) plays out in this process; more keep a pool
+    alive until close().
+    """
+
+    def __init__(self, workers=1, exploration=1.4, prior=True, prior_weight=1.0, rollout_plies=16, batch=None,
+                 seed=None):
+        self.workers = workers or os.cpu_count()
+        self.exploration = exploration
+        self.prior = prior
+        self.prior_weight = prior_weight if prior else 0.0
+        self.rollout_plies = rollout_plies
+        self.batch = batch or 4 * self.workers
+        self.rng = random.Random(seed)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.tree_size = 0
+        self.rollouts = 0
+        self._history = {}
+
+    def search(self, pos, time_limit=None, max_visits=None, history=None):
+        """Best move for pos as an MCTSResult; pos itself is not changed.
+
+        Stops after time_limit seconds or max_visits playouts, whichever
+        comes first; with neither, after 1000 playouts. history holds the
+        keys of earlier game positions (Board.repetitions), as for
+        Searcher.search: a tree node that repeats one is a draw.
+        """
+        if time_limit is None and max_visits is None:
+            max_visits = 1000
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit else None
+        pos = pos.copy()
+        self._history = history or {}
+        root = Node()
+        root.expand(pos, self.prior, self.rng)
+        self.tree_size, self.rollouts = 1 + len(root.children), 0
+        if not root.children:
+            return MCTSResult(win_rate=root.terminal)
+        if len(root.children) == 1:
+            return MCTSResult(root.children[0].move, time=time.perf_counter() - start, pv=[root.children[0].move])
+        while True:
+            batch = self.batch
+            if max_visits:
+                batch = min(batch, max_visits - root.visits)
+            self._round(pos, root, batch)
+            if max_visits and root.visits >= max_visits:
+                break
+            if deadline and time.perf_counter() >= deadline:
+                break
+        best = max(root.children, key=lambda child: child.visits)
+        return MCTSResult(best.move, best.wins / best.visits, root.visits, self.tree_size, self.rollouts,
+                          time.perf_counter() - start, self._principal_variation(root))
+
+    def _round(self, pos, root, batch):
+        """Select up to `batch` leaves under virtual loss, play them out and back the results up."""
+        leaves, fens, results = [], [], []
+        for _ in range(batch):
+            node = root
+            node.visits += 1
+            keys = []  # keys of the positions on the way down, root first
+            while node.children:
+                node = node.select(self.exploration, self.prior_weight)
+                keys.append(pos.key)
+                pos.make_move(node.move)
+                node.visits += 1
+            if node.terminal is None and keys and self._repeated(pos, keys):
+                node.terminal = 0.5
+            if node.terminal is None and node.visits > 1:
+                # Visited before: grow the tree one level here and play out from a new child
+                node.expand(pos, self.prior, self.rng)
+                self.tree_size += len(node.children)
+                if node.children:
+                    node = node.select(self.exploration, self.prior_weight)
+                    keys.append(pos.key)
+                    pos.make_move(node.move)
+                    node.visits += 1
+                    if self._repeated(pos, keys):
+                        node.terminal = 0.5
+            if node.terminal is not None:
+                results.append(node.terminal)
+            elif pos.halfmove_clock >= 100:
+                node.terminal = 0.5
+                results.append(0.5)
+            else:
+                results.append(None)
+                fens.append(pos.fen())
+            leaves.append(node)
+            for _ in keys:
+                pos.unmake_move()
+        self.rollouts += len(fens)
+        seeds = [self.rng.getrandbits(32) for _ in fens]
+        if self._executor:
+            played_out = iter(self._executor.map(_rollout_fen, fens, [self.rollout_plies] * len(fens), seeds,
+                                                 chunksize=max(1, len(fens) // self.workers)))
+        else:
+            played_out = iter(_rollout_fen(fen, self.rollout_plies, seed) for fen, seed in zip(fens, seeds))
+        for node, result in zip(leaves, results):
+            if result is None:
+                result = next(played_out)
+            # result is for the side to move at the leaf, who did not play node.move
+            result = 1 - result
+            while node is not None:
+                node.wins += result
+                result = 1 - result
+                node = node.parent
+
+    def _repeated(self, pos, keys):
+        # As Searcher._is_draw: a game position since the last capture or pawn move, or one
+        # earlier on this path, two or more moves back
+        ply, key = len(keys), pos.key
+        if pos.halfmove_clock >= ply and key in self._history:
+            return True
+        for i in range(ply - 4, max(ply - pos.halfmove_clock, 0) - 1, -2):
+            if keys[i] == key:
+                return True
+        return False
+
+    @staticmethod
+    def _principal_variation(root):
+        pv = []
+        node = root
+        while node.children and any(child.visits for child in node.children):
+            node = max(node.children, key=lambda child: child.visits)
+            pv.append(node.move)
+        return pv
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,209 @@
+# -- Bitboard move generation --
+from bitboard import (
+    WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ALL_PIECES,
+    BB_SQUARES, BB_RANK_1, BB_RANK_8, BB_RANKS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    BETWEEN, LINE, PROMOTION, EN_PASSANT, CASTLING,
+    rook_attacks, bishop_attacks,
+)
+from position import WHITE_OO, WHITE_OOO, BLACK_OO, BLACK_OOO
+
+_PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Per color: (right, king from, king to, squares that must be empty, squares the king crosses)
+_CASTLING_MOVES = (
+    ((WHITE_OO, 4, 6, 0x60, 0x60), (WHITE_OOO, 4, 2, 0x0E, 0x0C)),
+    ((BLACK_OO, 60, 62, 0x60 << 56, 0x60 << 56), (BLACK_OOO, 60, 58, 0x0E << 56, 0x0C << 56)),
+)
+
+
+def _add_promotions(moves, from_sq, to_sq):
+    for promotion in _PROMOTION_PIECES:
+        moves.append(PROMOTION | ((promotion - KNIGHT) << 12) | (from_sq << 6) | to_sq)
+
+
+def _generate_pieces(pos, moves, target, pinned, ksq):
+    """Pawn, knight, bishop, rook and queen moves landing on target.
+
+    Pieces in `pinned` may only move along the line through their king. En
+    passant is checked separately because it removes two pieces from a rank.
+    """
+    append = moves.append
+    us = pos.turn
+    by_type, by_color = pos.by_type, pos.by_color
+    occupied = by_type[ALL_PIECES]
+    own = by_color[us]
+    enemies = by_color[us ^ 1]
+
+    # Pawns
+    promotion_rank = BB_RANK_8 if us == WHITE else BB_RANK_1
+    pawns = own & by_type[PAWN] & ~promotion_rank
+    push = 8 if us == WHITE else -8
+    double_rank = BB_RANKS[3] if us == WHITE else BB_RANKS[4]
+    pawn_attacks = PAWN_ATTACKS[us]
+    ep_square = pos.ep_square
+    while pawns:
+        bb = pawns & -pawns
+        from_sq = bb.bit_length() - 1
+        pawns ^= bb
+        allowed = target & LINE[ksq][from_sq] if bb & pinned else target
+        to_sq = from_sq + push
+        to_bb = BB_SQUARES[to_sq]
+        if not occupied & to_bb:
+            if to_bb & allowed:
+                if to_bb & promotion_rank:
+                    _add_promotions(moves, from_sq, to_sq)
+                else:
+                    append((from_sq << 6) | to_sq)
+            if not to_bb & promotion_rank:
+                double = to_sq + push
+                if BB_SQUARES[double] & double_rank & allowed and not occupied & BB_SQUARES[double]:
+                    append((from_sq << 6) | double)
+        captures = pawn_attacks[from_sq] & enemies & allowed
+        while captures:
+            cb = captures & -captures
+            to_sq = cb.bit_length() - 1
+            captures ^= cb
+            if cb & promotion_rank:
+                _add_promotions(moves, from_sq, to_sq)
+            else:
+                append((from_sq << 6) | to_sq)
+        if ep_square is not None and pawn_attacks[from_sq] & BB_SQUARES[ep_square]:
+            move = EN_PASSANT | (from_sq << 6) | ep_square
+            if ksq is None or is_legal(pos, move):
+                append(move)
+
+    # Pieces
+    for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+        pieces = own & by_type[piece_type]
+        while pieces:
+            bb = pieces & -pieces
+            from_sq = bb.bit_length() - 1
+            pieces ^= bb
+            if bb & pinned:
+                if piece_type == KNIGHT:
+                    continue
+                allowed = target & LINE[ksq][from_sq]
+            else:
+                allowed = target
+            if piece_type == KNIGHT:
+                attacks = KNIGHT_ATTACKS[from_sq]
+            elif piece_type == BISHOP:
+                attacks = bishop_attacks(from_sq, occupied)
+            elif piece_type == ROOK:
+                attacks = rook_attacks(from_sq, occupied)
+            else:
+                attacks = rook_attacks(from_sq, occupied) | bishop_attacks(from_sq, occupied)
+            attacks &= allowed
+            base = from_sq << 6
+            while attacks:
+                ab = attacks & -attacks
+                append(base | (ab.bit_length() - 1))
+                attacks ^= ab
+
+
+def _generate_king(pos, moves, from_sq, target, danger):
+    """King steps onto target plus castling through squares outside danger."""
+    attacks = KING_ATTACKS[from_sq] & target
+    base = from_sq << 6
+    while attacks:
+        ab = attacks & -attacks
+        moves.append(base | (ab.bit_length() - 1))
+        attacks ^= ab
+    if pos.castling:
+        occupied = pos.by_type[ALL_PIECES]
+        for right, king_from, king_to, empty, path in _CASTLING_MOVES[pos.turn]:
+            if (pos.castling & right and from_sq == king_from and not occupied & empty and
+                    not danger & (path | BB_SQUARES[king_from])):
+                moves.append(CASTLING | (king_from << 6) | king_to)
+
+
+def generate_pseudo_legal(pos):
+    """All pseudo-legal moves for the side to move (castling is fully checked)."""
+    moves = []
+    us = pos.turn
+    own = pos.by_color[us]
+    _generate_pieces(pos, moves, ~own, 0, None)
+    kings = own & pos.by_type[KING]
+    danger = pos.attacked_by(us ^ 1) if pos.castling else 0
+    while kings:
+        bb = kings & -kings
+        kings ^= bb
+        _generate_king(pos, moves, bb.bit_length() - 1, ~own, danger)
+    return moves
+
+
+def is_legal(pos, move):
+    """Whether a pseudo-legal move leaves the mover's king safe."""
+    us = pos.turn
+    ksq = pos.king_square(us)
+    if ksq is None:
+        return True
+    move_kind = move & (3 << 14)
+    if move_kind == CASTLING:
+        return True
+    from_sq = (move >> 6) & 63
+    to_sq = move & 63
+    from_bb, to_bb = BB_SQUARES[from_sq], BB_SQUARES[to_sq]
+    occupied = (pos.by_type[ALL_PIECES] ^ from_bb) | to_bb
+    enemies = pos.by_color[us ^ 1] & ~to_bb
+    if move_kind == EN_PASSANT:
+        captured = BB_SQUARES[to_sq - 8 if us == WHITE else to_sq + 8]
+        occupied ^= captured
+        enemies ^= captured
+    if from_sq == ksq:
+        ksq = to_sq
+    return not pos.attackers_to(ksq, occupied) & enemies
+
+
+def generate_legal(pos):
+    """All legal moves, filtered against checkers, pins and attacked squares.
+
+    Checkers, pinned pieces and the squares the opponent attacks are worked
+    out once per position; every candidate is then accepted or rejected with
+    bitboard masks instead of being played and tested for check.
+    """
+    us = pos.turn
+    ksq = pos.king_square(us)
+    if ksq is None:
+        # Editor positions may lack a king; nothing can be left in check then
+        return generate_pseudo_legal(pos)
+    moves = []
+    own = pos.by_color[us]
+    checkers = pos.attackers_to(ksq) & pos.by_color[us ^ 1]
+    # Lift the king off the board so it cannot hide behind itself on a ray
+    danger = pos.attacked_by(us ^ 1, pos.by_type[ALL_PIECES] ^ BB_SQUARES[ksq])
+    _generate_king(pos, moves, ksq, ~own & ~danger, danger)
+    if checkers:
+        if checkers & (checkers - 1):
+            return moves
+        target = BETWEEN[ksq][checkers.bit_length() - 1] | checkers
+    else:
+        target = ~own
+    _generate_pieces(pos, moves, target, pos.pinned(us), ksq)
+    return moves
+
+
+def generate_captures(pos):
+    """Legal captures (en passant included) for a side that is not in check.
+
+    This is what the quiescence search plays; in check it looks at every
+    evasion from generate_legal instead. Promotions without a capture are
+    left out.
+    """
+    us = pos.turn
+    enemies = pos.by_color[us ^ 1]
+    ksq = pos.king_square(us)
+    if ksq is None:
+        return [move for move in generate_pseudo_legal(pos)
+                if BB_SQUARES[move & 63] & enemies or move & (3 << 14) == EN_PASSANT]
+    moves = []
+    _generate_pieces(pos, moves, enemies, pos.pinned(us), ksq)
+    attacks = KING_ATTACKS[ksq] & enemies
+    base = ksq << 6
+    while attacks:
+        ab = attacks & -attacks
+        attacks ^= ab
+        move = base | (ab.bit_length() - 1)
+        if is_legal(pos, move):
+            moves.append(move)
+    return moves
@@ -0,0 +1,100 @@
+# -- Staged move ordering --
+# After stockfish/src/movepick.cpp: the transposition table move first, then
+# captures best victim / cheapest attacker first (MVV-LVA), then the killer
+# moves, then the remaining quiet moves by their history score, and last the
+# captures that lose material by static exchange (Position.see). Later stages
+# are only sorted if the search gets that far without a cutoff.
+from bitboard import PAWN, KNIGHT, QUEEN, KING, MOVE_NONE, PROMOTION, EN_PASSANT
+
+# Stages, in the order moves come out
+TT_MOVE, CAPTURES, KILLERS, QUIETS, BAD_CAPTURES = range(5)
+
+# History scores saturate at +-HISTORY_MAX
+HISTORY_MAX = 16384
+
+
+def is_capture(pos, move):
+    """Whether move takes a piece, en passant included."""
+    return bool(pos.board[move & 63]) or move & (3 << 14) == EN_PASSANT
+
+
+def is_tactical(pos, move):
+    """Captures and queen promotions: the moves ordered by MVV-LVA."""
+    kind = move & (3 << 14)
+    return (bool(pos.board[move & 63]) or kind == EN_PASSANT
+            or (kind == PROMOTION and ((move >> 12) & 3) + KNIGHT == QUEEN))
+
+
+def mvv_lva(pos, move):
+    """Ordering key for a capture: victim value first, then the cheaper attacker."""
+    victim = pos.board[move & 63] & 7
+    if move & (3 << 14) == EN_PASSANT:
+        victim = PAWN
+    elif move & (3 << 14) == PROMOTION:
+        victim += QUEEN - PAWN
+    return victim * 8 + KING - (pos.board[(move >> 6) & 63] & 7)
+
+
+def new_history():
+    """Butterfly history: one score per side and (from, to) pair."""
+    return [[0] * 4096, [0] * 4096]
+
+
+def update_history(table, move, bonus):
+    """Move a history score towards +-HISTORY_MAX, more slowly the closer it gets."""
+    index = move & 4095
+    table[index] += bonus - table[index] * abs(bonus) // HISTORY_MAX
+
+
+class MovePicker:
+    """Yields the legal moves of a position best first, one stage at a time.
+
+    `moves` are the legal moves (generate_legal), `killers` the quiet moves
+    that last caused cutoffs at this ply and `history` the side to move's
+    butterfly table. `stage` tells which stage the last move came from.
+    With captures_only, as the quiescence search wants, only the captures
+    stage runs and losing captures are not held back.
+    """
+
+    def __init__(self, pos, moves, tt_move=MOVE_NONE, killers=(), history=None, captures_only=False):
+        self.pos = pos
+        self.moves = moves
+        self.tt_move = tt_move
+        self.killers = killers
+        self.history = history
+        self.captures_only = captures_only
+        self.stage = TT_MOVE
+
+    def __iter__(self):
+        pos, tt_move = self.pos, self.tt_move
+        if tt_move and tt_move in self.moves:
+            yield tt_move
+        self.stage = CAPTURES
+        captures, quiets, bad_captures = [], [], []
+        for move in self.moves:
+            if move != tt_move:
+                (captures if is_tactical(pos, move) else quiets).append(move)
+        if captures:
+            captures.sort(key=lambda move: mvv_lva(pos, move), reverse=True)
+            if self.captures_only:
+                yield from captures
+                return
+            for move in captures:
+                if pos.see_ge(move):
+                    yield move
+                else:
+                    bad_captures.append(move)
+        elif self.captures_only:
+            return
+        self.stage = KILLERS
+        for killer in self.killers:
+            if killer and killer != tt_move and killer in quiets:
+                quiets.remove(killer)
+                yield killer
+        self.stage = QUIETS
+        if self.history is not None and len(quiets) > 1:
+            history = self.history
+            quiets.sort(key=lambda move: history[move & 4095], reverse=True)
+        yield from quiets
+        self.stage = BAD_CAPTURES
+        yield from bad_captures
@@ -0,0 +1,417 @@
+# -- NNUE evaluation --
+# A NumPy port of the network in stockfish/src/nnue, reading Stockfish's own
+# .nnue files (HalfKAv2_hm features, 8 layer stacks). The integer arithmetic
+# is Stockfish's scalar code path, so results match it exactly: int16
+# accumulators, int8 weights with int32 sums, and the same shifts and clamps.
+#
+# The feature transformer's output (the accumulator) is the costly part and
+# changes little from move to move. AccumulatorStack keeps one per ply:
+# Position.make_move pushes the pieces a move changes, and evaluate() brings
+# the accumulator up to date from the last ply that was computed.
+import numpy as np
+
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PROMOTION, EN_PASSANT, CASTLING
+
+VERSION = 0x7AF32F20
+FEATURE_HASH = 0x7F234CB8
+OUTPUT_SCALE = 16
+WEIGHT_SCALE_BITS = 6
+PSQT_BUCKETS = 8
+LAYER_STACKS = 8
+FC_0_OUTPUTS = 15
+FC_1_OUTPUTS = 32
+# Stockfish's internal value of a pawn, for converting to centipawns
+PAWN_VALUE = 208
+
+# HalfKAv2_hm: a feature is (king bucket, piece kind, square) seen from one
+# side. Kings are mirrored onto files e-h, and the board is flipped for black.
+_PS_NB = 11 * 64
+FEATURE_DIMENSIONS = 32 * _PS_NB
+
+
+def _feature_table():
+    # FEATURES[perspective, king square, piece code, square] -> feature index
+    table = np.zeros((2, 64, 16, 64), dtype=np.int32)
+    squares = np.arange(64)
+    for perspective in (WHITE, BLACK):
+        for ksq in range(64):
+            rank, file = ksq >> 3, ksq & 7
+            bucket = ((7 - rank) if perspective == WHITE else rank) * 4 + min(file, 7 - file)
+            orient = (7 if file < 4 else 0) ^ (0 if perspective == WHITE else 56)
+            for color in (WHITE, BLACK):
+                for piece_type in range(PAWN, KING + 1):
+                    if piece_type == KING:
+                        kind = 10
+                    else:
+                        kind = 2 * (piece_type - PAWN) + (color != perspective)
+                    table[perspective, ksq, (color << 3) | piece_type] = (
+                        (squares ^ orient) + kind * 64 + bucket * _PS_NB)
+    return table
+
+
+FEATURES = _feature_table()
+
+
+def _affine_hash(previous, outputs):
+    value = (0xCC03DAE4 + outputs) & 0xFFFFFFFF
+    value ^= previous >> 1
+    value ^= (previous << 31) & 0xFFFFFFFF
+    return value
+
+
+def _clipped_relu_hash(previous):
+    return (0x538D24C7 + previous) & 0xFFFFFFFF
+
+
+def _stack_hash(half_dimensions):
+    value = 0xEC42E90D ^ (half_dimensions * 2)
+    value = _affine_hash(value, FC_0_OUTPUTS + 1)
+    value = _clipped_relu_hash(value)
+    value = _affine_hash(value, FC_1_OUTPUTS)
+    value = _clipped_relu_hash(value)
+    return _affine_hash(value, 1)
+
+
+def _trunc_div(values, divisor):
+    """Integer division rounding towards zero, as C++ does."""
+    return np.where(values < 0, -(-values // divisor), values // divisor)
+
+
+class _Reader:
+    """Little-endian fields from the bytes of a network file."""
+
+    _LEB128_MAGIC = b'COMPRESSED_LEB128'
+
+    def __init__(self, data, path):
+        self.data = data
+        self.path = path
+        self.offset = 0
+
+    def take(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError(f"{self.path}: file ends early")
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def u32(self):
+        return int.from_bytes(self.take(4), 'little')
+
+    def array(self, dtype, count):
+        dtype = np.dtype(dtype).newbyteorder('<')
+        return np.frombuffer(self.take(dtype.itemsize * count), dtype).astype(dtype.newbyteorder('='))
+
+    def leb128(self, dtype, count):
+        if self.take(len(self._LEB128_MAGIC)) != self._LEB128_MAGIC:
+            raise ValueError(f"{self.path}: expected a compressed block at byte {self.offset}")
+        raw = np.frombuffer(self.take(self.u32()), np.uint8)
+        values = _decode_leb128(raw, dtype)
+        if len(values) != count:
+            raise ValueError(f"{self.path}: {len(values)} values in a block of {count}")
+        return values
+
+
+def _decode_leb128(raw, dtype, chunk_bytes=1 << 22):
+    """Signed LEB128 values, decoded a few megabytes at a time to bound the int64 temporaries."""
+    bits = np.dtype(dtype).itemsize * 8
+    parts = []
+    start = 0
+    while start < len(raw):
+        stop = min(start + chunk_bytes, len(raw))
+        ends = start + np.flatnonzero(raw[start:stop] < 0x80)
+        if not len(ends):
+            raise ValueError("unterminated compressed value")
+        stop = int(ends[-1]) + 1
+        chunk = raw[start:stop]
+        ends -= start
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+        shifts = 7 * (np.arange(len(chunk)) - np.repeat(starts, lengths))
+        values = np.add.reduceat((chunk & 0x7F).astype(np.int64) << shifts, starts)
+        # Sign-extend from the last byte's sign bit, unless the value already fills the type
+        negative = ((chunk[ends] & 0x40) != 0) & (7 * lengths < bits)
+        values[negative] -= np.int64(1) << (7 * lengths[negative])
+        parts.append(values.astype(dtype))
+        start = stop
+    return np.concatenate(parts) if parts else np.zeros(0, dtype)
+
+
+class LayerStack:
+    """One of the eight output networks; the one used depends on the piece count."""
+
+    def __init__(self, reader, half_dimensions):
+        self.fc0_biases = reader.array(np.int32, FC_0_OUTPUTS + 1)
+        self.fc0_weights = reader.array(np.int8, (FC_0_OUTPUTS + 1) * half_dimensions).reshape(
+            FC_0_OUTPUTS + 1, half_dimensions).astype(np.int32)
+        # fc_1 takes 30 inputs, padded to 32 in the file
+        self.fc1_biases = reader.array(np.int32, FC_1_OUTPUTS)
+        self.fc1_weights = reader.array(np.int8, FC_1_OUTPUTS * 32).reshape(FC_1_OUTPUTS, 32)[:, :2 * FC_0_OUTPUTS]
+        self.fc1_weights = self.fc1_weights.astype(np.int32)
+        self.fc2_biases = reader.array(np.int32, 1)
+        self.fc2_weights = reader.array(np.int8, 32).astype(np.int32)
+
+    def propagate(self, transformed):
+        """Positional score (before OUTPUT_SCALE) for each row of transformed features (N x L1 uint8)."""
+        fc0 = transformed.astype(np.int32) @ self.fc0_weights.T + self.fc0_biases
+        hidden = fc0[:, :FC_0_OUTPUTS].astype(np.int64)
+        squared = np.minimum(127, (hidden * hidden) >> (2 * WEIGHT_SCALE_BITS + 7))
+        clipped = np.clip(hidden >> WEIGHT_SCALE_BITS, 0, 127)
+        fc1 = np.concatenate((squared, clipped), axis=1) @ self.fc1_weights.T + self.fc1_biases
+        fc2 = np.clip(fc1 >> WEIGHT_SCALE_BITS, 0, 127) @ self.fc2_weights + self.fc2_biases[0]
+        # The skip connection: fc_0's last output, rescaled
+        forward = _trunc_div(fc0[:, FC_0_OUTPUTS].astype(np.int64) * (600 * OUTPUT_SCALE),
+                             127 * (1 << WEIGHT_SCALE_BITS))
+        return fc2 + forward
+
+
+class Network:
+    """A Stockfish .nnue file, loaded into NumPy arrays.
+
+    Either network size loads (the transformer width is read from the
+    file); a file of another architecture raises ValueError. Transformer
+    weights and biases are kept doubled, as Stockfish keeps them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            reader = _Reader(f.read(), path)
+        version, file_hash = reader.u32(), reader.u32()
+        if version != VERSION:
+            raise ValueError(f"{path}: not a Stockfish NNUE file of this version ({version:#x})")
+        self.description = reader.take(reader.u32()).decode('utf-8', 'replace')
+        transformer_hash = reader.u32()
+        self.half_dimensions = half = (transformer_hash ^ FEATURE_HASH) // 2
+        stack_hash = _stack_hash(half)
+        if not 0 < half <= 4096 or half % 32 or file_hash != transformer_hash ^ stack_hash:
+            raise ValueError(f"{path}: not a HalfKAv2_hm network this code knows")
+        self.biases = reader.leb128(np.int16, half) * np.int16(2)
+        self.weights = reader.leb128(np.int16, half * FEATURE_DIMENSIONS).reshape(FEATURE_DIMENSIONS, half)
+        self.weights *= np.int16(2)
+        self.psqt_weights = reader.leb128(np.int32, PSQT_BUCKETS * FEATURE_DIMENSIONS).reshape(
+            FEATURE_DIMENSIONS, PSQT_BUCKETS)
+        self.stacks = []
+        for _ in range(LAYER_STACKS):
+            if reader.u32() != stack_hash:
+                raise ValueError(f"{path}: layer stack header does not match")
+            self.stacks.append(LayerStack(reader, half))
+        if reader.offset != len(reader.data):
+            raise ValueError(f"{path}: {len(reader.data) - reader.offset} bytes left over")
+
+    def __repr__(self):
+        return f"Network({self.path!r}, L1={self.half_dimensions})"
+
+    def new_accumulators(self, pos):
+        """An AccumulatorStack for pos; set it as pos.accumulators to evaluate pos with this network.
+
+        None when a king is missing, as the position editor allows: every
+        feature is relative to its side's king, so such positions keep
+        evaluate.py's piece-square score.
+        """
+        if pos.king_square(WHITE) is None or pos.king_square(BLACK) is None:
+            return None
+        return AccumulatorStack(self, pos)
+
+    # --- Feature transformer ---
+    def active_features(self, board, perspective, king_sq):
+        """Feature indices of every piece on a 64-entry mailbox, seen from perspective."""
+        board = np.asarray(board)
+        squares = np.flatnonzero(board)
+        return FEATURES[perspective, king_sq, board[squares], squares]
+
+    def refresh(self, board, perspective, king_sq):
+        """(accumulation, psqt) for one side, summed from scratch."""
+        features = self.active_features(board, perspective, king_sq)
+        # int16 sums wrap exactly as Stockfish's do
+        accumulation = self.biases + self.weights[features].sum(axis=0, dtype=np.int16)
+        return accumulation, self.psqt_weights[features].sum(axis=0, dtype=np.int32)
+
+    def refresh_batch(self, boards, perspective, chunk_bytes=1 << 25):
+        """refresh() for every row of an N x 64 array of mailboxes: (N x L1, N x 8) arrays.
+
+        Raises ValueError if a row has no king of perspective's color.
+        """
+        boards = np.asarray(boards, dtype=np.intp)
+        kings = boards == ((perspective << 3) | KING)
+        kingless = np.flatnonzero(~kings.any(axis=1))
+        if len(kingless):
+            raise ValueError(f"rows without a king for perspective {perspective}: {kingless.tolist()}")
+        king_squares = np.argmax(kings, axis=1)
+        occupied = boards != 0
+        # Each row's occupied squares first, padded to the fullest row
+        width = max(1, int(occupied.sum(axis=1).max(initial=0)))
+        squares = np.argsort(~occupied, axis=1, kind='stable')[:, :width]
+        rows = np.arange(len(boards))[:, None]
+        active = occupied[rows, squares]
+        features = np.where(active, FEATURES[perspective, king_squares[:, None], boards[rows, squares], squares], 0)
+        accumulation = np.empty((len(boards), self.half_dimensions), dtype=np.int16)
+        psqt = np.empty((len(boards), PSQT_BUCKETS), dtype=np.int32)
+        # The gathered weights are rows x width x (L1 int16 + 8 int32); take as many rows at a time
+        # as fit in chunk_bytes
+        step = max(1, chunk_bytes // (width * (2 * self.half_dimensions + 4 * PSQT_BUCKETS)))
+        for start in range(0, len(boards), step):
+            chunk = slice(start, start + step)
+            inactive = ~active[chunk]
+            gathered = self.weights[features[chunk]]
+            gathered[inactive] = 0
+            accumulation[chunk] = self.biases + gathered.sum(axis=1, dtype=np.int16)
+            gathered = self.psqt_weights[features[chunk]]
+            gathered[inactive] = 0
+            psqt[chunk] = gathered.sum(axis=1, dtype=np.int32)
+        return accumulation, psqt
+
+    def transform(self, us_acc, them_acc):
+        """The clipped, pairwise-multiplied uint8 input to the layer stacks; rows are positions."""
+        half = self.half_dimensions // 2
+        parts = []
+        for acc in (us_acc, them_acc):
+            clipped = np.clip(acc.astype(np.int32), 0, 254)
+            parts.append((clipped[..., :half] * clipped[..., half:]) // 512)
+        return np.concatenate(parts, axis=-1).astype(np.uint8)
+
+    def output(self, us_acc, them_acc, us_psqt, them_psqt, piece_count):
+        """(psqt, positional) in Stockfish's internal units for the side to move, one pair per row."""
+        us_acc, them_acc = np.atleast_2d(us_acc), np.atleast_2d(them_acc)
+        us_psqt, them_psqt = np.atleast_2d(us_psqt), np.atleast_2d(them_psqt)
+        buckets = (np.atleast_1d(piece_count) - 1) // 4
+        rows = np.arange(len(buckets))
+        psqt = _trunc_div(us_psqt[rows, buckets].astype(np.int64) - them_psqt[rows, buckets], 2)
+        transformed = self.transform(us_acc, them_acc)
+        positional = np.empty(len(buckets), dtype=np.int64)
+        for bucket in np.unique(buckets):
+            selected = buckets == bucket
+            positional[selected] = self.stacks[bucket].propagate(transformed[selected])
+        return _trunc_div(psqt, OUTPUT_SCALE), _trunc_div(positional, OUTPUT_SCALE)
+
+    def evaluate(self, pos):
+        """(psqt, positional) for pos, from scratch; see AccumulatorStack for the incremental path.
+
+        Raises ValueError when a king is missing.
+        """
+        us, them = pos.turn, pos.turn ^ 1
+        if pos.king_square(us) is None or pos.king_square(them) is None:
+            raise ValueError(f"no NNUE evaluation without both kings: {pos.fen()}")
+        us_acc, us_psqt = self.refresh(pos.board, us, pos.king_square(us))
+        them_acc, them_psqt = self.refresh(pos.board, them, pos.king_square(them))
+        psqt, positional = self.output(us_acc, them_acc, us_psqt, them_psqt, 64 - pos.board.count(0))
+        return int(psqt[0]), int(positional[0])
+
+
+def blend(psqt, positional):
+    """Stockfish's mix of the two network outputs, in its internal units."""
+    return int(_trunc_div(np.int64(125 * psqt + 131 * positional), 128))
+
+
+def to_centipawns(value, pos):
+    """A Stockfish internal value as the centipawns its UCI output and 'eval' command show."""
+    by_type = pos.by_type
+    material = sum(count * bin(by_type[piece_type]).count('1')
+                   for count, piece_type in ((1, PAWN), (3, KNIGHT), (3, BISHOP), (5, ROOK), (9, QUEEN)))
+    m = min(max(material, 17), 78) / 58.0
+    a = ((-13.50030198 * m + 40.92780883) * m - 36.82753545) * m + 386.83004070
+    return round(100 * value / a)
+
+
+class AccumulatorStack:
+    """Feature-transformer accumulators for a Position and the moves played on it.
+
+    Set as pos.accumulators, the position calls push()/pop() from its
+    make/unmake methods. Each ply records the pieces its move changed;
+    accumulators are only computed when evaluate() needs them, by adding
+    and removing those pieces' weights from the last computed ply. A king
+    move changes every feature of its own side, so that side is summed
+    from scratch instead.
+    """
+
+    def __init__(self, network, pos):
+        self.network = network
+        self.reset(pos)
+
+    def reset(self, pos):
+        network = self.network
+        self._dirty = [()]
+        accumulators, psqts = [None, None], [None, None]
+        for color in (WHITE, BLACK):
+            accumulators[color], psqts[color] = network.refresh(pos.board, color, pos.king_square(color))
+        self._accumulators = [accumulators]
+        self._psqts = [psqts]
+
+    def push(self, pos, move):
+        """Record the pieces move changes; called by make_move before the board changes."""
+        board = pos.board
+        from_sq, to_sq = (move >> 6) & 63, move & 63
+        kind = move & (3 << 14)
+        piece = board[from_sq]
+        if kind == CASTLING:
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if to_sq > from_sq else (to_sq - 2, to_sq + 1)
+            dirty = ((piece, from_sq, to_sq), (board[rook_from], rook_from, rook_to))
+        else:
+            # (piece, from, to): None for a square the piece comes from or goes to off the board
+            dirty = [(piece, from_sq, None if kind == PROMOTION else to_sq)]
+            capture_sq = to_sq
+            if kind == EN_PASSANT:
+                capture_sq = to_sq - 8 if piece >> 3 == WHITE else to_sq + 8
+            if board[capture_sq]:
+                dirty.append((board[capture_sq], capture_sq, None))
+            if kind == PROMOTION:
+                dirty.append(((piece & 8) | (((move >> 12) & 3) + KNIGHT), None, to_sq))
+        self._dirty.append(dirty)
+        self._accumulators.append([None, None])
+        self._psqts.append([None, None])
+
+    def push_null(self):
+        self._dirty.append(())
+        self._accumulators.append([None, None])
+        self._psqts.append([None, None])
+
+    def pop(self):
+        self._dirty.pop()
+        self._accumulators.pop()
+        self._psqts.pop()
+
+    def _update(self, pos, color):
+        top = len(self._dirty) - 1
+        accumulators, psqts, dirty = self._accumulators, self._psqts, self._dirty
+        network = self.network
+        king = (color << 3) | KING
+        ply = top
+        while accumulators[ply][color] is None:
+            if dirty[ply] and dirty[ply][0][0] == king:
+                # This side's king moved since: every feature changed
+                accumulators[top][color], psqts[top][color] = network.refresh(pos.board, color,
+                                                                              pos.king_square(color))
+                return
+            ply -= 1
+        king_sq = pos.king_square(color)
+        table = FEATURES[color, king_sq]
+        accumulation, psqt = accumulators[ply][color], psqts[ply][color]
+        weights, psqt_weights = network.weights, network.psqt_weights
+        for ply in range(ply + 1, top + 1):
+            added, removed = [], []
+            for piece, from_sq, to_sq in dirty[ply]:
+                if from_sq is not None:
+                    removed.append(table[piece, from_sq])
+                if to_sq is not None:
+                    added.append(table[piece, to_sq])
+            accumulation = accumulation + weights[added].sum(axis=0, dtype=np.int16) \
+                - weights[removed].sum(axis=0, dtype=np.int16)
+            psqt = psqt + psqt_weights[added].sum(axis=0, dtype=np.int32) \
+                - psqt_weights[removed].sum(axis=0, dtype=np.int32)
+            accumulators[ply][color], psqts[ply][color] = accumulation, psqt
+
+    def output(self, pos):
+        """(psqt, positional) for pos in Stockfish's internal units, from the side to move."""
+        accumulators, psqts = self._accumulators[-1], self._psqts[-1]
+        for color in (WHITE, BLACK):
+            if accumulators[color] is None:
+                self._update(pos, color)
+        us, them = pos.turn, pos.turn ^ 1
+        psqt, positional = self.network.output(accumulators[us], accumulators[them], psqts[us], psqts[them],
+                                               64 - pos.board.count(0))
+        return int(psqt[0]), int(positional[0])
+
+    def evaluate(self, pos):
+        """Centipawns for the side to move, on the scale of evaluate.py (a pawn is 100)."""
+        return blend(*self.output(pos)) * 100 // PAWN_VALUE
@@ -0,0 +1,244 @@
+# -- Perft: move generator correctness and speed --
+# perft(pos, depth) counts the leaf nodes of the legal move tree, the same way
+# Stockfish's `go perft` does, so counts can be checked against known values.
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import move_uci
+from movegen import generate_legal
+from position import Position
+
+BENCHMARK_CPP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stockfish', 'src', 'benchmark.cpp')
+
+# The standard perft suite (chessprogramming.org "Perft Results") with known counts per depth
+KIWIPETE_SUITE = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281, 4865609]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+]
+
+
+# --- Perft cache ---
+class PerftTable:
+    """Fixed-size cache of subtree counts keyed by (position key, depth).
+
+    Entries live in flat arrays grouped in buckets of two: the first slot
+    keeps the deepest subtree seen (the most work to redo), the second is
+    overwritten by everything else. Nothing grows after construction.
+    """
+    ENTRY_BYTES = 8 + 8 + 1  # key, count, depth
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        buckets = 1
+        while buckets * 4 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(16 * buckets))
+        self.counts = array('Q', bytes(16 * buckets))
+        self.depths = array('B', bytes(2 * buckets))
+        self.probes = self.hits = self.stores = 0
+
+    def _bucket(self, key, depth):
+        # Mix the depth in so one position's subtrees spread over buckets
+        return (((key ^ (depth * 0x9E3779B97F4A7C15)) & self.mask) << 1)
+
+    def probe(self, key, depth):
+        """Cached count for the subtree, or None."""
+        self.probes += 1
+        slot = self._bucket(key, depth)
+        keys, depths = self.keys, self.depths
+        for i in (slot, slot + 1):
+            if keys[i] == key and depths[i] == depth:
+                self.hits += 1
+                return self.counts[i]
+        return None
+
+    def store(self, key, depth, count):
+        slot = self._bucket(key, depth)
+        if depth < self.depths[slot]:
+            slot += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.counts[slot] = count
+        self.stores += 1
+
+    @property
+    def entries(self):
+        return len(self.keys)
+
+    @property
+    def memory_bytes(self):
+        return sum(a.itemsize * len(a) for a in (self.keys, self.counts, self.depths))
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def used(self):
+        """Fraction of slots holding an entry."""
+        return sum(1 for depth in self.depths if depth) / self.entries
+
+
+def perft(pos, depth, table=None):
+    """Number of leaf nodes `depth` plies below pos (pos is left unchanged).
+
+    With a PerftTable, subtrees of depth 2 and more are looked up before
+    they are expanded and stored afterwards.
+    """
+    if table is not None and depth >= 2:
+        nodes = table.probe(pos.key, depth)
+        if nodes is not None:
+            return nodes
+    moves = generate_legal(pos)
+    if depth <= 1:
+        # Bulk counting: the moves themselves are the leaves
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        pos.make_move(move)
+        nodes += perft(pos, depth - 1, table)
+        pos.unmake_move()
+    if table is not None:
+        table.store(pos.key, depth, nodes)
+    return nodes
+
+
+def divide(pos, depth, table=None):
+    """(uci, leaf count) for every root move, as printed by `go perft`."""
+    counts = []
+    for move in generate_legal(pos):
+        pos.make_move(move)
+        counts.append((move_uci(move), perft(pos, depth - 1, table)))
+        pos.unmake_move()
+    return counts
+
+
+# --- Parallel perft ---
+# Each worker process keeps its own table between tasks
+_worker_table = None
+
+
+def _perft_fen(fen, depth, hash_mb=0):
+    global _worker_table
+    if hash_mb and (_worker_table is None or _worker_table.size_mb != hash_mb):
+        _worker_table = PerftTable(hash_mb)
+    return perft(Position(fen), depth, _worker_table if hash_mb else None)
+
+
+def _split(pos, depth, min_tasks):
+    """Subtrees to hand out: (root move uci, fen, depth left).
+
+    Splits at the root, and again one ply down while there are fewer than
+    min_tasks subtrees, so a few heavy root moves cannot leave cores idle.
+    """
+    tasks = []
+    for move in generate_legal(pos):
+        pos.make_move(move)
+        tasks.append((move_uci(move), pos.fen(), depth - 1))
+        pos.unmake_move()
+    if len(tasks) < min_tasks and depth > 3:
+        deeper = []
+        for root, fen, left in tasks:
+            child = Position(fen)
+            for move in generate_legal(child):
+                child.make_move(move)
+                deeper.append((root, child.fen(), left - 1))
+                child.unmake_move()
+        tasks = deeper
+    return tasks
+
+
+def parallel_divide(pos, depth, executor=None, workers=None, hash_mb=0):
+    """divide() with the subtrees counted in worker processes.
+
+    Positions travel to the workers as FEN strings. Pass an executor to reuse
+    one pool across calls; otherwise one is created for this call. `workers`
+    is the pool size (default: one per core). With hash_mb, every worker
+    keeps a PerftTable of that size for the tasks it runs.
+    """
+    if depth < 2:
+        return divide(pos, depth)
+    workers = workers or os.cpu_count()
+    own_pool = executor is None
+    if own_pool:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        tasks = _split(pos, depth, 4 * workers)
+        counts = executor.map(_perft_fen, [fen for _, fen, _ in tasks], [left for _, _, left in tasks],
+                              [hash_mb] * len(tasks))
+        # Every root move is listed, as divide() lists it: one that leaves no legal
+        # reply (mate or stalemate) gets no task at the second split level
+        totals = {move_uci(move): 0 for move in generate_legal(pos)}
+        for (root, _, _), count in zip(tasks, counts):
+            totals[root] = totals.get(root, 0) + count
+    finally:
+        if own_pool:
+            executor.shutdown()
+    return list(totals.items())
+
+
+def parallel_perft(pos, depth, executor=None, workers=None, hash_mb=0):
+    """perft() split across processes at the root."""
+    if depth < 2:
+        return perft(pos, depth)
+    return sum(count for _, count in parallel_divide(pos, depth, executor, workers, hash_mb))
+
+
+def play_uci(pos, uci_moves):
+    """Play UCI moves on pos, checking each one against the legal moves."""
+    for uci in uci_moves:
+        for move in generate_legal(pos):
+            if move_uci(move) == uci:
+                pos.make_move(move)
+                break
+        else:
+            raise ValueError(f"illegal move {uci} in {pos.fen()}")
+    return pos
+
+
+def position_from_command(text):
+    """Position for a `<fen> [moves m1 m2 ...]` line as used in benchmark.cpp."""
+    fen, _, moves = text.partition(' moves ')
+    return play_uci(Position(fen), moves.split())
+
+
+def bench_positions(path=BENCHMARK_CPP):
+    """The FEN lines (with any trailing moves) of Stockfish's bench list.
+
+    Returns an empty list when the Stockfish sources are not around.
+    """
+    try:
+        with open(path) as f:
+            source = f.read()
+    except OSError:
+        return []
+    start = source.find('Defaults')
+    end = source.find('};', start)
+    return [line for line in re.findall(r'"([^"]+)"', source[start:end]) if '/' in line]
+
+
+# --- python-chess reference ---
+def reference_perft(board, depth):
+    """perft on a python-chess board, for cross-checking counts."""
+    if depth <= 1:
+        return board.legal_moves.count() if depth == 1 else 1
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += reference_perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def reference_divide(board, depth):
+    counts = []
+    for move in board.legal_moves:
+        board.push(move)
+        counts.append((move.uci(), reference_perft(board, depth - 1)))
+        board.pop()
+    return counts
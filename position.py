@@ -0,0 +1,464 @@
+# -- Bitboard position --
+from bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ALL_PIECES, NO_PIECE,
+    PIECE_SYMBOLS, BB_SQUARES, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    PROMOTION, EN_PASSANT, CASTLING,
+    BB_FILE_A, BB_FILE_H, BETWEEN,
+    make_piece, color_of, type_of, square_of, square_name, parse_square,
+    rook_attacks, bishop_attacks,
+)
+from zobrist import ZOBRIST_PSQ, ZOBRIST_CASTLING, ZOBRIST_EP, ZOBRIST_WHITE, ep_counts, position_key
+from evaluate import MATERIAL, PSQ_MG, PSQ_EG, PHASE, psq_totals
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# --- Castling rights ---
+WHITE_OO, WHITE_OOO, BLACK_OO, BLACK_OOO = 1, 2, 4, 8
+CASTLING_SYMBOLS = ((WHITE_OO, 'K'), (WHITE_OOO, 'Q'), (BLACK_OO, 'k'), (BLACK_OOO, 'q'))
+
+# Rights that survive a move touching each square (king or rook home squares)
+CASTLING_RIGHTS_MASK = [15] * 64
+CASTLING_RIGHTS_MASK[4] = 15 & ~(WHITE_OO | WHITE_OOO)
+CASTLING_RIGHTS_MASK[0] = 15 & ~WHITE_OOO
+CASTLING_RIGHTS_MASK[7] = 15 & ~WHITE_OO
+CASTLING_RIGHTS_MASK[60] = 15 & ~(BLACK_OO | BLACK_OOO)
+CASTLING_RIGHTS_MASK[56] = 15 & ~BLACK_OOO
+CASTLING_RIGHTS_MASK[63] = 15 & ~BLACK_OO
+
+
+class Position:
+    """A chess position held as bitboards plus a 64-entry piece mailbox.
+
+    `key` is the Polyglot-compatible Zobrist key (see zobrist.py), kept up to
+    date by make_move/unmake_move. ep_square is only set when a pawn can
+    actually capture en passant, as the key requires. psq_mg, psq_eg and
+    phase are the evaluation sums of evaluate.py, kept up to date the same way.
+    `accumulators` is None, or an nnue.AccumulatorStack that moves are
+    reported to; copies start without one.
+    """
+    __slots__ = ('by_type', 'by_color', 'board', 'turn', 'castling', 'ep_square',
+                 'halfmove_clock', 'fullmove_number', 'key', 'psq_mg', 'psq_eg', 'phase', 'accumulators',
+                 '_undo_stack')
+
+    def __init__(self, fen=STARTING_FEN):
+        self.set_fen(fen)
+
+    # --- Construction ---
+    def _clear(self):
+        self.by_type = [0] * 7
+        self.by_color = [0, 0]
+        self.board = [NO_PIECE] * 64
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.psq_mg = self.psq_eg = self.phase = 0
+        self.accumulators = None
+        self._undo_stack = []
+
+    def put_piece(self, piece, sq):
+        bb = BB_SQUARES[sq]
+        self.board[sq] = piece
+        self.by_type[ALL_PIECES] |= bb
+        self.by_type[piece & 7] |= bb
+        self.by_color[piece >> 3] |= bb
+
+    def remove_piece(self, sq):
+        piece = self.board[sq]
+        bb = BB_SQUARES[sq]
+        self.by_type[ALL_PIECES] ^= bb
+        self.by_type[piece & 7] ^= bb
+        self.by_color[piece >> 3] ^= bb
+        self.board[sq] = NO_PIECE
+        return piece
+
+    def set_fen(self, fen):
+        parts = fen.split()
+        self._clear()
+        rank, file = 7, 0
+        for ch in parts[0]:
+            if ch == '/':
+                rank, file = rank - 1, 0
+            elif ch.isdigit():
+                file += int(ch)
+            else:
+                color = WHITE if ch.isupper() else BLACK
+                self.put_piece(make_piece(color, PIECE_SYMBOLS.index(ch.lower())), rank * 8 + file)
+                file += 1
+        self.turn = WHITE if len(parts) < 2 or parts[1] == 'w' else BLACK
+        if len(parts) > 2:
+            for right, symbol in CASTLING_SYMBOLS:
+                if symbol in parts[2]:
+                    self.castling |= right
+        self._clean_castling_rights()
+        if len(parts) > 3 and parts[3] != '-':
+            ep_square = parse_square(parts[3])
+            if ep_counts(self.board, ep_square, self.turn):
+                self.ep_square = ep_square
+        if len(parts) > 4:
+            self.halfmove_clock = int(parts[4])
+        if len(parts) > 5:
+            self.fullmove_number = int(parts[5])
+        self.key = position_key(self)
+        self.psq_mg, self.psq_eg, self.phase = psq_totals(self.board)
+
+    def _clean_castling_rights(self):
+        # Drop rights whose king or rook is not on its home square
+        for right, king_sq, rook_sq, color in ((WHITE_OO, 4, 7, WHITE), (WHITE_OOO, 4, 0, WHITE),
+                                               (BLACK_OO, 60, 63, BLACK), (BLACK_OOO, 60, 56, BLACK)):
+            if (self.board[king_sq] != make_piece(color, KING) or
+                    self.board[rook_sq] != make_piece(color, ROOK)):
+                self.castling &= ~right
+
+    @classmethod
+    def from_squares(cls, squares, turn, last_move=None, placed=None, moved=0, ep_square=None):
+        """Build a position from a Board.squares grid of Piece objects.
+
+        Castling rights come from the kings and rooks on their home squares
+        whose bits are clear in the `moved` mask (Board.moved). The en-passant
+        square is `ep_square` if given, else worked out from a preceding
+        double pawn push in `last_move`. `placed` may list the ((row, col),
+        piece) pairs already known (Board.all_pieces()) so the grid is not
+        scanned.
+        """
+        pos = cls.__new__(cls)
+        pos._clear()
+        pos.turn = WHITE if turn == 'white' else BLACK
+        rights = 0
+        if placed is None:
+            placed = [((row, col), squares[row][col]) for row in range(8) for col in range(8)
+                      if squares[row][col] != 0]
+        for (row, col), piece in placed:
+            color = WHITE if piece.color == 'white' else BLACK
+            pos.put_piece(make_piece(color, piece.piece_type), square_of(row, col))
+        for right, king_sq, rook_sq in ((WHITE_OO, 4, 7), (WHITE_OOO, 4, 0), (BLACK_OO, 60, 63), (BLACK_OOO, 60, 56)):
+            if not moved & (BB_SQUARES[king_sq] | BB_SQUARES[rook_sq]):
+                rights |= right
+        pos.castling = rights
+        pos._clean_castling_rights()
+        if ep_square is None and last_move:
+            from_sq, to_sq = last_move.from_sq, last_move.to_sq
+            if type_of(pos.board[to_sq]) == PAWN and abs(to_sq - from_sq) == 16:
+                ep_square = (from_sq + to_sq) >> 1
+        if ep_square is not None and ep_counts(pos.board, ep_square, pos.turn):
+            pos.ep_square = ep_square
+        pos.key = position_key(pos)
+        pos.psq_mg, pos.psq_eg, pos.phase = psq_totals(pos.board)
+        return pos
+
+    def copy(self):
+        new = Position.__new__(Position)
+        new.by_type = self.by_type[:]
+        new.by_color = self.by_color[:]
+        new.board = self.board[:]
+        new.turn = self.turn
+        new.castling = self.castling
+        new.ep_square = self.ep_square
+        new.halfmove_clock = self.halfmove_clock
+        new.fullmove_number = self.fullmove_number
+        new.key = self.key
+        new.psq_mg, new.psq_eg, new.phase = self.psq_mg, self.psq_eg, self.phase
+        new.accumulators = None
+        new._undo_stack = []
+        return new
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            empty = 0
+            row = ""
+            for file in range(8):
+                piece = self.board[rank * 8 + file]
+                if piece == NO_PIECE:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = PIECE_SYMBOLS[piece & 7]
+                row += symbol.upper() if piece >> 3 == WHITE else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = ''.join(symbol for right, symbol in CASTLING_SYMBOLS if self.castling & right) or '-'
+        ep = square_name(self.ep_square) if self.ep_square is not None else '-'
+        return f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    # --- Make / unmake ---
+    def _move_piece(self, from_sq, to_sq):
+        piece = self.board[from_sq]
+        from_to = BB_SQUARES[from_sq] | BB_SQUARES[to_sq]
+        self.by_type[ALL_PIECES] ^= from_to
+        self.by_type[piece & 7] ^= from_to
+        self.by_color[piece >> 3] ^= from_to
+        self.board[from_sq] = NO_PIECE
+        self.board[to_sq] = piece
+
+    def make_move(self, move):
+        """Play a (pseudo-)legal move in place; unmake_move() takes it back."""
+        us = self.turn
+        from_sq = (move >> 6) & 63
+        to_sq = move & 63
+        move_kind = move & (3 << 14)
+        piece = self.board[from_sq]
+        capture_sq = to_sq
+        if move_kind == EN_PASSANT:
+            capture_sq = to_sq - 8 if us == WHITE else to_sq + 8
+        captured = self.board[capture_sq]
+        if self.accumulators is not None:
+            self.accumulators.push(self, move)
+        self._undo_stack.append((move, captured, self.castling, self.ep_square, self.halfmove_clock, self.key,
+                                 self.psq_mg, self.psq_eg, self.phase))
+        psq = ZOBRIST_PSQ[piece]
+        key = self.key ^ ZOBRIST_WHITE ^ psq[from_sq] ^ psq[to_sq]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+        mg_table, eg_table = PSQ_MG[piece], PSQ_EG[piece]
+        mg = self.psq_mg + mg_table[to_sq] - mg_table[from_sq]
+        eg = self.psq_eg + eg_table[to_sq] - eg_table[from_sq]
+
+        if move_kind == CASTLING:
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if to_sq > from_sq else (to_sq - 2, to_sq + 1)
+            self._move_piece(rook_from, rook_to)
+            rook = make_piece(us, ROOK)
+            rook_psq = ZOBRIST_PSQ[rook]
+            key ^= rook_psq[rook_from] ^ rook_psq[rook_to]
+            mg += PSQ_MG[rook][rook_to] - PSQ_MG[rook][rook_from]
+            eg += PSQ_EG[rook][rook_to] - PSQ_EG[rook][rook_from]
+        elif captured:
+            self.remove_piece(capture_sq)
+            key ^= ZOBRIST_PSQ[captured][capture_sq]
+            mg -= PSQ_MG[captured][capture_sq]
+            eg -= PSQ_EG[captured][capture_sq]
+            self.phase -= PHASE[captured]
+        self._move_piece(from_sq, to_sq)
+        if move_kind == PROMOTION:
+            promoted = make_piece(us, ((move >> 12) & 3) + KNIGHT)
+            self.remove_piece(to_sq)
+            self.put_piece(promoted, to_sq)
+            key ^= psq[to_sq] ^ ZOBRIST_PSQ[promoted][to_sq]
+            mg += PSQ_MG[promoted][to_sq] - mg_table[to_sq]
+            eg += PSQ_EG[promoted][to_sq] - eg_table[to_sq]
+            self.phase += PHASE[promoted]
+        self.psq_mg = mg
+        self.psq_eg = eg
+
+        castling = self.castling & CASTLING_RIGHTS_MASK[from_sq] & CASTLING_RIGHTS_MASK[to_sq]
+        if castling != self.castling:
+            key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+        self.ep_square = None
+        if piece & 7 == PAWN:
+            self.halfmove_clock = 0
+            if to_sq - from_sq in (16, -16):
+                # Only record the square when an enemy pawn could actually take
+                middle = (from_sq + to_sq) >> 1
+                if PAWN_ATTACKS[us][middle] & self.by_color[us ^ 1] & self.by_type[PAWN]:
+                    self.ep_square = middle
+                    key ^= ZOBRIST_EP[middle & 7]
+        elif captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.turn = us ^ 1
+        self.key = key
+
+    def unmake_move(self):
+        (move, captured, self.castling, self.ep_square, self.halfmove_clock, self.key,
+         self.psq_mg, self.psq_eg, self.phase) = self._undo_stack.pop()
+        if self.accumulators is not None:
+            self.accumulators.pop()
+        us = self.turn ^ 1
+        self.turn = us
+        if us == BLACK:
+            self.fullmove_number -= 1
+        from_sq = (move >> 6) & 63
+        to_sq = move & 63
+        move_kind = move & (3 << 14)
+        if move_kind == PROMOTION:
+            self.remove_piece(to_sq)
+            self.put_piece(make_piece(us, PAWN), to_sq)
+        self._move_piece(to_sq, from_sq)
+        if move_kind == CASTLING:
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if to_sq > from_sq else (to_sq - 2, to_sq + 1)
+            self._move_piece(rook_to, rook_from)
+        elif move_kind == EN_PASSANT:
+            self.put_piece(captured, to_sq - 8 if us == WHITE else to_sq + 8)
+        elif captured:
+            self.put_piece(captured, to_sq)
+
+    def make_null_move(self):
+        """Pass the turn (for null-move pruning); unmake_null_move() takes it back.
+
+        The halfmove clock restarts so repetition checks do not reach back
+        across the pass.
+        """
+        self._undo_stack.append((0, NO_PIECE, self.castling, self.ep_square, self.halfmove_clock, self.key,
+                                 self.psq_mg, self.psq_eg, self.phase))
+        if self.accumulators is not None:
+            self.accumulators.push_null()
+        key = self.key ^ ZOBRIST_WHITE
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+            self.ep_square = None
+        self.key = key
+        self.halfmove_clock = 0
+        self.turn ^= 1
+
+    def unmake_null_move(self):
+        _, _, _, self.ep_square, self.halfmove_clock, self.key, _, _, _ = self._undo_stack.pop()
+        if self.accumulators is not None:
+            self.accumulators.pop()
+        self.turn ^= 1
+
+    def non_pawn_material(self, color):
+        """Whether color has a piece besides pawns and king (null moves are unsafe without)."""
+        by_type = self.by_type
+        return bool(self.by_color[color] & (by_type[KNIGHT] | by_type[BISHOP] | by_type[ROOK] | by_type[QUEEN]))
+
+    # --- Queries ---
+    def pieces(self, color, piece_type=ALL_PIECES):
+        return self.by_color[color] & self.by_type[piece_type]
+
+    def king_square(self, color):
+        bb = self.by_color[color] & self.by_type[KING]
+        return (bb & -bb).bit_length() - 1 if bb else None
+
+    def attackers_to(self, sq, occupied=None):
+        """Bitboard of pieces of both colors attacking sq given an occupancy."""
+        if occupied is None:
+            occupied = self.by_type[ALL_PIECES]
+        by_type, by_color = self.by_type, self.by_color
+        return ((PAWN_ATTACKS[BLACK][sq] & by_color[WHITE] & by_type[PAWN]) |
+                (PAWN_ATTACKS[WHITE][sq] & by_color[BLACK] & by_type[PAWN]) |
+                (KNIGHT_ATTACKS[sq] & by_type[KNIGHT]) |
+                (rook_attacks(sq, occupied) & (by_type[ROOK] | by_type[QUEEN])) |
+                (bishop_attacks(sq, occupied) & (by_type[BISHOP] | by_type[QUEEN])) |
+                (KING_ATTACKS[sq] & by_type[KING]))
+
+    def is_attacked(self, sq, by_color, occupied=None):
+        return bool(self.attackers_to(sq, occupied) & self.by_color[by_color])
+
+    def attacked_by(self, color, occupied=None):
+        """Every square attacked by color's pieces given an occupancy."""
+        if occupied is None:
+            occupied = self.by_type[ALL_PIECES]
+        by_type, own = self.by_type, self.by_color[color]
+        pawns = own & by_type[PAWN]
+        if color == WHITE:
+            attacked = ((pawns & ~BB_FILE_A) << 7 | (pawns & ~BB_FILE_H) << 9) & ((1 << 64) - 1)
+        else:
+            attacked = (pawns & ~BB_FILE_A) >> 9 | (pawns & ~BB_FILE_H) >> 7
+        pieces = own & by_type[KNIGHT]
+        while pieces:
+            bb = pieces & -pieces
+            attacked |= KNIGHT_ATTACKS[bb.bit_length() - 1]
+            pieces ^= bb
+        pieces = own & (by_type[BISHOP] | by_type[QUEEN])
+        while pieces:
+            bb = pieces & -pieces
+            attacked |= bishop_attacks(bb.bit_length() - 1, occupied)
+            pieces ^= bb
+        pieces = own & (by_type[ROOK] | by_type[QUEEN])
+        while pieces:
+            bb = pieces & -pieces
+            attacked |= rook_attacks(bb.bit_length() - 1, occupied)
+            pieces ^= bb
+        pieces = own & by_type[KING]
+        while pieces:
+            bb = pieces & -pieces
+            attacked |= KING_ATTACKS[bb.bit_length() - 1]
+            pieces ^= bb
+        return attacked
+
+    def pinned(self, color):
+        """color's pieces that are the only blocker between their king and an enemy slider."""
+        ksq = self.king_square(color)
+        if ksq is None:
+            return 0
+        by_type = self.by_type
+        enemies = self.by_color[color ^ 1]
+        occupied = by_type[ALL_PIECES]
+        snipers = ((rook_attacks(ksq, 0) & (by_type[ROOK] | by_type[QUEEN])) |
+                   (bishop_attacks(ksq, 0) & (by_type[BISHOP] | by_type[QUEEN]))) & enemies
+        pinned = 0
+        while snipers:
+            bb = snipers & -snipers
+            snipers ^= bb
+            blockers = BETWEEN[ksq][bb.bit_length() - 1] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.by_color[color]
+
+    def checkers(self):
+        ksq = self.king_square(self.turn)
+        if ksq is None:
+            return 0
+        return self.attackers_to(ksq) & self.by_color[self.turn ^ 1]
+
+    def is_check(self):
+        return bool(self.checkers())
+
+    def piece_at(self, sq):
+        piece = self.board[sq]
+        return (color_of(piece), type_of(piece)) if piece != NO_PIECE else None
+
+    # --- Static exchange evaluation ---
+    def see(self, move):
+        """Material the side to move wins (centipawns) by playing move and
+        then trading on its target square, least valuable attacker first,
+        with either side free to stop. X-ray attackers behind a capturing
+        slider join in; pins are not taken into account.
+        """
+        from_sq = (move >> 6) & 63
+        to_sq = move & 63
+        move_kind = move & (3 << 14)
+        if move_kind == CASTLING:
+            return 0
+        board, by_type, by_color = self.board, self.by_type, self.by_color
+        occupied = by_type[ALL_PIECES] ^ BB_SQUARES[from_sq]
+        attacker = board[from_sq] & 7
+        if move_kind == EN_PASSANT:
+            gain = [MATERIAL[PAWN]]
+            occupied ^= BB_SQUARES[to_sq - 8 if self.turn == WHITE else to_sq + 8]
+        else:
+            gain = [MATERIAL[board[to_sq] & 7]]
+        if move_kind == PROMOTION:
+            attacker = ((move >> 12) & 3) + KNIGHT
+            gain[0] += MATERIAL[attacker] - MATERIAL[PAWN]
+        bishops = by_type[BISHOP] | by_type[QUEEN]
+        rooks = by_type[ROOK] | by_type[QUEEN]
+        attackers = self.attackers_to(to_sq, occupied) & occupied
+        side = self.turn ^ 1
+        while True:
+            own = attackers & by_color[side]
+            if not own:
+                break
+            for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+                bb = own & by_type[piece_type]
+                if bb:
+                    break
+            if piece_type == KING and attackers & by_color[side ^ 1]:
+                break  # the king cannot take a defended piece
+            # Capture the last attacker with the least valuable piece
+            gain.append(MATERIAL[attacker] - gain[-1])
+            attacker = piece_type
+            occupied ^= bb & -bb
+            if piece_type in (PAWN, BISHOP, QUEEN):
+                attackers |= bishop_attacks(to_sq, occupied) & bishops
+            if piece_type in (ROOK, QUEEN):
+                attackers |= rook_attacks(to_sq, occupied) & rooks
+            attackers &= occupied
+            side ^= 1
+        # Each side only continues the exchange while it pays
+        for i in range(len(gain) - 1, 0, -1):
+            gain[i - 1] = -max(-gain[i - 1], gain[i])
+        return gain[0]
+
+    def see_ge(self, move, threshold=0):
+        """Whether move wins at least threshold centipawns by static exchange."""
+        return self.see(move) >= threshold
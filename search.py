@@ -0,0 +1,413 @@
+# -- Search: iterative deepening negamax with alpha-beta --
+# The native engine behind the 'engine' game mode. It works on a Position
+# (see position.py) and returns moves in the packed 16-bit encoding. At the
+# horizon a quiescence search plays out captures so that leaves are quiet.
+import time
+
+from bitboard import PAWN, KNIGHT, MOVE_NONE, PROMOTION, EN_PASSANT, move_uci
+from evaluate import MATERIAL, evaluate
+from movegen import generate_legal, generate_captures
+from movepick import MovePicker, is_tactical, new_history, update_history
+from tt import TranspositionTable, BOUND_UPPER, BOUND_LOWER, BOUND_EXACT
+from tbprobe import WDL_BLESSED_LOSS, WDL_CURSED_WIN
+
+MAX_PLY = 64
+MATE = 32000
+# Scores beyond this are mates found within the search
+MATE_IN_MAX_PLY = MATE - MAX_PLY
+# Tablebase wins score just below the mates, less the plies to reach them
+TB_WIN = MATE_IN_MAX_PLY - 1
+TB_WIN_IN_MAX_PLY = TB_WIN - MAX_PLY
+INFINITE = MATE + 1
+# Quiescence captures that leave the score this far below alpha even when
+# the victim comes for free are skipped (delta pruning)
+DELTA_MARGIN = 200
+# Quiet moves are skipped at depth 1 and 2 when the static evaluation plus
+# this margin cannot reach alpha (futility pruning)
+FUTILITY_MARGIN = (0, 200, 350)
+# Half-width of the first aspiration window around the last iteration's score
+ASPIRATION_WINDOW = 50
+
+# Selective search features, each of which can be switched off for comparison
+DEFAULT_OPTIONS = {
+    'pvs': True,         # principal variation search: null windows after the first move
+    'aspiration': True,  # narrow root windows around the previous score
+    'null_move': True,   # null-move pruning
+    'lmr': True,         # late move reductions
+    'futility': True,    # futility pruning near the leaves
+}
+
+
+def value_to_tt(score, ply):
+    """Mate and tablebase scores are stored as distance from the node, not from the root."""
+    if score >= TB_WIN_IN_MAX_PLY:
+        return score + ply
+    if score <= -TB_WIN_IN_MAX_PLY:
+        return score - ply
+    return score
+
+
+def value_from_tt(score, ply):
+    if score >= TB_WIN_IN_MAX_PLY:
+        return score - ply
+    if score <= -TB_WIN_IN_MAX_PLY:
+        return score + ply
+    return score
+
+
+def tb_score(wdl, ply):
+    """Search score of a tablebase WDL value; fifty-move-rule draws lean slightly to the winner."""
+    if wdl > WDL_CURSED_WIN:
+        return TB_WIN - ply
+    if wdl < WDL_BLESSED_LOSS:
+        return -TB_WIN + ply
+    return 2 * wdl
+
+
+class _SearchAborted(Exception):
+    """Raised inside the tree when the node or time budget runs out."""
+
+
+class SearchResult:
+    """The best move of the deepest finished iteration, with its cost."""
+    __slots__ = ('move', 'score', 'depth', 'nodes', 'time', 'pv')
+
+    def __init__(self, move=MOVE_NONE, score=0, depth=0, nodes=0, time=0.0, pv=()):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.time = time
+        self.pv = list(pv)
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.time) if self.time else 0
+
+    def is_mate(self):
+        return abs(self.score) >= MATE_IN_MAX_PLY
+
+    def __repr__(self):
+        pv = ' '.join(move_uci(move) for move in self.pv)
+        return f"SearchResult(depth={self.depth}, score={self.score}, nodes={self.nodes}, pv='{pv}')"
+
+
+class Searcher:
+    """Negamax alpha-beta over a Position, deepened one ply at a time.
+
+    search() stops at max_depth or once the node or time budget is spent and
+    answers with the deepest iteration that finished. The first iteration
+    always runs to the end, so there is a move whenever one is legal.
+    Results are kept in a transposition table of hash_mb megabytes that
+    lives as long as the Searcher, so later searches start from them, as
+    do the history scores that order quiet moves (see movepick.py). Pass
+    `tt` to search with a table of the caller's, such as a shared one.
+    `options` switches the selective features of DEFAULT_OPTIONS on or off.
+    With `tablebases` (tbprobe.Tablebases), positions they cover are not
+    searched: the root plays the tables' move at once (the result has
+    depth 0) and nodes inside the tree score from the WDL tables.
+    With `network` (nnue.Network), positions are evaluated by the network
+    instead of the piece-square tables, unless a king is missing.
+    """
+
+    def __init__(self, hash_mb=16, tt=None, options=None, tablebases=None, network=None):
+        self.tt = tt if tt is not None else TranspositionTable(hash_mb)
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+        self.tablebases = tablebases
+        self.network = network
+        # Anything indexable; a search stops soon after stop_flag[0] turns true,
+        # even in its first iteration (the result may then have no move)
+        self.stop_flag = None
+        self.nodes = 0
+        self._keys = [0] * (MAX_PLY + 1)
+        self._pv = [[] for _ in range(MAX_PLY + 1)]
+        self.killers = [[MOVE_NONE, MOVE_NONE] for _ in range(MAX_PLY + 1)]
+        self.history = new_history()
+        self._history = {}
+        self._root_moves = []
+        self._node_limit = None
+        self._deadline = None
+        self._abortable = False
+
+    def search(self, pos, max_depth=MAX_PLY, max_nodes=None, time_limit=None, history=None, on_iteration=None,
+               first_depth=1):
+        """Best move for pos as a SearchResult; pos itself is not changed.
+
+        time_limit is in seconds. history holds the keys of earlier game
+        positions (Board.repetitions): reaching one again scores as a draw.
+        on_iteration(result) is called after every finished depth.
+        first_depth lets parallel helpers start deeper than the main search.
+        """
+        start = time.perf_counter()
+        pos = pos.copy()
+        if self.network is not None:
+            pos.accumulators = self.network.new_accumulators(pos)
+        self.nodes = 0
+        self._node_limit = max_nodes
+        self._deadline = start + time_limit if time_limit else None
+        self._history = history or {}
+        self._keys[0] = pos.key
+        self.tt.new_search()
+        self._new_search_stats()
+        entry = self.tt.probe(pos.key)
+        self._root_moves = list(MovePicker(pos, generate_legal(pos), entry[3] if entry else MOVE_NONE,
+                                           history=self.history[pos.turn]))
+        result = SearchResult()
+        if not self._root_moves:
+            result.score = -MATE if pos.is_check() else 0
+            return result
+        if self.tablebases:
+            probe = self.tablebases.root_move(pos)
+            if probe:
+                move, wdl = probe
+                return SearchResult(move, tb_score(wdl, 0), 0, 0, time.perf_counter() - start, [move])
+        options = self.options
+        self._pvs, self._null_move = options['pvs'], options['null_move']
+        self._lmr, self._futility = options['lmr'], options['futility']
+        score = 0
+        for depth in range(min(first_depth, max_depth), min(max_depth, MAX_PLY) + 1):
+            self._abortable = depth > first_depth
+            try:
+                score = self._aspiration(pos, depth, score if result.depth and options['aspiration'] else None)
+            except _SearchAborted:
+                break
+            pv = self._pv[0]
+            result = SearchResult(pv[0], score, depth, self.nodes, time.perf_counter() - start, pv)
+            # Search the best move first next time round
+            self._root_moves.remove(pv[0])
+            self._root_moves.insert(0, pv[0])
+            if on_iteration:
+                on_iteration(result)
+            if abs(score) >= MATE_IN_MAX_PLY and MATE - abs(score) <= depth:
+                break  # a forced mate was found and a deeper search cannot improve on it
+        result.nodes = self.nodes
+        result.time = time.perf_counter() - start
+        return result
+
+    def _aspiration(self, pos, depth, previous):
+        """Root search in a window around the previous score, widened until the score falls inside."""
+        if previous is None or depth < 4 or abs(previous) >= MATE_IN_MAX_PLY:
+            return self._negamax(pos, depth, -INFINITE, INFINITE, 0)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous - delta, previous + delta
+        while True:
+            score = self._negamax(pos, depth, alpha, beta, 0)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITE)
+            elif score >= beta:
+                beta = min(score + delta, INFINITE)
+            else:
+                return score
+            delta *= 2
+
+    def _new_search_stats(self):
+        for killers in self.killers:
+            killers[:] = [MOVE_NONE, MOVE_NONE]
+        # Keep what earlier searches learnt, at half weight
+        for table in self.history:
+            table[:] = [score // 2 for score in table]
+
+    def _update_quiet_stats(self, us, ply, move, depth, quiets_tried):
+        """A quiet move caused a cutoff: make it a killer and reward its history."""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        bonus = min(32 * depth * depth, 2048)
+        history = self.history[us]
+        update_history(history, move, bonus)
+        for quiet in quiets_tried:
+            update_history(history, quiet, -bonus)
+
+    def _check_limits(self):
+        # A stop request ends even the first iteration: a parallel helper starting
+        # deeper would otherwise run on long after the main worker has finished
+        if not self.nodes & 1023 and self.stop_flag is not None and self.stop_flag[0]:
+            raise _SearchAborted
+        if not self._abortable:
+            return
+        if self._node_limit and self.nodes >= self._node_limit:
+            raise _SearchAborted
+        if not self.nodes & 1023 and self._deadline and time.perf_counter() >= self._deadline:
+            raise _SearchAborted
+
+    def _is_draw(self, pos, ply):
+        if pos.halfmove_clock >= 100:
+            return True
+        key = pos.key
+        # Only positions since the last capture or pawn move can come back
+        if pos.halfmove_clock >= ply and key in self._history:
+            return True
+        keys = self._keys
+        for i in range(ply - 4, max(ply - pos.halfmove_clock, 0) - 1, -2):
+            if keys[i] == key:
+                return True
+        return False
+
+    def _negamax(self, pos, depth, alpha, beta, ply, allow_null=True):
+        if depth <= 0:
+            return self._qsearch(pos, alpha, beta, ply)
+        self.nodes += 1
+        self._check_limits()
+        pv = self._pv
+        pv[ply] = []
+        if ply:
+            if self._is_draw(pos, ply):
+                return 0
+            if ply >= MAX_PLY:
+                return evaluate(pos)
+
+        tt_move = MOVE_NONE
+        entry = self.tt.probe(pos.key)
+        if entry:
+            tt_depth, bound, tt_score, tt_move = entry
+            if ply and tt_depth >= depth:
+                tt_score = value_from_tt(tt_score, ply)
+                if (bound == BOUND_EXACT or (bound == BOUND_LOWER and tt_score >= beta)
+                        or (bound == BOUND_UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        # Tablebase positions are scored without a search. Probing right after a
+        # capture or pawn move means the fifty-move count cannot spoil the result.
+        tablebases = self.tablebases
+        if ply and tablebases and not pos.halfmove_clock and tablebases.covers(pos):
+            wdl = tablebases.probe_wdl(pos)
+            if wdl is not None:
+                score = tb_score(wdl, ply)
+                self.tt.store(pos.key, min(depth + 6, MAX_PLY - 1), BOUND_EXACT, value_to_tt(score, ply))
+                return score
+
+        keys = self._keys
+        in_check = pos.is_check()
+        pv_node = beta - alpha > 1
+        static_eval = evaluate(pos) if not in_check else -INFINITE
+
+        # Null move: if passing still holds beta, a real move surely would
+        if (self._null_move and allow_null and ply and not pv_node and not in_check and depth >= 3
+                and static_eval >= beta and pos.non_pawn_material(pos.turn)):
+            reduction = 3 if depth > 6 else 2
+            pos.make_null_move()
+            keys[ply + 1] = pos.key
+            score = -self._negamax(pos, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+            pos.unmake_null_move()
+            if score >= beta:
+                return beta if score >= MATE_IN_MAX_PLY else score
+
+        if ply:
+            moves = generate_legal(pos)
+            if not moves:
+                return -MATE + ply if in_check else 0
+            moves = MovePicker(pos, moves, tt_move, self.killers[ply], self.history[pos.turn])
+        else:
+            moves = self._root_moves
+        # Quiet moves here cannot lift a hopeless static evaluation to alpha
+        futile = (self._futility and ply and depth < len(FUTILITY_MARGIN) and not pv_node and not in_check
+                  and abs(alpha) < MATE_IN_MAX_PLY and static_eval + FUTILITY_MARGIN[depth] <= alpha)
+
+        alpha_orig = alpha
+        best = -INFINITE
+        best_move = MOVE_NONE
+        quiets_tried = []
+        searched = 0
+        for move in moves:
+            quiet = not is_tactical(pos, move)
+            pos.make_move(move)
+            gives_check = quiet and pos.is_check()
+            if futile and searched and quiet and not gives_check:
+                pos.unmake_move()
+                best = max(best, static_eval + FUTILITY_MARGIN[depth])
+                continue
+            keys[ply + 1] = pos.key
+            new_depth = depth - 1
+            full_depth = True
+            # Late quiet moves are searched shallower first and again in full only if they beat alpha
+            if (self._lmr and not pv_node and searched >= 3 and depth >= 3 and quiet and not in_check
+                    and not gives_check):
+                reduction = 2 if searched >= 6 and depth >= 6 else 1
+                score = -self._negamax(pos, new_depth - reduction, -alpha - 1, -alpha, ply + 1)
+                full_depth = score > alpha
+            if full_depth:
+                if self._pvs and searched:
+                    # Null window first: most later moves only need proving worse than alpha
+                    score = -self._negamax(pos, new_depth, -alpha - 1, -alpha, ply + 1)
+                    if alpha < score < beta:
+                        score = -self._negamax(pos, new_depth, -beta, -alpha, ply + 1)
+                else:
+                    score = -self._negamax(pos, new_depth, -beta, -alpha, ply + 1)
+            pos.unmake_move()
+            searched += 1
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    pv[ply] = [move] + pv[ply + 1]
+                    if score >= beta:
+                        if quiet:
+                            self._update_quiet_stats(pos.turn, ply, move, depth, quiets_tried)
+                        break
+            if quiet:
+                quiets_tried.append(move)
+        if best >= beta:
+            bound = BOUND_LOWER
+        elif best > alpha_orig:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.tt.store(pos.key, depth, bound, value_to_tt(best, ply), best_move)
+        return best
+
+    def _qsearch(self, pos, alpha, beta, ply):
+        """Search captures only until the position is quiet.
+
+        The side to move may stand pat on the static evaluation instead of
+        capturing. Out of check, captures that lose material by SEE or
+        cannot lift the score near alpha are skipped. In check every
+        evasion is searched, so mates at the horizon are still seen.
+        """
+        self.nodes += 1
+        self._check_limits()
+        pv = self._pv
+        pv[ply] = []
+        if self._is_draw(pos, ply):
+            return 0
+        if ply >= MAX_PLY:
+            return evaluate(pos)
+        in_check = pos.is_check()
+        if in_check:
+            moves = generate_legal(pos)
+            if not moves:
+                return -MATE + ply
+            best = stand_pat = -INFINITE
+        else:
+            best = stand_pat = evaluate(pos)
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = generate_captures(pos)
+
+        keys = self._keys
+        board = pos.board
+        for move in MovePicker(pos, moves, captures_only=not in_check):
+            if not in_check:
+                move_kind = move & (3 << 14)
+                gain = MATERIAL[PAWN] if move_kind == EN_PASSANT else MATERIAL[board[move & 63] & 7]
+                if move_kind == PROMOTION:
+                    gain += MATERIAL[((move >> 12) & 3) + KNIGHT] - MATERIAL[PAWN]
+                elif stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                if not pos.see_ge(move):
+                    continue
+            pos.make_move(move)
+            keys[ply + 1] = pos.key
+            score = -self._qsearch(pos, -beta, -alpha, ply + 1)
+            pos.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    pv[ply] = [move] + pv[ply + 1]
+                    if score >= beta:
+                        break
+        return best
@@ -0,0 +1,127 @@
+# -- Lazy SMP: the native search on several processes --
+# Every worker searches the same position with its own Searcher, and they all
+# read and write one transposition table in shared memory, so what one worker
+# finds saves the others work (Stockfish's threads do the same on one table).
+# The calling process is the main worker; the others are helper processes.
+import os
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+from position import Position
+from search import MAX_PLY, Searcher
+from tt import TranspositionTable
+from tbprobe import Tablebases
+from nnue import Network
+
+# The shared block: one stop byte, then the table entries
+_TT_OFFSET = 8
+
+
+def _helper_loop(conn, shm_name, hash_mb, first_depth):
+    shm = SharedMemory(name=shm_name)
+    tt = TranspositionTable(hash_mb, shm.buf[_TT_OFFSET:])
+    searcher = Searcher(tt=tt)
+    searcher.stop_flag = shm.buf[:1]
+    # Tables and networks travel as paths and are opened here once, on first use
+    opened = {}
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            fen, history, max_depth, max_nodes, time_limit, generation, tablebase_path, network_path = task
+            if tablebase_path and ('tb', tablebase_path) not in opened:
+                opened['tb', tablebase_path] = Tablebases(tablebase_path)
+            if network_path and ('nn', network_path) not in opened:
+                opened['nn', network_path] = Network(network_path)
+            searcher.tablebases = opened['tb', tablebase_path] if tablebase_path else None
+            searcher.network = opened['nn', network_path] if network_path else None
+            tt.generation = (generation - 1) & 255  # search() moves the table on to `generation`
+            result = searcher.search(Position(fen), max_depth, max_nodes, time_limit, history,
+                                     first_depth=first_depth)
+            conn.send((result.depth, result.nodes))
+    finally:
+        for (kind, _), opened_item in opened.items():
+            if kind == 'tb':
+                opened_item.close()
+        searcher.stop_flag.release()
+        tt.release()
+        shm.close()
+
+
+class ParallelSearcher:
+    """Searcher.search() spread over `workers` processes (default: one per core).
+
+    The helpers are started once and reused for every search; close() (or
+    leaving a with block) stops them and frees the shared table. Every
+    other helper skips the first iteration, so helpers do not all walk the
+    tree in step. The answer is the main worker's; nodes count everyone's.
+    tablebases and network are used by every worker: the helpers open
+    their own from the same paths.
+    """
+
+    def __init__(self, workers=None, hash_mb=16, tablebases=None, network=None):
+        self.workers = workers or os.cpu_count()
+        self.hash_mb = hash_mb
+        self._shm = SharedMemory(create=True, size=_TT_OFFSET + TranspositionTable.buffer_size(hash_mb))
+        self._shm.buf[:_TT_OFFSET] = bytes(_TT_OFFSET)
+        self.tt = TranspositionTable(hash_mb, self._shm.buf[_TT_OFFSET:])
+        self._stop = self._shm.buf[:1]
+        self.searcher = Searcher(tt=self.tt, tablebases=tablebases, network=network)
+        self._helpers = []
+        for index in range(1, self.workers):
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_helper_loop, daemon=True,
+                                              args=(child_conn, self._shm.name, hash_mb, 1 + index % 2))
+            process.start()
+            self._helpers.append((process, conn))
+
+    @property
+    def network(self):
+        return self.searcher.network
+
+    @network.setter
+    def network(self, network):
+        self.searcher.network = network
+
+    def search(self, pos, max_depth=MAX_PLY, max_nodes=None, time_limit=None, history=None, on_iteration=None):
+        """As Searcher.search; max_nodes applies to each worker."""
+        self._stop[0] = 0
+        # The helpers age the table in step with the main worker
+        generation = (self.tt.generation + 1) & 255
+        tablebases, network = self.searcher.tablebases, self.searcher.network
+        task = (pos.fen(), dict(history or {}), max_depth, max_nodes, time_limit, generation,
+                tablebases.path if tablebases else None, network.path if network else None)
+        for _, conn in self._helpers:
+            conn.send(task)
+        try:
+            result = self.searcher.search(pos, max_depth, max_nodes, time_limit, history, on_iteration)
+        finally:
+            self._stop[0] = 1
+            for _, conn in self._helpers:
+                _, nodes = conn.recv()
+                self.searcher.nodes += nodes
+        result.nodes = self.searcher.nodes
+        return result
+
+    def clear(self):
+        self.tt.clear()
+
+    def close(self):
+        for process, conn in self._helpers:
+            conn.send(None)
+            process.join()
+            conn.close()
+        self._helpers = []
+        if self._shm is not None:
+            self._stop.release()
+            self.tt.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,117 @@
+# -- Syzygy endgame tablebases --
+# The native engine's counterpart of stockfish/src/syzygy/tbprobe.cpp. The
+# table files are read by python-chess (chess.syzygy), which memory-maps
+# them, so only the pages a probe touches are loaded. WDL tables say whether
+# a position is won, drawn or lost; DTZ tables give the distance to the next
+# capture or pawn move along the best line, which is what the root needs to
+# win under the fifty-move rule.
+import os
+import chess
+import chess.syzygy
+
+from bitboard import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, popcount
+from movegen import generate_legal
+
+# WDL values, from the side to move's point of view. A cursed win is a win
+# the fifty-move rule turns into a draw; a blessed loss is the other side.
+WDL_LOSS, WDL_BLESSED_LOSS, WDL_DRAW, WDL_CURSED_WIN, WDL_WIN = -2, -1, 0, 1, 2
+
+
+def to_chess_board(pos):
+    """pos as a chess.Board, copied bitboard by bitboard.
+
+    Both use a1 = 0 and the same piece type numbers, so nothing is
+    translated square by square, and no FEN is written and parsed on every
+    probe. Castling rights are left out: the tables never cover them.
+    """
+    board = chess.Board(None)
+    board.pawns, board.knights, board.bishops = pos.by_type[PAWN], pos.by_type[KNIGHT], pos.by_type[BISHOP]
+    board.rooks, board.queens, board.kings = pos.by_type[ROOK], pos.by_type[QUEEN], pos.by_type[KING]
+    board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK] = pos.by_color
+    board.occupied = pos.by_color[0] | pos.by_color[1]
+    board.turn = pos.turn == WHITE
+    board.ep_square = pos.ep_square
+    board.halfmove_clock = pos.halfmove_clock
+    return board
+
+
+class Tablebases:
+    """The Syzygy tables in `path`: one directory, or several joined by os.pathsep.
+
+    probe_wdl and probe_dtz answer None for positions no table covers: more
+    pieces than max_pieces, castling rights left, or a missing table.
+    `hits` counts successful probes. With no table found, max_pieces is 0
+    and every probe misses.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tables = chess.syzygy.Tablebase()
+        self.max_pieces = 0
+        self.hits = 0
+        for directory in path.split(os.pathsep):
+            if directory and os.path.isdir(directory):
+                self._tables.add_directory(directory)
+        # Table names look like KQvKR: one letter per piece and a 'v'
+        for name in self._tables.wdl:
+            self.max_pieces = max(self.max_pieces, len(name) - 1)
+
+    def __len__(self):
+        return len(self._tables.wdl)
+
+    def covers(self, pos):
+        """Whether pos is small enough to probe."""
+        return not pos.castling and popcount(pos.by_color[0] | pos.by_color[1]) <= self.max_pieces
+
+    def _probe(self, probe, pos):
+        if not self.covers(pos):
+            return None
+        value = probe(to_chess_board(pos))
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def probe_wdl(self, pos):
+        """WDL_LOSS .. WDL_WIN for pos, or None."""
+        return self._probe(self._tables.get_wdl, pos)
+
+    def probe_dtz(self, pos):
+        """Plies to the next zeroing move with best play, signed like the WDL value, or None."""
+        return self._probe(self._tables.get_dtz, pos)
+
+    def root_move(self, pos):
+        """(best move, WDL) for pos by the tables, or None if they do not cover it.
+
+        Moves keep the best WDL value there is. When winning, mate comes
+        first, then captures and pawn moves (they restart the fifty-move
+        count), then the move nearest to one; when losing, the move that
+        puts the next capture or pawn move off longest. Draws take the
+        first move.
+        """
+        if not self.covers(pos):
+            return None
+        best = None
+        for move in generate_legal(pos):
+            pos.make_move(move)
+            zeroing = pos.halfmove_clock == 0
+            wdl, dtz = self.probe_wdl(pos), self.probe_dtz(pos)
+            pos.unmake_move()
+            if wdl is None or dtz is None:
+                return None
+            # wdl and dtz are the opponent's: a win for us is a negative dtz, nearer zero is sooner
+            if wdl < 0:
+                tiebreak = 1 if not dtz else 0 if zeroing else dtz
+            else:
+                tiebreak = dtz if wdl else 0
+            rank = (-wdl, tiebreak)
+            if best is None or rank > best[0]:
+                best = (rank, move)
+        if best is None:
+            return None
+        return best[1], best[0][0]
+
+    def close(self):
+        self._tables.close()
+
+    def __repr__(self):
+        return f"Tablebases({self.path!r}, {len(self)} tables, up to {self.max_pieces} pieces)"
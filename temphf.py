@@ -7,6 +7,20 @@ import pygame
 import stockfish 
 import chess
 import json
+from bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, NORMAL, PROMOTION,
+    PIECE_SYMBOLS, PIECE_VALUES, PIECE_TYPE_NAMES, PIECE_TYPE_FROM_NAME, BB_SQUARES, SQUARE_ROW_COL, SQUARE_NAMES,
+    COLOR_NAMES, square_of, row_col, parse_square, make_piece, make_move, move_from, move_to, move_type,
+    promotion_type,
+)
+from position import Position, CASTLING_RIGHTS_MASK
+from zobrist import ZOBRIST_PSQ, ZOBRIST_CASTLING, ZOBRIST_EP, ZOBRIST_WHITE
+from movegen import generate_legal
+from smp import ParallelSearcher
+from mcts import MCTS
+from book import OpeningBook
+from tbprobe import Tablebases
+from nnue import Network
 import math
 
 # --- Constants ---
@@ -366,78 +380,154 @@ class EvaluationBar:
 
 # --- Piece Classes ---
 class Piece:
-    def __init__(self, name, color, value):
-        self.name = name
-        self.color = color
-        self.value = value * (1 if color == 'white' else -1)
-        self.moves = []
-        self.moved = False
-        self.char = UNICODE_PIECES[f'{color[0]}_{name}']
-        self.font_color = PIECE_COLORS[color]
+    """Immutable piece descriptor, one shared instance per color and type.
+
+    Calling a piece class returns the shared instance (Queen('white') is
+    Queen('white')), so boards and snapshots copy pieces by reference.
+    Per-board state such as moved flags and legal moves lives on Board.
+    """
+    __slots__ = ('name', 'color', 'value', 'char', 'font_color', 'dir', 'piece_type', 'code')
+    _instances = {}
+    kind = None
+    base_value = 0.0
+
+    def __new__(cls, color):
+        piece = Piece._instances.get((cls, color))
+        if piece is None:
+            piece = object.__new__(cls)
+            init = object.__setattr__
+            init(piece, 'name', cls.kind)
+            init(piece, 'color', color)
+            init(piece, 'value', cls.base_value * (1 if color == 'white' else -1))
+            init(piece, 'char', UNICODE_PIECES[f'{color[0]}_{cls.kind}'])
+            init(piece, 'font_color', PIECE_COLORS[color])
+            init(piece, 'dir', -1 if color == 'white' else 1)
+            init(piece, 'piece_type', PIECE_TYPE_FROM_NAME[cls.kind])
+            # Bitboard piece code, (color << 3) | type
+            init(piece, 'code', make_piece(WHITE if color == 'white' else BLACK, piece.piece_type))
+            Piece._instances[(cls, color)] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError("pieces are shared between boards and cannot be changed")
+
+    def __copy__(self):
+        return self
 
-    def add_move(self, move):
-        self.moves.append(move)
+    def __deepcopy__(self, memo):
+        return self
 
-    def clear_moves(self):
-        self.moves = []
+    def __reduce__(self):
+        return (self.__class__, (self.color,))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.color!r})"
 
 class Pawn(Piece):
-    def __init__(self, color):
-        self.dir = -1 if color == 'white' else 1
-        super().__init__('pawn', color, 1.0)
+    __slots__ = ()
+    kind, base_value = 'pawn', PIECE_VALUES[PAWN]
 
 class Knight(Piece):
-    def __init__(self, color):
-        super().__init__('knight', color, 3.0)
+    __slots__ = ()
+    kind, base_value = 'knight', PIECE_VALUES[KNIGHT]
 
 class Bishop(Piece):
-    def __init__(self, color):
-        super().__init__('bishop', color, 3.001)
+    __slots__ = ()
+    kind, base_value = 'bishop', PIECE_VALUES[BISHOP]
 
 class Rook(Piece):
-    def __init__(self, color):
-        super().__init__('rook', color, 5.0)
+    __slots__ = ()
+    kind, base_value = 'rook', PIECE_VALUES[ROOK]
 
 class Queen(Piece):
-    def __init__(self, color):
-        super().__init__('queen', color, 9.0)
+    __slots__ = ()
+    kind, base_value = 'queen', PIECE_VALUES[QUEEN]
 
 class King(Piece):
-    def __init__(self, color):
-        super().__init__('king', color, 10000.0)
+    __slots__ = ()
+    kind, base_value = 'king', PIECE_VALUES[KING]
+
+# Promotion letters as used in Move.promotion_piece
+PROMOTION_PIECES = {'q': Queen, 'r': Rook, 'b': Bishop, 'n': Knight}
 
 # --- Move Class ---
 class Move:
-    def __init__(self, initial, final):
-        self.initial = initial
-        self.final = final
-        self.valid = self.check_valid()
-        self.promotion_piece = None
-
-    def check_valid(self):
-        return 0 <= self.initial.x < 8 and 0 <= self.initial.y < 8 and 0 <= self.final.x < 8 and 0 <= self.final.y < 8
-
-    def san(self):
-        temp = chr(97+int(self.initial.x))+str(8 - int(self.initial.y))+chr(97+int(self.final.x))+str(8 - int(self.final.y))
-        if self.promotion_piece != None:
-            temp += self.promotion_piece
-        return temp
-
-    def san_to_move(san_str):
-        if san_str == None:
+    """A move between two squares (a1 = 0 ... h8 = 63, see bitboard.py).
+
+    `flags` holds the bitboard move type (PROMOTION, EN_PASSANT, CASTLING) when
+    the generator supplied one. Moves compare and hash on their squares and
+    promotion piece, so underpromotions on the same squares are different
+    moves. A move is fixed once made: with_promotion() gives the move with a
+    promotion piece chosen.
+    """
+    __slots__ = ('from_sq', 'to_sq', 'flags', '_promotion_piece', '_uci')
+
+    def __init__(self, from_sq, to_sq, promotion_piece=None, flags=NORMAL):
+        self.from_sq = from_sq
+        self.to_sq = to_sq
+        self.flags = flags
+        self._promotion_piece = promotion_piece
+        self._uci = None
+
+    @classmethod
+    def from_uci(cls, uci):
+        if uci is None:
             return None
-        if len(san_str) < 4:
-            raise ValueError("SAN string must be at least 4 characters long")
-        initial_file = ord(san_str[0]) - ord('a')
-        initial_rank = 8 - int(san_str[1])
-        final_file = ord(san_str[2]) - ord('a')
-        final_rank = 8 - int(san_str[3])
-        initial = pygame.math.Vector2(initial_file, initial_rank)
-        final = pygame.math.Vector2(final_file, final_rank)
-        return [initial, final]
+        if len(uci) < 4:
+            raise ValueError("UCI string must be at least 4 characters long")
+        return cls(parse_square(uci[0:2]), parse_square(uci[2:4]), uci[4:5] or None)
+
+    @classmethod
+    def from_packed(cls, move):
+        """Move for a 16-bit bitboard move (see bitboard.make_move)."""
+        kind = move_type(move)
+        promotion = PIECE_SYMBOLS[promotion_type(move)] if kind == PROMOTION else None
+        return cls(move_from(move), move_to(move), promotion, kind)
+
+    @property
+    def promotion_piece(self):
+        return self._promotion_piece
+
+    def with_promotion(self, letter):
+        """This move promoting to `letter` ('q', 'r', 'b' or 'n')."""
+        return Move(self.from_sq, self.to_sq, letter, PROMOTION)
+
+    @property
+    def initial(self):
+        """Board.squares (row, col) of the origin."""
+        return SQUARE_ROW_COL[self.from_sq]
+
+    @property
+    def final(self):
+        """Board.squares (row, col) of the destination."""
+        return SQUARE_ROW_COL[self.to_sq]
+
+    def uci(self):
+        if self._uci is None:
+            text = SQUARE_NAMES[self.from_sq] + SQUARE_NAMES[self.to_sq]
+            if self._promotion_piece is not None:
+                text += self._promotion_piece
+            self._uci = text
+        return self._uci
+
+    # Older callers know the UCI text as san()
+    san = uci
+
+    def packed(self):
+        """The 16-bit bitboard encoding of this move."""
+        if self._promotion_piece is not None:
+            return make_move(self.from_sq, self.to_sq, PROMOTION, PIECE_SYMBOLS.index(self._promotion_piece))
+        return make_move(self.from_sq, self.to_sq, self.flags)
 
     def __eq__(self, other):
-        return self.initial == other.initial and self.final == other.final
+        return (isinstance(other, Move) and self.from_sq == other.from_sq and self.to_sq == other.to_sq
+                and self._promotion_piece == other._promotion_piece)
+
+    def __hash__(self):
+        return hash((self.from_sq, self.to_sq, self._promotion_piece))
+
+    def __repr__(self):
+        return f"Move({self.uci()})"
 
 # --- GameSnapshot for undo/redo functionality ---
 class GameSnapshot:
@@ -447,28 +537,40 @@ class GameSnapshot:
         self.turn = turn
         self.game_over_message = game_over_message
         self.gamestate = gamestate
-        # Store FEN for Stockfish synchronization
-        self.fen = board._board.fen() if board else None
+
+    @property
+    def fen(self):
+        """FEN for Stockfish synchronization, derived from the stored board when asked for."""
+        return self.board._board.fen() if self.board else None
 
 # --- Board Class with Stockfish improvements ---
 class Board:
-    def __init__(self, enable_stockfish=True, stockfish_level=10, stockfish_path="stockfish-windows-x86-64-avx2.exe"):
+    def __init__(self, enable_stockfish=True, stockfish_level=10, stockfish_path="stockfish-windows-x86-64-avx2.exe",
+                 syzygy_path=""):
         self.squares = [[0 for _ in range(COLS)] for _ in range(ROWS)]
         self.last_move = None
         self.move_list = []
-        self.best_move_list_san = []
-        self.best_move_list = []
-        self.evaluation_list = []
+        # Stockfish results keyed by Board.key, shared by every clone of this board
+        self.evaluations = {}
+        self.best_moves = {}
+        self._history_shared = False
+        # Bitmask of squares (a1 = 0) whose piece has moved, and square -> legal Moves
+        self.moved = 0
+        self.legal_moves = {}
         self._create_board()
         self._add_pieces('white')
         self._add_pieces('black')
         self._board = chess.Board()
-        self.king_position = [[7, 4], [0, 4]]
+        self._rebuild_piece_lists()
+        self._reset_key()
         self.promoting = False
         self.promotion_move = None
+        self._undo_stack = []
         self.board_stockfish = None
         self.stockfish_level = stockfish_level
         self.stockfish_path = stockfish_path
+        # Syzygy directories for Stockfish (its SyzygyPath option); empty for none
+        self.syzygy_path = syzygy_path
         self.stockfish_enabled = enable_stockfish
         if enable_stockfish:
             self._enable_stockfish(stockfish_level)
@@ -478,6 +580,8 @@ class Board:
             self.board_stockfish = stockfish.Stockfish(path=self.stockfish_path)
             self.stockfish_level = level
             self.board_stockfish.set_skill_level(level)
+            if self.syzygy_path:
+                self.board_stockfish.update_engine_parameters({"SyzygyPath": self.syzygy_path})
             self.stockfish_enabled = True
         except:
             print("Stockfish not found. AI features disabled.")
@@ -497,6 +601,8 @@ class Board:
         self.stockfish_level = level
         if self.board_stockfish:
             self.board_stockfish.set_skill_level(level)
+        # Best moves depend on the skill level; evaluations do not
+        self.best_moves = {}
 
     def _create_board(self):
         self.squares = [[0 for _ in range(COLS)] for _ in range(ROWS)]
@@ -517,10 +623,91 @@ class Board:
     def clear_board(self):
         """Clear all pieces from the board."""
         self.squares = [[0 for _ in range(COLS)] for _ in range(ROWS)]
+        self._rebuild_piece_lists()
+        self.moved = 0
+        self.legal_moves = {}
         self.move_list = []
         self.last_move = None
         self._board = chess.Board()
         self._board.clear_board()
+        self._reset_key()
+
+    def _rebuild_piece_lists(self):
+        """Recreate the per-color piece lists from squares.
+
+        pieces[side] maps (row, col) -> piece, with side 0 for white and 1
+        for black. Every change to squares goes through _list_piece /
+        _unlist_piece so the lists never need another scan. The same calls
+        keep piece_counts (pieces of both colors by piece type) and
+        bishop_square_colors (bishops on each square color) for the draw checks.
+        """
+        self.pieces = [{}, {}]
+        self.king_position = [None, None]
+        self.piece_counts = [0] * 7
+        self.bishop_square_colors = [0, 0]
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = self.squares[row][col]
+                if piece != 0:
+                    self._list_piece(row, col, piece)
+
+    def _reset_key(self, side=WHITE, ep_square=None, halfmove_clock=0):
+        """Recompute castling rights, en passant square and key from scratch.
+
+        Castling rights follow the moved flags of the kings and rooks on their
+        home squares; ep_square is kept only if a pawn of `side` can take.
+        Everything that changes the position afterwards updates these
+        incrementally, so this runs only when a position is set up. The
+        repetition table restarts with the current position.
+        """
+        pos = Position.from_squares(self.squares, COLOR_NAMES[side], None, self.all_pieces(), self.moved, ep_square)
+        self.side = side
+        self.castling = pos.castling
+        self.ep_square = pos.ep_square
+        self.key = pos.key
+        self.halfmove_clock = halfmove_clock
+        # key -> times seen since the last pawn move or capture; nothing older can recur
+        self.repetitions = {self.key: 1}
+
+    def all_pieces(self):
+        """(row, col), piece pairs for every piece on the board."""
+        return list(self.pieces[0].items()) + list(self.pieces[1].items())
+
+    def _list_piece(self, row, col, piece):
+        side = piece.color == 'black'
+        self.pieces[side][(row, col)] = piece
+        self.piece_counts[piece.piece_type] += 1
+        if isinstance(piece, King):
+            self.king_position[side] = [row, col]
+        elif isinstance(piece, Bishop):
+            self.bishop_square_colors[(row + col) & 1] += 1
+
+    def _unlist_piece(self, row, col, piece):
+        side = piece.color == 'black'
+        del self.pieces[side][(row, col)]
+        self.piece_counts[piece.piece_type] -= 1
+        if isinstance(piece, King):
+            self.king_position[side] = None
+        elif isinstance(piece, Bishop):
+            self.bishop_square_colors[(row + col) & 1] -= 1
+
+    def has_moved(self, row, col):
+        """Whether the piece on (row, col) has moved since it was placed."""
+        return bool(self.moved & BB_SQUARES[square_of(row, col)])
+
+    def moves_from(self, row, col):
+        """Legal moves last calculated for the piece on (row, col)."""
+        return self.legal_moves.get(square_of(row, col), ())
+
+    def add_move(self, move):
+        self.legal_moves.setdefault(move.from_sq, []).append(move)
+
+    def clear_moves(self, row=None, col=None):
+        """Forget the legal moves of one square, or of every square."""
+        if row is None:
+            self.legal_moves = {}
+        else:
+            self.legal_moves.pop(square_of(row, col), None)
 
     def set_piece(self, row, col, piece_type, color):
         """Set a specific piece at a position."""
@@ -529,13 +716,19 @@ class Board:
             'rook': Rook, 'queen': Queen, 'king': King
         }
         if piece_type in piece_map:
+            self.remove_piece(row, col)
             self.squares[row][col] = piece_map[piece_type](color)
-            if piece_type == 'king':
-                self.king_position[color == 'black'] = [row, col]
+            self._list_piece(row, col, self.squares[row][col])
+            self.moved &= ~BB_SQUARES[square_of(row, col)]
+            self._reset_key(self.side)
 
     def remove_piece(self, row, col):
         """Remove a piece from a position."""
+        if self.squares[row][col] != 0:
+            self._unlist_piece(row, col, self.squares[row][col])
         self.squares[row][col] = 0
+        self.moved &= ~BB_SQUARES[square_of(row, col)]
+        self._reset_key(self.side)
 
     def get_fen(self):
         """Get current position as FEN."""
@@ -565,140 +758,339 @@ class Board:
                     }
                     if piece.piece_type in piece_map:
                         self.squares[row][col] = piece_map[piece.piece_type](color)
-                        if piece.piece_type == chess.KING:
-                            self.king_position[color == 'black'] = [row, col]
+        self._rebuild_piece_lists()
+        # A right missing from the FEN counts as its rook having moved
+        self.moved = 0
+        for rook_sq in (0, 7, 56, 63):
+            if not self._board.castling_rights & BB_SQUARES[rook_sq]:
+                self.moved |= BB_SQUARES[rook_sq]
+        self._reset_key(WHITE if self._board.turn == chess.WHITE else BLACK, self._board.ep_square,
+                        self._board.halfmove_clock)
 
     def set_stockfish(self):
         if self.board_stockfish:
             self.board_stockfish.set_fen_position(self._board.fen())
 
+    def _own_history(self):
+        """Take private copies of the history lists before changing them.
+
+        clone() hands the same lists to both boards; whichever one changes its
+        history first pays for the copy.
+        """
+        if self._history_shared:
+            self.move_list = self.move_list[:]
+            self._history_shared = False
+
     def clear_stockfish_cache(self):
-        """Clear Stockfish evaluation and best move cache."""
-        current_moves = len(self.move_list)
-        self.best_move_list_san = self.best_move_list_san[:current_moves]
-        self.best_move_list = self.best_move_list[:current_moves]
-        self.evaluation_list = self.evaluation_list[:current_moves]
+        """Forget every cached Stockfish evaluation and best move."""
+        # Fresh dicts rather than clear(): clones share the old ones
+        self.evaluations = {}
+        self.best_moves = {}
 
     def sync_from_fen(self, fen):
         """Synchronize the internal chess board from a FEN string."""
         self._board = chess.Board(fen)
-        self.clear_stockfish_cache()
 
     def get_evaluation(self):
         if self.board_stockfish == None:
             return None
-        if len(self.evaluation_list) == len(self.move_list) + 1:
-            return self.evaluation_list[-1]
-        self.set_stockfish()
-        try:
-            self.evaluation_list.append(self.board_stockfish.get_evaluation())
-        except:
-            self.evaluation_list.append(None)
-        return self.evaluation_list[-1]
+        if self.key not in self.evaluations:
+            self.set_stockfish()
+            try:
+                self.evaluations[self.key] = self.board_stockfish.get_evaluation()
+            except:
+                self.evaluations[self.key] = None
+        return self.evaluations[self.key]
 
     def get_best_move(self):
         if self.board_stockfish == None:
             return None
-        if len(self.best_move_list) == len(self.move_list) + 1:
-            return self.best_move_list[-1]
-        best_move_san = self.get_best_move_san()
-        if best_move_san:
-            self.best_move_list.append(Move.san_to_move(best_move_san))
-        else:
-            self.best_move_list.append(None)
-        return self.best_move_list[-1]
+        if self.key not in self.best_moves:
+            self.set_stockfish()
+            try:
+                self.best_moves[self.key] = Move.from_uci(self.board_stockfish.get_best_move())
+            except:
+                self.best_moves[self.key] = None
+        return self.best_moves[self.key]
 
     def get_best_move_san(self):
-        if self.board_stockfish == None:
-            return None
-        if len(self.best_move_list_san) == len(self.move_list) + 1:
-            return self.best_move_list_san[-1]
-        self.set_stockfish()
-        try:
-            self.best_move_list_san.append(self.board_stockfish.get_best_move())
-        except:
-            self.best_move_list_san.append(None)
-        return self.best_move_list_san[-1]
+        best_move = self.get_best_move()
+        return best_move.uci() if best_move else None
+
+    # --- python-chess view ---
+    @property
+    def _board(self):
+        """The python-chess board, caught up with squares when it is read.
+
+        squares is the authoritative position. Played moves queue up in
+        _pending_moves and reach python-chess as chess.Move objects only when
+        something asks for it (a FEN for Stockfish, a snapshot, ...).
+        """
+        if self._pending_moves:
+            board = self._chess_board
+            if self._chess_shared:
+                board = self._chess_board = board.copy(stack=False)
+                self._chess_shared = False
+            for move in self._pending_moves:
+                promotion = PIECE_SYMBOLS.index(move.promotion_piece) if move.promotion_piece else None
+                board.push(chess.Move(move.from_sq, move.to_sq, promotion))
+            self._pending_moves = []
+        return self._chess_board
+
+    @_board.setter
+    def _board(self, board):
+        self._chess_board = board
+        self._chess_shared = False
+        self._pending_moves = []
 
     def push_move(self, move, making_move=True):
+        self._own_history()
         self.last_move = move
         self.move_list.append(move)
         if making_move:
-            self._board.push_san(move.san())
-        # Clear the best move cache when a move is made
-        self.clear_stockfish_cache()
+            self._pending_moves.append(move)
 
     def move(self, piece, move, making_move=True):
         if self.promoting:
             return
-        self.promoting = self.check_promotion(piece, move.final)
+        self.promoting = self.check_promotion(piece, move.to_sq)
+        self._apply_move(piece, move)
+        if self.promoting:
+            self.promotion_move = move
+            return
+        self.push_move(move, making_move)
 
-        initial_row, initial_col = int(move.initial.y), int(move.initial.x)
-        final_row, final_col = int(move.final.y), int(move.final.x)
+    def _apply_move(self, piece, move):
+        """Move the pieces on squares and return what unmake_move needs to restore them.
+
+        The moved flags, castling rights, en passant square and key are updated
+        incrementally along the way.
+        """
+        from_sq, to_sq = move.from_sq, move.to_sq
+        initial_row, initial_col = SQUARE_ROW_COL[from_sq]
+        final_row, final_col = SQUARE_ROW_COL[to_sq]
+        captured = self.squares[final_row][final_col]
+        captured_row = final_row
+        rook_move = None
+        state = (self.moved, self.key, self.castling, self.ep_square, self.halfmove_clock, self.repetitions)
+        # The moved flag travels with the piece: clear the origin, set the target
+        moved = (self.moved & ~BB_SQUARES[from_sq]) | BB_SQUARES[to_sq]
+        psq = ZOBRIST_PSQ[piece.code]
+        key = self.key ^ ZOBRIST_WHITE ^ psq[from_sq] ^ psq[to_sq]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+        ep_square = None
 
         # En passant
-        if isinstance(piece, Pawn) and abs(final_row - initial_row) == 1 and abs(final_col - initial_col) == 1 and not self.squares[final_row][final_col]:
+        if isinstance(piece, Pawn) and abs(final_row - initial_row) == 1 and abs(final_col - initial_col) == 1 and not captured:
+            captured = self.squares[initial_row][final_col]
+            captured_row = initial_row
             self.squares[initial_row][final_col] = 0
-        
+            moved &= ~BB_SQUARES[square_of(initial_row, final_col)]
+        if captured:
+            self._unlist_piece(captured_row, final_col, captured)
+            key ^= ZOBRIST_PSQ[captured.code][square_of(captured_row, final_col)]
+
         # Castling
         if isinstance(piece, King) and abs(final_col - initial_col) == 2:
             rook_col = 0 if final_col < initial_col else 7
             new_rook_col = 3 if final_col < initial_col else 5
             rook = self.squares[initial_row][rook_col]
+            rook_move = (rook, rook_col, new_rook_col)
             self.squares[initial_row][new_rook_col] = rook
             self.squares[initial_row][rook_col] = 0
-            rook.moved = True
+            self._unlist_piece(initial_row, rook_col, rook)
+            self._list_piece(initial_row, new_rook_col, rook)
+            rook_from, rook_to = square_of(initial_row, rook_col), square_of(initial_row, new_rook_col)
+            moved = (moved & ~BB_SQUARES[rook_from]) | BB_SQUARES[rook_to]
+            key ^= ZOBRIST_PSQ[rook.code][rook_from] ^ ZOBRIST_PSQ[rook.code][rook_to]
+
+        castling = self.castling & CASTLING_RIGHTS_MASK[from_sq] & CASTLING_RIGHTS_MASK[to_sq]
+        if castling != self.castling:
+            key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+
+        # A double push leaves an en passant square only if an enemy pawn can take
+        if isinstance(piece, Pawn) and abs(final_row - initial_row) == 2:
+            for col in (final_col - 1, final_col + 1):
+                if 0 <= col < COLS:
+                    neighbour = self.squares[final_row][col]
+                    if isinstance(neighbour, Pawn) and neighbour.color != piece.color:
+                        ep_square = (from_sq + to_sq) >> 1
+                        key ^= ZOBRIST_EP[ep_square & 7]
+                        break
+
+        if captured or isinstance(piece, Pawn):
+            self.halfmove_clock = 0
+            self.repetitions = {key: 1}
+        else:
+            self.halfmove_clock += 1
+            self.repetitions[key] = self.repetitions.get(key, 0) + 1
 
+        undo = (move, piece, captured, captured_row, rook_move, self.last_move, state)
+        self.moved, self.key, self.castling, self.ep_square = moved, key, castling, ep_square
+        self.side ^= 1
         self.squares[initial_row][initial_col] = 0
-        piece.moved = True
         self.squares[final_row][final_col] = piece
+        self._unlist_piece(initial_row, initial_col, piece)
+        self._list_piece(final_row, final_col, piece)
+        return undo
+
+    def _promote(self, row, col, new_piece):
+        """Swap the pawn on (row, col) for new_piece, keeping the key in step."""
+        pawn = self.squares[row][col]
+        sq = square_of(row, col)
+        self._unlist_piece(row, col, pawn)
+        self.squares[row][col] = new_piece
+        self._list_piece(row, col, new_piece)
+        self.key ^= ZOBRIST_PSQ[pawn.code][sq] ^ ZOBRIST_PSQ[new_piece.code][sq]
+        # A pawn just moved, so the repetition table holds only this position
+        self.repetitions = {self.key: 1}
+
+    def make_move(self, move):
+        """Play a move in place, recording on the undo stack what unmake_move needs.
+
+        Unlike move(), this leaves the move list, the python-chess board and the
+        Stockfish caches alone, so it is cheap enough for legality testing.
+        A set move.promotion_piece replaces the pawn on arrival.
+        """
+        initial_row, initial_col = SQUARE_ROW_COL[move.from_sq]
+        piece = self.squares[initial_row][initial_col]
+        undo = self._apply_move(piece, move)
+        if move.promotion_piece is not None and self.check_promotion(piece, move.to_sq):
+            final_row, final_col = SQUARE_ROW_COL[move.to_sq]
+            self._promote(final_row, final_col, PROMOTION_PIECES[move.promotion_piece](piece.color))
+        self.last_move = move
+        self._undo_stack.append(undo)
+
+    def unmake_move(self):
+        """Take back the last make_move."""
+        move, piece, captured, captured_row, rook_move, last_move, state = self._undo_stack.pop()
+        initial_row, initial_col = SQUARE_ROW_COL[move.from_sq]
+        final_row, final_col = SQUARE_ROW_COL[move.to_sq]
+        # After a promotion the square holds the new piece rather than the pawn
+        self._unlist_piece(final_row, final_col, self.squares[final_row][final_col])
+        self.squares[final_row][final_col] = 0
+        self.squares[captured_row][final_col] = captured
+        self.squares[initial_row][initial_col] = piece
+        self._list_piece(initial_row, initial_col, piece)
+        if captured:
+            self._list_piece(captured_row, final_col, captured)
+        repetitions = state[5]
+        if repetitions is self.repetitions:
+            count = repetitions[self.key] - 1
+            if count:
+                repetitions[self.key] = count
+            else:
+                del repetitions[self.key]
+        self.moved, self.key, self.castling, self.ep_square, self.halfmove_clock, self.repetitions = state
+        self.side ^= 1
+        if rook_move:
+            rook, rook_col, new_rook_col = rook_move
+            self.squares[initial_row][rook_col] = rook
+            self.squares[initial_row][new_rook_col] = 0
+            self._unlist_piece(initial_row, new_rook_col, rook)
+            self._list_piece(initial_row, rook_col, rook)
+        self.last_move = last_move
 
-        if isinstance(piece, King):
-            self.king_position[piece.color == "black"] = [final_row, final_col]
-
-        if self.promoting:
-            self.promotion_move = move
-            return
-        self.push_move(move, making_move)
-    
     def promote_pawn(self, row, col, piece_name):
         color = self.squares[row][col].color
-        self.promotion_move.promotion_piece = piece_name[0]
-        if piece_name == 'queen': 
-            self.squares[row][col] = Queen(color)
-        elif piece_name == 'rook': 
-            self.squares[row][col] = Rook(color)
-        elif piece_name == 'bishop': 
-            self.squares[row][col] = Bishop(color)
-        elif piece_name == 'knight': 
-            self.squares[row][col] = Knight(color)
-            self.promotion_move.promotion_piece = 'n'
-        self.push_move(self.promotion_move)
+        move = self.promotion_move.with_promotion('n' if piece_name == 'knight' else piece_name[0])
+        self._promote(row, col, PROMOTION_PIECES[move.promotion_piece](color))
+        self.push_move(move)
         self.promoting = False
         self.promotion_move = None
 
-    def check_promotion(self, piece, final_pos):
-        return isinstance(piece, Pawn) and (final_pos.y == 0 or final_pos.y == 7)
+    # --- Draw detection ---
+    def is_repetition(self, count=3):
+        """Whether the current position has occurred `count` times."""
+        return self.repetitions.get(self.key, 0) >= count
+
+    def is_fifty_moves(self):
+        return self.halfmove_clock >= 100
+
+    def is_insufficient_material(self):
+        """Neither side can mate: bare kings plus one minor piece, or bishops on one square color.
+
+        Any number of bishops counts as long as they all stand on one square
+        color. Reads the counts the piece lists keep, so nothing is scanned.
+        """
+        counts = self.piece_counts
+        if counts[PAWN] or counts[ROOK] or counts[QUEEN]:
+            return False
+        if counts[KNIGHT]:
+            return counts[KNIGHT] == 1 and not counts[BISHOP]
+        return not all(self.bishop_square_colors)
+
+    def draw_reason(self):
+        """Why the position is drawn (besides stalemate), or None."""
+        if self.is_insufficient_material():
+            return "insufficient material"
+        if self.is_fifty_moves():
+            return "the fifty-move rule"
+        if self.is_repetition():
+            return "threefold repetition"
+        return None
 
-    def clone(self):
+    # --- Static exchange ---
+    def see(self, move):
+        """Centipawns the side to move wins by playing move and trading on its target square.
+
+        See Position.see. A promotion without a chosen piece counts as a queen.
+        """
+        position = Position.from_squares(self.squares, COLOR_NAMES[self.side], None, self.all_pieces(), self.moved,
+                                         self.ep_square)
+        if move.flags == PROMOTION and move.promotion_piece is None:
+            return position.see(make_move(move.from_sq, move.to_sq, PROMOTION, QUEEN))
+        return position.see(move.packed())
+
+    def check_promotion(self, piece, to_sq):
+        return isinstance(piece, Pawn) and (to_sq < 8 or to_sq >= 56)
+
+    def clone(self, history=True):
+        """Copy the board; the cost does not grow with the length of the game.
+
+        Move history is shared with the original and copied lazily by
+        whichever board changes it first; the Stockfish caches are keyed by
+        position and shared outright. Pass history=False for a search copy
+        that leaves the history out altogether.
+        """
         new = self.__class__.__new__(self.__class__)
-        new.move_list = copy.deepcopy(self.move_list)
+        if history:
+            new.move_list = self.move_list
+            new._history_shared = self._history_shared = True
+        else:
+            new.move_list = []
+            new._history_shared = False
+        # Cached Stockfish results depend only on the position key
+        new.evaluations = self.evaluations
+        new.best_moves = self.best_moves
         new.promoting = self.promoting
         new.promotion_move = copy.deepcopy(self.promotion_move)
-        new.squares = [
-            [copy.deepcopy(piece) for piece in row]
-            for row in self.squares
-        ]
-        new.king_position = copy.deepcopy(self.king_position)
-        new.last_move = copy.deepcopy(self.last_move)
-        new._board = self._board.copy()
+        # Pieces are shared flyweights, so the grid and piece lists copy by reference
+        new.squares = [row[:] for row in self.squares]
+        new.pieces = [self.pieces[0].copy(), self.pieces[1].copy()]
+        new.king_position = self.king_position[:]
+        new.piece_counts = self.piece_counts[:]
+        new.bishop_square_colors = self.bishop_square_colors[:]
+        new.moved = self.moved
+        new.side, new.castling, new.ep_square, new.key = self.side, self.castling, self.ep_square, self.key
+        new.halfmove_clock = self.halfmove_clock
+        # Bounded by the positions since the last pawn move or capture
+        new.repetitions = self.repetitions.copy()
+        # Move lists are only ever rebuilt after clear_moves, never appended to in place
+        new.legal_moves = self.legal_moves.copy()
+        new._undo_stack = []
+        # Played moves are never changed again, so the last one can be shared
+        new.last_move = self.last_move
+        # The python-chess board is shared until either side catches it up
+        new._chess_board = self._chess_board
+        new._chess_shared = self._chess_shared = True
+        new._pending_moves = self._pending_moves[:]
         new.board_stockfish = None
         new.stockfish_enabled = self.stockfish_enabled
         new.stockfish_level = self.stockfish_level
         new.stockfish_path = self.stockfish_path
-        new.best_move_list_san = copy.deepcopy(self.best_move_list_san)
-        new.best_move_list = copy.deepcopy(self.best_move_list)
-        new.evaluation_list = copy.deepcopy(self.evaluation_list)
+        new.syzygy_path = self.syzygy_path
         return new
 
     def __deepcopy__(self, memo):
@@ -825,6 +1217,14 @@ class Game:
         self.promotion_pieces = ['queen', 'rook', 'bishop', 'knight'] 
         self.game_over_message = ""
         self.game_mode = None
+        self.book = self.open_book()
+        self.tablebases = self.open_tablebases()
+        self.network = self.open_network()
+        # Started on the first engine move; its helper processes live as long as the game
+        self.searcher = None
+        # Started on the first MCTS move; its rollout pool lives until the game goes back to the menu
+        self.mcts = None
+        self.mcts_result = None
         
         # Evaluation bar
         self.eval_bar = EvaluationBar(WIDTH - EVAL_BAR_WIDTH - 20, 40, EVAL_BAR_WIDTH, EVAL_BAR_HEIGHT)
@@ -863,6 +1263,14 @@ class Game:
                 self.permanent_undo = settings.get("permanent_undo", True)
                 self.show_legal_moves = settings.get("show_legal_moves", True)
                 self.animation_speed = settings.get("animation_speed", 500)
+                self.engine_time = settings.get("engine_time", 2000)
+                self.engine_nodes = settings.get("engine_nodes", 0)
+                self.engine_workers = settings.get("engine_workers", 0)
+                self.use_book = settings.get("use_book", True)
+                self.book_path = settings.get("book_path", "book.bin")
+                self.syzygy_path = settings.get("syzygy_path", "syzygy")
+                self.use_nnue = settings.get("use_nnue", True)
+                self.nnue_path = settings.get("nnue_path", "nn-1c0000000000.nnue")
                 print("Settings loaded successfully.")
         except (FileNotFoundError, json.JSONDecodeError):
             print("Settings file not found. Using default settings.")
@@ -878,6 +1286,14 @@ class Game:
             self.permanent_undo = True
             self.show_legal_moves = True
             self.animation_speed = 500
+            self.engine_time = 2000
+            self.engine_nodes = 0
+            self.engine_workers = 0
+            self.use_book = True
+            self.book_path = "book.bin"
+            self.syzygy_path = "syzygy"
+            self.use_nnue = True
+            self.nnue_path = "nn-1c0000000000.nnue"
 
     def save_settings(self):
         """Save current settings to JSON file."""
@@ -893,7 +1309,15 @@ class Game:
             "enable_undo": self.undo_toggle.get_value(),
             "permanent_undo": self.permanent_undo_toggle.get_value(),
             "show_legal_moves": self.legal_moves_toggle.get_value(),
-            "animation_speed": self.animation_slider.get_value()
+            "animation_speed": self.animation_slider.get_value(),
+            "engine_time": self.engine_time_slider.get_value(),
+            "engine_nodes": self.engine_nodes_slider.get_value(),
+            "engine_workers": self.engine_workers,
+            "use_book": self.book_toggle.get_value(),
+            "book_path": self.book_path,
+            "syzygy_path": self.syzygy_path,
+            "use_nnue": self.nnue_toggle.get_value(),
+            "nnue_path": self.nnue_path
         }
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(settings, f, indent=4)
@@ -917,6 +1341,13 @@ class Game:
             self.board_perspective == GameState.WHITE_PERSPECTIVE,
             self.menu_font
         )
+        
+        self.book_toggle = ToggleButton(
+            880, y_start + (row * y_spacing), 60, 25,
+            "Opening Book",
+            self.use_book,
+            self.menu_font
+        )
         row += 1
         
         self.theme_button = CycleButton(
@@ -926,6 +1357,13 @@ class Game:
             list(BOARD_THEMES.keys()).index(self.board_theme),
             self.menu_font
         )
+        
+        self.nnue_toggle = ToggleButton(
+            880, y_start + (row * y_spacing), 60, 25,
+            "NNUE Evaluation",
+            self.use_nnue,
+            self.menu_font
+        )
         row += 1
         
         self.coord_toggle = ToggleButton(
@@ -1001,6 +1439,13 @@ class Game:
             "Stockfish Difficulty",
             self.menu_font
         )
+        
+        self.engine_time_slider = Slider(
+            680, y_start + (row * y_spacing) + 15, 220, 15,
+            100, 10000, self.engine_time,
+            "Engine Time (ms)",
+            self.menu_font
+        )
         row += 2
         
         self.animation_slider = Slider(
@@ -1009,6 +1454,14 @@ class Game:
             "AI Move Delay (ms)",
             self.menu_font
         )
+        
+        # 0 leaves the engine limited by time only
+        self.engine_nodes_slider = Slider(
+            680, y_start + (row * y_spacing), 220, 15,
+            0, 500, self.engine_nodes,
+            "Engine Nodes (k)",
+            self.menu_font
+        )
         row += 2
         
         # Buttons
@@ -1047,6 +1500,10 @@ class Game:
             self.permanent_undo_toggle,
             self.difficulty_slider,
             self.animation_slider,
+            self.engine_time_slider,
+            self.engine_nodes_slider,
+            self.book_toggle,
+            self.nnue_toggle,
             self.save_button,
             self.back_button,
             self.reset_button
@@ -1067,6 +1524,12 @@ class Game:
         self.permanent_undo = self.permanent_undo_toggle.get_value()
         self.show_legal_moves = self.legal_moves_toggle.get_value()
         self.animation_speed = self.animation_slider.get_value()
+        self.engine_time = self.engine_time_slider.get_value()
+        self.engine_nodes = self.engine_nodes_slider.get_value()
+        self.use_book = self.book_toggle.get_value()
+        self.use_nnue = self.nnue_toggle.get_value()
+        if self.searcher is not None:
+            self.searcher.network = self.network if self.use_nnue else None
         
         # Update board if it exists
         if self.board:
@@ -1108,6 +1571,10 @@ class Game:
         self.permanent_undo_toggle.set_value(True)
         self.legal_moves_toggle.set_value(True)
         self.animation_slider.set_value(500)
+        self.engine_time_slider.set_value(2000)
+        self.engine_nodes_slider.set_value(0)
+        self.book_toggle.set_value(True)
+        self.nnue_toggle.set_value(True)
 
     def save_game_state(self):
         """Save current game state to history."""
@@ -1169,7 +1636,8 @@ class Game:
         """Reset the game with current settings."""
         # Initialize board
         enable_stockfish = self.show_stockfish_hints or self.show_evaluation_bar or self.game_mode == 'stockfish'
-        self.board = Board(enable_stockfish=enable_stockfish, stockfish_level=self.stockfish_difficulty)
+        self.board = Board(enable_stockfish=enable_stockfish, stockfish_level=self.stockfish_difficulty,
+                           syzygy_path=self.tablebase_dirs())
         
         if not (self.show_stockfish_hints or self.show_evaluation_bar) and self.game_mode != 'stockfish':
             self.board._disable_stockfish()
@@ -1221,6 +1689,8 @@ class Game:
                     self.dragger.update_blit(self.screen, self.piece_font)
                 if self.show_evaluation_bar and self.board and self.board.board_stockfish:
                     self.update_and_show_eval_bar()
+                if self.game_mode == 'mcts':
+                    self.show_mcts_stats()
                 self.show_move_history()
                 self.handle_playing_events()
                 # Handle AI moves
@@ -1228,6 +1698,10 @@ class Game:
                     self.random_move()
                 elif self.game_mode == 'stockfish' and self.turn == 'black':
                     self.stockfish_move()
+                elif self.game_mode == 'engine' and self.turn == 'black':
+                    self.engine_move()
+                elif self.game_mode == 'mcts' and self.turn == 'black':
+                    self.mcts_move()
             elif self.gamestate == GameState.PROMOTING:
                 self.show_bg()
                 self.show_pieces()
@@ -1241,6 +1715,8 @@ class Game:
                 self.show_pieces()
                 if self.show_evaluation_bar and self.board and self.board.board_stockfish:
                     self.update_and_show_eval_bar()
+                if self.game_mode == 'mcts':
+                    self.show_mcts_stats()
                 self.show_game_over()
                 self.handle_game_over_events()
                 
@@ -1313,7 +1789,7 @@ class Game:
         for row in range(ROWS):
             for col in range(COLS):
                 piece = self.board.squares[row][col]
-                if piece != 0 and piece != self.dragger.piece:
+                if piece != 0 and not (self.dragger.dragging and (row, col) == (self.dragger.initial_row, self.dragger.initial_col)):
                     text_surface = self.piece_font.render(piece.char, True, piece.font_color)
                     cur_row = row
                     cur_col = col
@@ -1332,15 +1808,14 @@ class Game:
 
     def show_moves(self):
         if self.dragger.dragging:
-            for move in self.dragger.piece.moves:
-                cur_col = move.final.x
-                cur_row = move.final.y
+            for move in self.board.moves_from(self.dragger.initial_row, self.dragger.initial_col):
+                cur_row, cur_col = move.final
                 if self.board_perspective == GameState.BLACK_PERSPECTIVE:
                     cur_row, cur_col = rotate_matrix_index(cur_row, cur_col, ROWS, COLS, 2)
                 
                 # Draw circle for legal moves
                 center = (cur_col * SQSIZE + SQSIZE // 2, cur_row * SQSIZE + SQSIZE // 2)
-                if self.board.squares[int(move.final.y)][int(move.final.x)] != 0:
+                if self.board.squares[cur_row][cur_col] != 0:
                     # Capture move - draw ring
                     pygame.draw.circle(self.screen, (200, 50, 50, 150), center, SQSIZE // 3, 4)
                 else:
@@ -1349,12 +1824,10 @@ class Game:
 
     def show_last_move_highlight(self):
         if self.board and self.board.last_move:
-            for pos in [self.board.last_move.initial, self.board.last_move.final]:
+            for cur_row, cur_col in [self.board.last_move.initial, self.board.last_move.final]:
                 color = (255, 220, 0, 80)
                 s = pygame.Surface((SQSIZE, SQSIZE), pygame.SRCALPHA)
                 s.fill(color)
-                cur_col = pos.x
-                cur_row = pos.y
                 if self.board_perspective == GameState.BLACK_PERSPECTIVE:
                     cur_row, cur_col = rotate_matrix_index(cur_row, cur_col, ROWS, COLS, 2)
                 self.screen.blit(s, (cur_col * SQSIZE, cur_row * SQSIZE))
@@ -1364,11 +1837,8 @@ class Game:
             best_move = self.board.get_best_move()
             if best_move:
                 # Draw arrow for best move
-                start_pos = best_move[0]
-                end_pos = best_move[1]
-                
-                start_col, start_row = start_pos.x, start_pos.y
-                end_col, end_row = end_pos.x, end_pos.y
+                start_row, start_col = best_move.initial
+                end_row, end_col = best_move.final
                 
                 if self.board_perspective == GameState.BLACK_PERSPECTIVE:
                     start_row, start_col = rotate_matrix_index(start_row, start_col, ROWS, COLS, 2)
@@ -1399,6 +1869,22 @@ class Game:
             self.eval_bar.update(evaluation)
             self.eval_bar.draw(self.screen, self.small_font)
 
+    def show_mcts_stats(self):
+        """Show the last MCTS search's visits, speed and tree size in the side panel."""
+        result = self.mcts_result
+        if result is None:
+            return
+        lines = ["MCTS", f"{result.visits} visits", f"{result.visits_per_second}/s",
+                 f"tree {result.tree_size}", f"win {result.win_rate:.0%}"]
+        y = 40
+        for line in lines:
+            surface = self.small_font.render(line, True, COLOR_WHITE)
+            text_rect = surface.get_rect(topleft=(BOARD_SIZE + 10, y))
+            bg_rect = text_rect.inflate(10, 5)
+            pygame.draw.rect(self.screen, (40, 40, 40, 200), bg_rect, border_radius=3)
+            self.screen.blit(surface, text_rect)
+            y += surface.get_height() + 8
+
     def show_move_history(self):
         """Show move counter and undo/redo hints."""
         if self.enable_undo:
@@ -1548,7 +2034,8 @@ class Game:
     def analyze_position(self):
         """Analyze the custom position."""
         fen = self.position_editor.get_fen()
-        self.board = Board(enable_stockfish=True, stockfish_level=self.stockfish_difficulty)
+        self.board = Board(enable_stockfish=True, stockfish_level=self.stockfish_difficulty,
+                           syzygy_path=self.tablebase_dirs())
         if self.board.set_from_fen(fen):
             self.turn = self.position_editor.turn
             self.gamestate = GameState.PLAYING
@@ -1569,8 +2056,7 @@ class Game:
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit()
             
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
@@ -1669,8 +2155,9 @@ class Game:
         diff_text = diff_names[closest_key]
         
         diff_surface = self.menu_font.render(diff_text, True, COLOR_WHITE)
-        diff_rect = diff_surface.get_rect(center=(self.difficulty_slider.rect.right + 100, 
-                                                  self.difficulty_slider.rect.centery))
+        # On the slider's label line, clear of the engine sliders to its right
+        diff_rect = diff_surface.get_rect(midright=(self.difficulty_slider.rect.right,
+                                                    self.difficulty_slider.rect.centery - 28))
         bg_rect = diff_rect.inflate(20, 10)
         pygame.draw.rect(self.screen, (60, 60, 60, 200), bg_rect, border_radius=5)
         self.screen.blit(diff_surface, diff_rect)
@@ -1679,8 +2166,7 @@ class Game:
         """Handle events in settings menu."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.return_from_settings()
@@ -1691,8 +2177,7 @@ class Game:
     def handle_playing_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
-                pygame.quit()
-                sys.exit()
+                self.quit()
                 
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
@@ -1728,36 +2213,34 @@ class Game:
                     cur_row, cur_col = self.dragger.mouseY // SQSIZE, self.dragger.mouseX // SQSIZE
                     if self.board_perspective == GameState.BLACK_PERSPECTIVE:
                         cur_row, cur_col = rotate_matrix_index(cur_row, cur_col, ROWS, COLS, 2)
-                    initial = pygame.math.Vector2(self.dragger.initial_col, self.dragger.initial_row)
-                    final = pygame.math.Vector2(cur_col, cur_row)
-                    move = Move(initial, final)
-                    if move in self.dragger.piece.moves: 
-                        self.make_move(self.dragger.piece, move)
+                    if 0 <= cur_row < ROWS and 0 <= cur_col < COLS:
+                        move = Move(square_of(self.dragger.initial_row, self.dragger.initial_col), square_of(cur_row, cur_col))
+                        moves = self.board.moves_from(self.dragger.initial_row, self.dragger.initial_col)
+                        if move in moves:
+                            # Play the generated move so its flags come along
+                            self.make_move(self.dragger.piece, moves[moves.index(move)])
                 self.dragger.undrag_piece()
     
     def handle_game_over_events(self):
         """Handle events when game is over."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
-                pygame.quit()
-                sys.exit()
+                self.quit()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT and self.enable_undo:
                     # Allow undoing even from game over state
                     self.undo_move()
                 elif event.key == pygame.K_ESCAPE:
-                    self.gamestate = GameState.MENU
-                    self.reset()
+                    self.return_to_menu()
             if event.type == pygame.MOUSEBUTTONDOWN: 
-                self.gamestate = GameState.MENU
-                self.reset()
+                self.return_to_menu()
 
     # --- Game Logic Methods ---
     def make_move(self, piece, move):
         self.board.move(piece, move)
-        if self.board.check_promotion(piece, move.final):
+        if self.board.check_promotion(piece, move.to_sq):
             self.gamestate = GameState.PROMOTING
-            self.promotion_pos = (int(move.final.y), int(move.final.x))
+            self.promotion_pos = move.final
         else:
             self.next_turn()
 
@@ -1771,43 +2254,45 @@ class Game:
     def calc_all_valid_moves(self, color):
         if not self.board:
             return
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board.squares[row][col]
-                if piece != 0 and piece.color == color:
-                    self.calc_moves(piece, row, col, self.board)
+        board = self.board
+        board.clear_moves()
+        position = Position.from_squares(board.squares, color, None, board.all_pieces(), board.moved, board.ep_square)
+        for move in generate_legal(position):
+            # The promotion piece is picked after the pawn lands, so one move per target is enough
+            if move_type(move) == PROMOTION and promotion_type(move) != QUEEN:
+                continue
+            board.add_move(Move(move_from(move), move_to(move), flags=move_type(move)))
 
     def calc_moves(self, piece, row, col, board):
-        piece.clear_moves()
+        board.clear_moves(row, col)
         raw_moves = self._get_all_raw_moves(piece, row, col, board)
         for move in raw_moves:
             self.add_valid_move(piece, move, board)
             
     def add_valid_move(self, piece, move, board):
-        temp_board = copy.deepcopy(board)
-        temp_piece = temp_board.squares[int(move.initial.y)][int(move.initial.x)]
-        temp_board.move(temp_piece, move, False)
-        if not self.is_in_check(piece.color, temp_board):
-            piece.add_move(move)
+        board.make_move(move)
+        if not self.is_in_check(piece.color, board):
+            board.add_move(move)
+        board.unmake_move()
 
     def _get_all_raw_moves(self, piece, row, col, board):
         moves = self._get_raw_moves(piece, row, col, board)
         # Castling
-        if isinstance(piece, King) and not piece.moved:
+        if isinstance(piece, King) and not board.has_moved(row, col):
             # Queenside
-            if (isinstance(board.squares[row][0], Rook) and not board.squares[row][0].moved and 
+            if (isinstance(board.squares[row][0], Rook) and not board.has_moved(row, 0) and 
                 all(board.squares[row][c] == 0 for c in [1, 2, 3]) and 
                 not self.is_in_check(piece.color, board) and 
                 not self.is_in_check_at(piece.color, row, col-1, board) and 
                 not self.is_in_check_at(piece.color, row, col-2, board)):
-                moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(col - 2, row)))
+                moves.append(Move(square_of(row, col), square_of(row, col - 2)))
             # Kingside
-            if (isinstance(board.squares[row][7], Rook) and not board.squares[row][7].moved and 
+            if (isinstance(board.squares[row][7], Rook) and not board.has_moved(row, 7) and 
                 all(board.squares[row][c] == 0 for c in [5, 6]) and 
                 not self.is_in_check(piece.color, board) and 
                 not self.is_in_check_at(piece.color, row, col+1, board) and 
                 not self.is_in_check_at(piece.color, row, col+2, board)):
-                moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(col + 2, row)))
+                moves.append(Move(square_of(row, col), square_of(row, col + 2)))
         return moves
 
     def _get_raw_moves(self, piece, row, col, board):
@@ -1819,7 +2304,7 @@ class Game:
                 while 0 <= r < ROWS and 0 <= c < COLS:
                     dest = board.squares[r][c]
                     if dest == 0 or dest.color != piece.color:
-                        moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r)))
+                        moves.append(Move(square_of(row, col), square_of(r, c)))
                         if dest != 0: 
                             break
                     else: 
@@ -1830,30 +2315,29 @@ class Game:
             # Forward moves
             r, c = row + piece.dir, col
             if 0 <= r < ROWS and board.squares[r][c] == 0:
-                moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r)))
+                moves.append(Move(square_of(row, col), square_of(r, c)))
                 # Double move from start
-                if not piece.moved and 0 <= r + piece.dir < ROWS and board.squares[r + piece.dir][c] == 0:
-                    moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r + piece.dir)))
+                if not board.has_moved(row, col) and 0 <= r + piece.dir < ROWS and board.squares[r + piece.dir][c] == 0:
+                    moves.append(Move(square_of(row, col), square_of(r + piece.dir, c)))
             # Captures
             for dc in [-1, 1]:
                 r, c = row + piece.dir, col + dc
                 if 0 <= r < ROWS and 0 <= c < COLS and board.squares[r][c] != 0 and board.squares[r][c].color != piece.color:
-                    moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r)))
+                    moves.append(Move(square_of(row, col), square_of(r, c)))
             # En passant
             if board.last_move:
-                lm_final_row, lm_final_col = int(board.last_move.final.y), int(board.last_move.final.x)
-                lm_initial_row = int(board.last_move.initial.y)
+                lm_final_row, lm_final_col = board.last_move.final
+                lm_initial_row = board.last_move.initial[0]
                 if (lm_final_row == row and isinstance(board.squares[row][lm_final_col], Pawn) and 
                     abs(lm_final_row - lm_initial_row) == 2):
                     if lm_final_col == col - 1 or lm_final_col == col + 1:
-                        moves.append(Move(pygame.math.Vector2(col, row), 
-                                        pygame.math.Vector2(lm_final_col, row + piece.dir)))
+                        moves.append(Move(square_of(row, col), square_of(row + piece.dir, lm_final_col)))
 
         elif isinstance(piece, Knight):
             for dr, dc in [(2,1), (2,-1), (-2,1), (-2,-1), (1,2), (1,-2), (-1,2), (-1,-2)]:
                 r, c = row + dr, col + dc
                 if 0 <= r < ROWS and 0 <= c < COLS and (board.squares[r][c] == 0 or board.squares[r][c].color != piece.color):
-                    moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r)))
+                    moves.append(Move(square_of(row, col), square_of(r, c)))
 
         elif isinstance(piece, Bishop): 
             add_line_moves([(1,1), (1,-1), (-1,1), (-1,-1)])
@@ -1868,7 +2352,7 @@ class Game:
             for dr, dc in [(dr, dc) for dr in [-1,0,1] for dc in [-1,0,1] if (dr, dc) != (0,0)]:
                 r, c = row + dr, col + dc
                 if 0 <= r < ROWS and 0 <= c < COLS and (board.squares[r][c] == 0 or board.squares[r][c].color != piece.color):
-                    moves.append(Move(pygame.math.Vector2(col, row), pygame.math.Vector2(c, r)))
+                    moves.append(Move(square_of(row, col), square_of(r, c)))
                     
         return moves
 
@@ -1877,29 +2361,25 @@ class Game:
         return self.is_in_check_at(color, king_pos[0], king_pos[1], board_state) if king_pos else False
 
     def is_in_check_at(self, color, row, col, board_state):
-        opponent_color = 'white' if color == 'black' else 'black'
-        for r in range(ROWS):
-            for c in range(COLS):
-                piece = board_state.squares[r][c]
-                if piece != 0 and piece.color == opponent_color:
-                    raw_moves = self._get_raw_moves(piece, r, c, board_state)
-                    for move in raw_moves:
-                        if int(move.final.y) == row and int(move.final.x) == col:
-                            return True
-        return False
+        """Whether the opponent of color attacks (row, col)."""
+        opponent = BLACK if color == 'white' else WHITE
+        position = Position.from_squares(board_state.squares, color, placed=board_state.all_pieces())
+        return position.is_attacked(square_of(row, col), opponent)
 
     def find_king(self, color, board_state):
-        for r in range(ROWS):
-            for c in range(COLS):
-                if isinstance(board_state.squares[r][c], King) and board_state.squares[r][c].color == color:
-                    return (r, c)
-        return None
+        king_pos = board_state.king_position[color == 'black']
+        return tuple(king_pos) if king_pos else None
         
     def check_game_over(self):
-        if not any(p.moves for row in self.board.squares for p in row if p != 0 and p.color == self.turn):
+        if not any(self.board.legal_moves.values()):
             self.gamestate = GameState.GAME_OVER
             winner = 'Black' if self.turn == 'white' else 'White'
             self.game_over_message = f"Checkmate! {winner} wins." if self.is_in_check(self.turn, self.board) else "Stalemate! It's a draw."
+            return
+        reason = self.board.draw_reason()
+        if reason:
+            self.gamestate = GameState.GAME_OVER
+            self.game_over_message = f"Draw by {reason}."
     
     def auto_promote(self):
         """Automatically promote to queen."""
@@ -1910,18 +2390,89 @@ class Game:
     def random_move(self):
         """Make a random move for the AI."""
         if self.turn == 'black' and not self.game_over_message:
-            all_moves = [(p, m) for r in self.board.squares for p in r if p != 0 and p.color == 'black' for m in p.moves]
+            all_moves = [m for moves in self.board.legal_moves.values() for m in moves]
             if all_moves:
                 pygame.time.wait(self.animation_speed)
-                self.make_move(*random.choice(all_moves))
+                move = random.choice(all_moves)
+                row, col = move.initial
+                self.make_move(self.board.squares[row][col], move)
             if self.gamestate == GameState.PROMOTING:
                 self.board.promote_pawn(self.promotion_pos[0], self.promotion_pos[1], random.choice(self.promotion_pieces))
                 self.gamestate = GameState.PLAYING
                 self.next_turn()
 
+    # --- Endgame tablebases ---
+    def tablebase_dirs(self):
+        """The existing directories of syzygy_path as absolute paths, joined for SyzygyPath."""
+        return os.pathsep.join(os.path.abspath(d) for d in self.syzygy_path.split(os.pathsep) if os.path.isdir(d))
+
+    def open_tablebases(self):
+        """The Syzygy tables under syzygy_path, or None if there are none."""
+        tablebases = Tablebases(self.tablebase_dirs())
+        if not len(tablebases):
+            print(f"No Syzygy tables in '{self.syzygy_path}'. Endgames will be searched.")
+            return None
+        print(f"Syzygy tables loaded: {len(tablebases)}, up to {tablebases.max_pieces} pieces.")
+        return tablebases
+
+    # --- NNUE ---
+    def open_network(self):
+        """The Stockfish network at nnue_path, or None (the engine then uses its piece-square tables)."""
+        try:
+            network = Network(self.nnue_path)
+        except OSError:
+            print(f"NNUE file '{self.nnue_path}' not found. The engine will use its own evaluation.")
+            return None
+        except ValueError as error:
+            print(f"NNUE file not usable: {error}")
+            return None
+        print(f"NNUE loaded: {network.description or self.nnue_path}")
+        return network
+
+    # --- Opening book ---
+    def open_book(self):
+        """The Polyglot book at book_path, or None if there is none."""
+        try:
+            return OpeningBook(self.book_path)
+        except OSError:
+            print(f"Opening book '{self.book_path}' not found. Engines will search from the first move.")
+            return None
+
+    def engine_position(self):
+        """The current position as a Position, for the native engine and the book."""
+        board = self.board
+        position = Position.from_squares(board.squares, self.turn, None, board.all_pieces(), board.moved,
+                                         board.ep_square)
+        position.halfmove_clock = board.halfmove_clock
+        return position
+
+    def book_move(self):
+        """Play a move from the opening book; False when out of book or the book is off."""
+        if not (self.use_book and self.book):
+            return False
+        move = self.book.choose(self.engine_position())
+        if not move:
+            return False
+        self.play_packed(move)
+        return True
+
+    def play_packed(self, packed):
+        """Play a packed move for the AI side, promotion included."""
+        move = Move.from_packed(packed)
+        pygame.time.wait(self.animation_speed)
+        row, col = move.initial
+        self.make_move(self.board.squares[row][col], move)
+        if self.gamestate == GameState.PROMOTING:
+            self.board.promote_pawn(self.promotion_pos[0], self.promotion_pos[1],
+                                    PIECE_TYPE_NAMES[promotion_type(packed)])
+            self.gamestate = GameState.PLAYING
+            self.next_turn()
+
     def stockfish_move(self):
         """Make a move using Stockfish AI."""
         if self.turn == 'black' and not self.game_over_message:
+            if self.book_move():
+                return
             if not self.board.board_stockfish:
                 self.board._enable_stockfish(self.stockfish_difficulty)
             
@@ -1929,10 +2480,10 @@ class Game:
             if best_move:
                 pygame.time.wait(self.animation_speed)
                 
-                initial_row, initial_col = int(best_move[0].y), int(best_move[0].x)
+                initial_row, initial_col = best_move.initial
                 piece = self.board.squares[initial_row][initial_col]
                 
-                move = Move(best_move[0], best_move[1])
+                move = Move(best_move.from_sq, best_move.to_sq)
                 if piece and piece.color == 'black':
                     self.make_move(piece, move)
                     
@@ -1941,6 +2492,58 @@ class Game:
                         self.gamestate = GameState.PLAYING
                         self.next_turn()
     
+    def engine_searcher(self):
+        """The native engine, searching on engine_workers processes (0: one per core)."""
+        if self.searcher is None:
+            self.searcher = ParallelSearcher(self.engine_workers or None, tablebases=self.tablebases,
+                                             network=self.network if self.use_nnue else None)
+        return self.searcher
+
+    def quit(self):
+        """Stop the engines' helper processes and leave the program."""
+        if self.searcher is not None:
+            self.searcher.close()
+            self.searcher = None
+        self.close_mcts()
+        pygame.quit()
+        sys.exit()
+
+    def engine_move(self):
+        """Make a move using the built-in alpha-beta engine (search.py)."""
+        if self.turn == 'black' and not self.game_over_message:
+            if self.book_move():
+                return
+            result = self.engine_searcher().search(self.engine_position(), time_limit=self.engine_time / 1000,
+                                                   max_nodes=self.engine_nodes * 1000 or None,
+                                                   history=self.board.repetitions)
+            if result.move:
+                self.play_packed(result.move)
+
+    def mcts_move(self):
+        """Make a move using Monte Carlo tree search (mcts.py), with the engine's time budget and workers."""
+        if self.turn == 'black' and not self.game_over_message:
+            if self.book_move():
+                return
+            if self.mcts is None:
+                self.mcts = MCTS(workers=self.engine_workers or os.cpu_count())
+            result = self.mcts.search(self.engine_position(), time_limit=self.engine_time / 1000,
+                                      history=self.board.repetitions)
+            if result.move:
+                self.mcts_result = result
+                self.play_packed(result.move)
+
+    def close_mcts(self):
+        """Stop the MCTS rollout pool, if one was started."""
+        if self.mcts is not None:
+            self.mcts.close()
+            self.mcts = None
+        self.mcts_result = None
+
+    def return_to_menu(self):
+        self.close_mcts()
+        self.gamestate = GameState.MENU
+        self.reset()
+    
     # --- UI and State Handlers ---
     def show_menu(self):
         """Display enhanced main menu."""
@@ -1978,12 +2581,14 @@ class Game:
         
         # Create animated menu items with icons
         menu_items = [
-            ('♔ 1 vs 1 (Local)', (WIDTH//2, 250)),
-            ('🎲 1 vs Random', (WIDTH//2, 320)),
-            ('🤖 1 vs Stockfish', (WIDTH//2, 390)),
-            ('✏️ Position Editor', (WIDTH//2, 460)),
-            ('⚙️ Settings', (WIDTH//2, 530)),
-            ('❌ Exit', (WIDTH//2, 600))
+            ('♔ 1 vs 1 (Local)', (WIDTH//2, 230)),
+            ('🎲 1 vs Random', (WIDTH//2, 290)),
+            ('🤖 1 vs Stockfish', (WIDTH//2, 350)),
+            ('🧠 1 vs Engine', (WIDTH//2, 410)),
+            ('🌲 1 vs MCTS', (WIDTH//2, 470)),
+            ('✏️ Position Editor', (WIDTH//2, 530)),
+            ('⚙️ Settings', (WIDTH//2, 590)),
+            ('❌ Exit', (WIDTH//2, 650))
         ]
         
         self.menu_rects = []
@@ -2026,10 +2631,9 @@ class Game:
         """Handle menu click events."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
-                pygame.quit()
-                sys.exit()
+                self.quit()
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if len(self.menu_rects) >= 6:
+                if len(self.menu_rects) >= 8:
                     if self.menu_rects[0].collidepoint(event.pos):  # 1 vs 1
                         self.game_mode = 'pvp'
                         self.gamestate = GameState.PLAYING
@@ -2042,13 +2646,20 @@ class Game:
                         self.game_mode = 'stockfish'
                         self.gamestate = GameState.PLAYING
                         self.reset()
-                    elif self.menu_rects[3].collidepoint(event.pos):  # Position Editor
+                    elif self.menu_rects[3].collidepoint(event.pos):  # vs Engine
+                        self.game_mode = 'engine'
+                        self.gamestate = GameState.PLAYING
+                        self.reset()
+                    elif self.menu_rects[4].collidepoint(event.pos):  # vs MCTS
+                        self.game_mode = 'mcts'
+                        self.gamestate = GameState.PLAYING
+                        self.reset()
+                    elif self.menu_rects[5].collidepoint(event.pos):  # Position Editor
                         self.gamestate = GameState.POSITION_EDITOR
-                    elif self.menu_rects[4].collidepoint(event.pos):  # Settings
+                    elif self.menu_rects[6].collidepoint(event.pos):  # Settings
                         self.gamestate = GameState.SETTINGS
-                    elif self.menu_rects[5].collidepoint(event.pos):  # Exit
-                        pygame.quit()
-                        sys.exit()
+                    elif self.menu_rects[7].collidepoint(event.pos):  # Exit
+                        self.quit()
 
     def show_promotion_menu(self):
         """Display promotion menu with enhanced visuals."""
@@ -2084,8 +2695,7 @@ class Game:
         """Handle promotion selection."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
-                pygame.quit()
-                sys.exit()
+                self.quit()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 for name, rect in self.promotion_options.items():
                     if rect.collidepoint(event.pos):
@@ -0,0 +1,66 @@
+# Shared test setup: the import path, and a random network in Stockfish's format
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules under test live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nnue  # noqa: E402
+
+
+def _leb128(values):
+    # One of the .nnue file's compressed blocks: the magic, a byte count, signed LEB128 values
+    out = bytearray()
+    for value in values.tolist():
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+                out.append(byte)
+                break
+            out.append(byte | 0x80)
+    return b'COMPRESSED_LEB128' + len(out).to_bytes(4, 'little') + bytes(out)
+
+
+def write_random_network(path, half_dimensions=128, seed=1):
+    """Write a network of random weights in Stockfish's .nnue format; returns the weights as written."""
+    rng = np.random.default_rng(seed)
+    ft_hash = nnue.FEATURE_HASH ^ (half_dimensions * 2)
+    st_hash = nnue._stack_hash(half_dimensions)
+    params = {
+        'biases': rng.integers(-50, 100, half_dimensions),
+        'weights': rng.integers(-40, 40, (nnue.FEATURE_DIMENSIONS, half_dimensions)),
+        'psqt_weights': rng.integers(-3000, 3000, (nnue.FEATURE_DIMENSIONS, nnue.PSQT_BUCKETS)),
+        'stacks': [],
+    }
+    description = b'random test network'
+    data = bytearray()
+    for value in (nnue.VERSION, ft_hash ^ st_hash, len(description)):
+        data += value.to_bytes(4, 'little')
+    data += description + ft_hash.to_bytes(4, 'little')
+    for name in ('biases', 'weights', 'psqt_weights'):
+        data += _leb128(params[name].ravel())
+    for _ in range(nnue.LAYER_STACKS):
+        stack = {'fc0_biases': rng.integers(-5000, 5000, 16),
+                 'fc0_weights': rng.integers(-60, 60, (16, half_dimensions)),
+                 'fc1_biases': rng.integers(-5000, 5000, 32), 'fc1_weights': rng.integers(-60, 60, (32, 32)),
+                 'fc2_biases': rng.integers(-5000, 5000, 1), 'fc2_weights': rng.integers(-60, 60, 32)}
+        params['stacks'].append(stack)
+        data += st_hash.to_bytes(4, 'little')
+        for name, dtype in (('fc0_biases', '<i4'), ('fc0_weights', '<i1'), ('fc1_biases', '<i4'),
+                            ('fc1_weights', '<i1'), ('fc2_biases', '<i4'), ('fc2_weights', '<i1')):
+            data += stack[name].astype(dtype).tobytes()
+    with open(path, 'wb') as f:
+        f.write(bytes(data))
+    return params
+
+
+@pytest.fixture(scope='session')
+def random_network(tmp_path_factory):
+    """(Network, weights as written) for a random network saved to a temporary .nnue file."""
+    path = tmp_path_factory.mktemp('nnue') / 'random.nnue'
+    params = write_random_network(path)
+    return nnue.Network(str(path)), params
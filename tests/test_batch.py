@@ -0,0 +1,85 @@
+# -- Batched evaluation --
+# BatchEvaluator must give exactly the scores evaluate() gives one Position
+# at a time, with and without a network.
+import random
+
+import numpy as np
+import pytest
+
+from batch import BatchEvaluator, pack, pack_fens
+from evaluate import evaluate
+from movegen import generate_legal
+from position import Position
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r3k2r/1P4P1/8/3pP3/8/8/1p4p1/R3K2R w KQkq d6 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+
+def random_positions(count=60, seed=7):
+    """Where random games of up to 40 plies from FENS end."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        pos = Position(rng.choice(FENS))
+        for _ in range(rng.randrange(40)):
+            moves = generate_legal(pos)
+            if not moves:
+                break
+            pos.make_move(rng.choice(moves))
+        positions.append(Position(pos.fen()))
+    return positions
+
+
+@pytest.fixture(scope='module')
+def positions():
+    return random_positions()
+
+
+def test_pack_fens_matches_positions(positions):
+    boards, turns = pack_fens([pos.fen() for pos in positions])
+    assert boards.tolist() == [pos.board for pos in positions]
+    assert turns.tolist() == [pos.turn for pos in positions]
+
+
+def test_psq_matches_evaluate(positions):
+    evaluator = BatchEvaluator()
+    expected = [evaluate(pos) for pos in positions]
+    assert evaluator.evaluate(positions).tolist() == expected
+    assert evaluator.evaluate([pos.fen() for pos in positions]).tolist() == expected
+    boards, turns = pack(positions)
+    assert evaluator.evaluate(boards, turns).tolist() == expected
+
+
+def test_nnue_matches_evaluate(random_network, positions):
+    network, _ = random_network
+    expected = []
+    for pos in positions:
+        pos = pos.copy()
+        pos.accumulators = network.new_accumulators(pos)
+        expected.append(evaluate(pos))
+    evaluator = BatchEvaluator(network)
+    assert evaluator.evaluate(positions).tolist() == expected
+    assert evaluator.evaluate([pos.fen() for pos in positions]).tolist() == expected
+    boards, turns = pack(positions)
+    assert evaluator.evaluate(boards, turns).tolist() == expected
+
+
+def test_kingless_rows_keep_psq_scores(random_network, positions):
+    network, _ = random_network
+    kingless = [Position("8/8/4k3/8/8/8/1P6/Q7 w - - 0 1"), Position("8/8/8/8/2q5/8/1K6/8 b - - 0 1")]
+    mixed = positions[:3] + kingless + positions[3:6]
+    expected = BatchEvaluator(network).evaluate(positions[:6]).tolist()
+    expected[3:3] = BatchEvaluator().evaluate(kingless).tolist()
+    assert BatchEvaluator(network).evaluate(mixed).tolist() == expected
+    assert BatchEvaluator(network).evaluate(kingless).tolist() == expected[3:5]
+
+
+def test_rejects_bad_shapes():
+    with pytest.raises(ValueError):
+        BatchEvaluator().evaluate(np.zeros((2, 63), dtype=np.int8))
+    with pytest.raises(ValueError):
+        pack_fens(["8/8/8 w - - 0 1"])
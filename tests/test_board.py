@@ -0,0 +1,81 @@
+# -- The game's Board and Move (temphf.py) --
+# Boards are built without Stockfish; pygame is imported but no window opens.
+import pytest
+
+from bitboard import parse_square
+from temphf import Board, Game, Move, Knight
+
+
+def new_board(fen):
+    board = Board(enable_stockfish=False)
+    board.set_from_fen(fen)
+    return board
+
+
+def legal_moves(board, color):
+    game = Game.__new__(Game)
+    game.board = board
+    game.calc_all_valid_moves(color)
+    return [move for moves in board.legal_moves.values() for move in moves]
+
+
+# --- Move ---
+def test_underpromotions_are_different_moves():
+    a7, a8 = parse_square('a7'), parse_square('a8')
+    assert Move(a7, a8, 'q') != Move(a7, a8, 'n')
+    assert len({Move(a7, a8, 'q'), Move(a7, a8, 'n'), Move(a7, a8, 'q')}) == 2
+    assert Move.from_uci('a7a8n') == Move(a7, a8, 'n')
+
+
+def test_promote_pawn_leaves_the_generated_move_alone():
+    board = new_board("8/P6k/8/8/8/8/8/K7 w - - 0 1")
+    moves = legal_moves(board, 'white')
+    generated = next(move for move in moves if move.uci() == 'a7a8')
+    before = hash(generated)
+    board.move(board.squares[1][0], generated)
+    assert board.promoting
+    board.promote_pawn(0, 0, 'knight')
+    assert isinstance(board.squares[0][0], Knight)
+    assert board.last_move == Move.from_uci('a7a8n')
+    # The move in the legal move table kept its hash, so lookups still find it
+    assert generated.promotion_piece is None and hash(generated) == before
+    assert generated in set(moves)
+
+
+# --- Draws ---
+@pytest.mark.parametrize("fen, drawn", [
+    ("8/8/4k3/8/8/8/8/4K3 w - - 0 1", True),
+    ("8/8/4k3/8/8/8/3N4/4K3 w - - 0 1", True),
+    ("8/8/4k3/8/8/2n5/3N4/4K3 w - - 0 1", False),
+    # Bishops of both sides, all on light squares
+    ("8/8/4k3/3b4/2B1B3/8/8/4K3 w - - 0 1", True),
+    ("8/8/4k3/3b4/2B2B2/8/8/4K3 w - - 0 1", False),
+    ("8/8/4k3/8/2B5/8/3N4/4K3 w - - 0 1", False),
+    ("8/8/4k3/8/2B1B3/8/7P/4K3 w - - 0 1", False),
+])
+def test_insufficient_material(fen, drawn):
+    assert new_board(fen).is_insufficient_material() == drawn
+
+
+def test_insufficient_material_follows_make_unmake():
+    board = new_board("8/8/4k3/8/8/2n5/3B4/4K3 w - - 0 1")
+    assert not board.is_insufficient_material()
+    board.make_move(Move.from_uci('d2c3'))
+    assert board.is_insufficient_material()
+    board.unmake_move()
+    assert not board.is_insufficient_material()
+
+
+def test_threefold_repetition():
+    board = Board(enable_stockfish=False)
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8'] * 2
+    for uci in shuffle:
+        assert board.draw_reason() is None
+        board.make_move(Move.from_uci(uci))
+    # The start position has now occurred three times
+    assert board.is_repetition()
+    assert board.draw_reason() == "threefold repetition"
+    board.unmake_move()
+    assert not board.is_repetition()
+    board.make_move(Move.from_uci('f6g8'))
+    assert board.is_repetition()
@@ -0,0 +1,93 @@
+# -- Polyglot opening books --
+# Books are written here entry by entry in the format's big-endian layout; the
+# start position key is the Polyglot format's worked example.
+import random
+import struct
+
+import pytest
+
+from bitboard import MOVE_NONE, move_uci
+from book import OpeningBook, polyglot_move
+from movegen import generate_legal
+from position import Position
+
+START_KEY = 0x463B96181691FC9C
+CASTLING_FEN = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+PROMOTION_FEN = "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"
+
+
+def square(name):
+    return (ord(name[0]) - ord('a')) + 8 * (int(name[1]) - 1)
+
+
+def entry_move(uci, promotion=0):
+    """A Polyglot move: to square in bits 0-5, from square in 6-11, promotion piece in 12-14."""
+    return promotion << 12 | square(uci[:2]) << 6 | square(uci[2:4])
+
+
+def write_book(path, entries):
+    with open(path, 'wb') as f:
+        for key, move, weight in sorted(entries, key=lambda entry: entry[0]):
+            f.write(struct.pack('>QHHI', key, move, weight, 0))
+    return path
+
+
+@pytest.fixture
+def book(tmp_path):
+    entries = [
+        (START_KEY, entry_move('e2e4'), 10),
+        (START_KEY, entry_move('d2d4'), 5),
+        (START_KEY, entry_move('g1f3'), 0),
+        # Not legal in the start position: a key collision in a real book
+        (START_KEY, entry_move('e2e5'), 50),
+        (Position(CASTLING_FEN).key, entry_move('e1h1'), 1),
+        (Position(PROMOTION_FEN).key, entry_move('a7a8', 4), 1),
+        # Neighbours on both sides of the start position
+        (START_KEY - 1, entry_move('a2a3'), 1),
+        (START_KEY + 1, entry_move('h2h3'), 1),
+    ]
+    with OpeningBook(write_book(tmp_path / 'test.bin', entries)) as book:
+        yield book
+
+
+def book_moves(book, fen):
+    pos = Position(fen)
+    return [(move_uci(move), weight) for move, weight in book.moves(pos)]
+
+
+def test_polyglot_move_encoding():
+    pos = Position(CASTLING_FEN)
+    encoded = {move_uci(move): polyglot_move(move) for move in generate_legal(pos)}
+    assert encoded['e1g1'] == entry_move('e1h1') and encoded['e1c1'] == entry_move('e1a1')
+    assert encoded['a1a8'] == entry_move('a1a8')
+    pos = Position(PROMOTION_FEN)
+    encoded = {move_uci(move): polyglot_move(move) for move in generate_legal(pos)}
+    assert [encoded['a7a8' + piece] >> 12 for piece in 'nbrq'] == [1, 2, 3, 4]
+
+
+def test_entries_decode(book):
+    assert book.entries == 8
+    assert book.entries_for(START_KEY) == [(entry_move('e2e4'), 10), (entry_move('d2d4'), 5),
+                                           (entry_move('g1f3'), 0), (entry_move('e2e5'), 50)]
+    assert book.entries_for(START_KEY + 2) == []
+
+
+def test_moves(book):
+    assert Position().key == START_KEY
+    assert book_moves(book, Position().fen()) == [('e2e4', 10), ('d2d4', 5), ('g1f3', 0)]
+    assert book_moves(book, CASTLING_FEN) == [('e1g1', 1)]
+    assert book_moves(book, PROMOTION_FEN) == [('a7a8q', 1)]
+
+
+def test_choose(book):
+    rng = random.Random(3)
+    chosen = {move_uci(book.choose(Position(), rng)) for _ in range(200)}
+    # Weighted picks never take a zero-weight move
+    assert chosen == {'e2e4', 'd2d4'}
+    assert book.choose(Position("4k3/8/8/8/8/8/8/4K3 w - - 0 1")) == MOVE_NONE
+
+
+def test_empty_book(tmp_path):
+    with OpeningBook(write_book(tmp_path / 'empty.bin', [])) as book:
+        assert book.entries == 0
+        assert book.choose(Position()) == MOVE_NONE
@@ -0,0 +1,38 @@
+# -- Monte Carlo tree search --
+import pytest
+
+from bitboard import MOVE_NONE, move_uci
+from mcts import MCTS
+from position import Position
+
+MATES_IN_ONE = [
+    ("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", 'a1a8'),
+    ("r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4", 'h5f7'),
+    ("r5k1/8/8/8/8/8/5PPP/6K1 b - - 0 1", 'a8a1'),
+]
+
+
+@pytest.mark.parametrize("fen, mate", MATES_IN_ONE)
+@pytest.mark.parametrize("prior", [True, False])
+def test_finds_mate_in_one(fen, mate, prior):
+    with MCTS(prior=prior, seed=1) as mcts:
+        result = mcts.search(Position(fen), max_visits=400)
+    assert move_uci(result.move) == mate and result.win_rate == 1.0
+    assert result.visits == 400
+
+
+def test_finds_mate_in_one_with_a_pool():
+    fen, mate = MATES_IN_ONE[0]
+    with MCTS(workers=2, seed=1) as mcts:
+        result = mcts.search(Position(fen), max_visits=200)
+    assert move_uci(result.move) == mate and mcts.rollouts
+
+
+@pytest.mark.parametrize("fen, win_rate", [
+    ("R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1", 0.0),
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", 0.5),
+])
+def test_game_over_at_the_root(fen, win_rate):
+    with MCTS(seed=1) as mcts:
+        result = mcts.search(Position(fen), max_visits=10)
+    assert result.move == MOVE_NONE and result.win_rate == win_rate
@@ -0,0 +1,56 @@
+# -- Staged move ordering --
+from bitboard import move_uci
+from movegen import generate_legal
+from movepick import MovePicker, TT_MOVE, CAPTURES, KILLERS, QUIETS, BAD_CAPTURES, new_history, update_history
+from position import Position
+
+# White can take a queen with the knight, a rook and a knight with pawns, trade
+# knights on d5, and lose the queen for the pawn on g5
+FEN = "4k3/8/2p5/1q1n1rp1/4P3/2N5/1B4Q1/4K2R w K - 0 1"
+
+
+def find(pos, uci):
+    return next(move for move in generate_legal(pos) if move_uci(move) == uci)
+
+
+def picked(picker):
+    """(uci, stage) for every move picker yields."""
+    return [(move_uci(move), picker.stage) for move in picker]
+
+
+def test_stage_order():
+    pos = Position(FEN)
+    moves = generate_legal(pos)
+    history = new_history()[pos.turn]
+    update_history(history, find(pos, 'g2e2'), 400)
+    update_history(history, find(pos, 'h1h3'), 200)
+    killers = [find(pos, 'e1d2'), find(pos, 'b2a3')]
+    order = picked(MovePicker(pos, moves, find(pos, 'h1h4'), killers, history))
+    assert sorted(uci for uci, _ in order) == sorted(move_uci(move) for move in moves)
+    assert order[:7] == [
+        ('h1h4', TT_MOVE),
+        # Most valuable victim first, then the cheaper attacker
+        ('c3b5', CAPTURES), ('e4f5', CAPTURES), ('e4d5', CAPTURES), ('c3d5', CAPTURES),
+        ('e1d2', KILLERS), ('b2a3', KILLERS),
+    ]
+    assert order[7:9] == [('g2e2', QUIETS), ('h1h3', QUIETS)]
+    assert all(stage == QUIETS for _, stage in order[9:-1])
+    assert order[-1] == ('g2g5', BAD_CAPTURES)
+
+
+def test_tt_move_and_killers_are_not_repeated():
+    # A capture as the TT move, and a killer that is not legal here
+    pos = Position(FEN)
+    moves = generate_legal(pos)
+    order = [uci for uci, _ in picked(MovePicker(pos, moves, find(pos, 'e4d5'), [find(pos, 'e1d2'), 0x0FFF]))]
+    assert order[:4] == ['e4d5', 'c3b5', 'e4f5', 'c3d5']
+    assert order[4] == 'e1d2'
+    assert len(order) == len(set(order)) == len(moves)
+
+
+def test_captures_only():
+    # The quiescence search's picker: every capture by MVV-LVA, the losing one included
+    pos = Position(FEN)
+    order = picked(MovePicker(pos, generate_legal(pos), captures_only=True))
+    assert order == [('c3b5', CAPTURES), ('e4f5', CAPTURES), ('e4d5', CAPTURES), ('c3d5', CAPTURES),
+                     ('g2g5', CAPTURES)]
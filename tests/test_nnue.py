@@ -0,0 +1,212 @@
+# -- NNUE evaluation --
+# The network under test is random (see conftest.py), checked against a
+# plain-integer forward pass written from Stockfish's C++ (features/
+# half_ka_v2_hm.h and nnue_architecture.h) rather than from nnue.py's tables.
+# Set STOCKFISH and NNUE_FILE to also compare with a real Stockfish binary.
+import os
+import random
+import subprocess
+
+import numpy as np
+import pytest
+
+from bitboard import WHITE, BLACK, KING
+from evaluate import evaluate
+from movegen import generate_legal
+from nnue import Network, to_centipawns
+from position import Position
+from search import Searcher
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R b KQ - 1 8",
+    "r3k2r/1P4P1/8/3pP3/8/8/1p4p1/R3K2R w KQkq d6 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "8/8/4k3/8/2q5/8/1K6/8 b - - 0 1",
+]
+
+# Transcribed from half_ka_v2_hm.h: king bucket by king square, a1 first, for WHITE and BLACK
+_KING_BUCKETS = (
+    [28, 29, 30, 31, 31, 30, 29, 28,
+     24, 25, 26, 27, 27, 26, 25, 24,
+     20, 21, 22, 23, 23, 22, 21, 20,
+     16, 17, 18, 19, 19, 18, 17, 16,
+     12, 13, 14, 15, 15, 14, 13, 12,
+     8, 9, 10, 11, 11, 10, 9, 8,
+     4, 5, 6, 7, 7, 6, 5, 4,
+     0, 1, 2, 3, 3, 2, 1, 0],
+    [0, 1, 2, 3, 3, 2, 1, 0,
+     4, 5, 6, 7, 7, 6, 5, 4,
+     8, 9, 10, 11, 11, 10, 9, 8,
+     12, 13, 14, 15, 15, 14, 13, 12,
+     16, 17, 18, 19, 19, 18, 17, 16,
+     20, 21, 22, 23, 23, 22, 21, 20,
+     24, 25, 26, 27, 27, 26, 25, 24,
+     28, 29, 30, 31, 31, 30, 29, 28],
+)
+# OrientTBL: SQ_H1 / SQ_A1 for WHITE, SQ_H8 / SQ_A8 for BLACK, by the king's file
+_ORIENT = ([7, 7, 7, 7, 0, 0, 0, 0] * 8, [63, 63, 63, 63, 56, 56, 56, 56] * 8)
+# PieceSquareIndex by piece code: PS_W_PAWN = 0, PS_B_PAWN = 64, ... PS_KING = 640
+_PIECE_SQUARE_INDEX = (
+    {1: 0, 2: 128, 3: 256, 4: 384, 5: 512, 6: 640, 9: 64, 10: 192, 11: 320, 12: 448, 13: 576, 14: 640},
+    {1: 64, 2: 192, 3: 320, 4: 448, 5: 576, 6: 640, 9: 0, 10: 128, 11: 256, 12: 384, 13: 512, 14: 640},
+)
+_PS_NB = 704
+
+
+def _cdiv(a, b):
+    # C++ integer division
+    return -(-a // b) if a < 0 else a // b
+
+
+def reference_evaluate(params, pos):
+    """(psqt, positional) as Network::evaluate computes them, one integer at a time."""
+    weights, psqt_weights = params['weights'].tolist(), params['psqt_weights'].tolist()
+    half = len(params['biases'])
+    accumulators, psqts = {}, {}
+    for perspective in (WHITE, BLACK):
+        ksq = pos.board.index((perspective << 3) | KING)
+        accumulation = [2 * bias for bias in params['biases'].tolist()]
+        psqt = [0] * 8
+        for square, piece in enumerate(pos.board):
+            if piece:
+                index = ((square ^ _ORIENT[perspective][ksq]) + _PIECE_SQUARE_INDEX[perspective][piece]
+                         + _KING_BUCKETS[perspective][ksq] * _PS_NB)
+                accumulation = [a + 2 * w for a, w in zip(accumulation, weights[index])]
+                psqt = [p + w for p, w in zip(psqt, psqt_weights[index])]
+        accumulators[perspective], psqts[perspective] = accumulation, psqt
+    bucket = (64 - pos.board.count(0) - 1) // 4
+    us, them = pos.turn, pos.turn ^ 1
+    transformed = []
+    for perspective in (us, them):
+        clipped = [min(max(a, 0), 254) for a in accumulators[perspective]]
+        transformed += [clipped[j] * clipped[j + half // 2] // 512 for j in range(half // 2)]
+    stack = {name: array.tolist() for name, array in params['stacks'][bucket].items()}
+    fc0 = [b + sum(w * x for w, x in zip(row, transformed))
+           for b, row in zip(stack['fc0_biases'], stack['fc0_weights'])]
+    hidden = ([min(127, (x * x) >> 19) for x in fc0[:15]] + [min(max(x >> 6, 0), 127) for x in fc0[:15]]
+              + [0, 0])
+    fc1 = [b + sum(w * x for w, x in zip(row, hidden)) for b, row in zip(stack['fc1_biases'], stack['fc1_weights'])]
+    fc2 = stack['fc2_biases'][0] + sum(w * min(max(x >> 6, 0), 127) for w, x in zip(stack['fc2_weights'], fc1))
+    forward = _cdiv(fc0[15] * 600 * 16, 127 * 64)
+    psqt = _cdiv(psqts[us][bucket] - psqts[them][bucket], 2)
+    return _cdiv(psqt, 16), _cdiv(fc2 + forward, 16)
+
+
+def test_network_loads(random_network):
+    network, params = random_network
+    assert network.half_dimensions == 128
+    assert network.description == 'random test network'
+    assert np.array_equal(network.weights, 2 * params['weights'])
+    assert np.array_equal(network.psqt_weights, params['psqt_weights'])
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_evaluate_matches_reference(random_network, fen):
+    network, params = random_network
+    pos = Position(fen)
+    assert network.evaluate(pos) == reference_evaluate(params, pos)
+
+
+def test_refresh_batch_matches_reference(random_network):
+    network, params = random_network
+    positions = [Position(fen) for fen in FENS]
+    boards = np.array([pos.board for pos in positions])
+    turns = np.array([pos.turn for pos in positions])
+    # A small chunk size so the accumulators and PSQT sums are gathered a row or two at a time
+    white_acc, white_psqt = network.refresh_batch(boards, WHITE, chunk_bytes=1 << 14)
+    black_acc, black_psqt = network.refresh_batch(boards, BLACK, chunk_bytes=1 << 14)
+    for row, pos in enumerate(positions):
+        for perspective, acc, psqt in ((WHITE, white_acc, white_psqt), (BLACK, black_acc, black_psqt)):
+            expected = network.refresh(pos.board, perspective, pos.king_square(perspective))
+            assert np.array_equal(acc[row], expected[0]) and np.array_equal(psqt[row], expected[1])
+    white_to_move = (turns == WHITE)[:, None]
+    psqt, positional = network.output(np.where(white_to_move, white_acc, black_acc),
+                                      np.where(white_to_move, black_acc, white_acc),
+                                      np.where(white_to_move, white_psqt, black_psqt),
+                                      np.where(white_to_move, black_psqt, white_psqt),
+                                      np.count_nonzero(boards, axis=1))
+    assert list(zip(psqt.tolist(), positional.tolist())) == [reference_evaluate(params, pos) for pos in positions]
+
+
+def test_refresh_batch_rejects_kingless_rows(random_network):
+    network, _ = random_network
+    boards = np.array([Position(FENS[0]).board, Position("8/8/4k3/8/8/8/1P6/Q7 w - - 0 1").board])
+    network.refresh_batch(boards, BLACK)
+    with pytest.raises(ValueError):
+        network.refresh_batch(boards, WHITE)
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_incremental_matches_from_scratch(random_network, fen):
+    # Random games, with null moves, through the accumulators make/unmake keep
+    network, _ = random_network
+    rng = random.Random(fen)
+    pos = Position(fen)
+    pos.accumulators = network.new_accumulators(pos)
+    start = pos.accumulators.output(pos)
+    for _ in range(30):
+        moves = generate_legal(pos)
+        if not moves:
+            break
+        if rng.random() < 0.1 and not pos.is_check():
+            pos.make_null_move()
+            assert pos.accumulators.output(pos) == network.evaluate(pos)
+            pos.unmake_null_move()
+        pos.make_move(rng.choice(moves))
+        assert pos.accumulators.output(pos) == network.evaluate(pos), pos.fen()
+    while pos._undo_stack:
+        pos.unmake_move()
+    assert pos.accumulators.output(pos) == start == network.evaluate(pos)
+
+
+@pytest.mark.parametrize("fen, value, centipawns", [
+    # 58 points of material, the model's anchor: a = 377.43, so 377 is just under a pawn
+    ("rnb1kbnr/ppppppp1/8/8/8/8/1PPPPPPP/RNB1KBNR w KQkq - 0 1", 377, 100),
+    ("rnb1kbnr/ppppppp1/8/8/8/8/1PPPPPPP/RNB1KBNR w KQkq - 0 1", -500, -132),
+    # The start position, 78 points: a = 378.49
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 208, 55),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 1000, 264),
+    # Below the fitted range material is clamped to 17: a = 379.21
+    ("8/8/4k3/8/2q5/8/1K6/8 b - - 0 1", 100, 26),
+])
+def test_to_centipawns(fen, value, centipawns):
+    # UCIEngine::to_cp: round(100 * v / a), a from the win rate model's cubic in material
+    assert to_centipawns(value, Position(fen)) == centipawns
+
+
+def _stockfish_nnue_eval(stockfish, net_path, fen):
+    # The white-side 'NNUE evaluation' line of Stockfish's eval command, in centipawns
+    commands = f"uci\nsetoption name EvalFile value {net_path}\nposition fen {fen}\neval\nquit\n"
+    output = subprocess.run([stockfish], input=commands, capture_output=True, text=True, timeout=30).stdout
+    for line in output.splitlines():
+        if line.startswith('NNUE evaluation'):
+            return round(float(line.split()[2]) * 100)
+    return None
+
+
+@pytest.mark.skipif(not (os.environ.get('STOCKFISH') and os.environ.get('NNUE_FILE')),
+                    reason="set STOCKFISH and NNUE_FILE to compare with a Stockfish binary")
+@pytest.mark.parametrize("fen", [fen for fen in FENS if not Position(fen).is_check()])
+def test_matches_stockfish(fen):
+    net_path = os.path.abspath(os.environ['NNUE_FILE'])
+    network, pos = Network(net_path), Position(fen)
+    psqt, positional = network.evaluate(pos)
+    ours = to_centipawns(psqt + positional, pos) * (1 if pos.turn == WHITE else -1)
+    assert ours == _stockfish_nnue_eval(os.environ['STOCKFISH'], net_path, fen)
+
+
+@pytest.mark.parametrize("fen", ["8/8/4k3/8/8/8/1P6/Q7 w - - 0 1", "8/8/8/8/2q5/8/1K6/8 b - - 0 1"])
+def test_kingless_positions_keep_the_classical_evaluation(random_network, fen):
+    # The position editor can set these up; the network's features need both kings
+    network, _ = random_network
+    pos = Position(fen)
+    classical = evaluate(pos)
+    assert network.new_accumulators(pos) is None
+    with pytest.raises(ValueError):
+        network.evaluate(pos)
+    result = Searcher(network=network).search(pos, max_depth=2)
+    assert result.move in generate_legal(pos)
+    pos.accumulators = network.new_accumulators(pos)
+    assert evaluate(pos) == classical
@@ -0,0 +1,117 @@
+# -- Position, move generation and perft --
+# Node counts are the published perft results (chessprogramming.org, "Perft
+# Results"); keys are the worked examples of the Polyglot book format.
+import random
+
+import pytest
+
+from bitboard import move_uci
+from movegen import generate_legal
+from perft import KIWIPETE_SUITE, perft, divide, parallel_divide
+from position import Position
+from zobrist import position_key
+from evaluate import psq_totals
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+def play(pos, uci_moves):
+    for uci in uci_moves.split():
+        pos.make_move(next(move for move in generate_legal(pos) if move_uci(move) == uci))
+    return pos
+
+
+def state(pos):
+    return (pos.fen(), pos.key, pos.board[:], pos.by_type[:], pos.by_color[:], pos.castling, pos.ep_square,
+            pos.psq_mg, pos.psq_eg, pos.phase)
+
+
+# --- Perft ---
+@pytest.mark.parametrize("depth, nodes", [(1, 20), (2, 400), (3, 8902), (4, 197281)])
+def test_perft_start(depth, nodes):
+    assert perft(Position(START), depth) == nodes
+
+
+@pytest.mark.parametrize("depth, nodes", [(1, 48), (2, 2039), (3, 97862)])
+def test_perft_kiwipete(depth, nodes):
+    assert perft(Position(KIWIPETE), depth) == nodes
+
+
+@pytest.mark.parametrize("fen, counts", KIWIPETE_SUITE[2:])
+def test_perft_suite(fen, counts):
+    for depth, nodes in enumerate(counts[:3], 1):
+        assert perft(Position(fen), depth) == nodes
+
+
+def test_parallel_divide_matches_divide():
+    # d1d8 mates: the second split level has no task for it
+    fen = "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1"
+    assert parallel_divide(Position(fen), 4, workers=8) == divide(Position(fen), 4)
+
+
+# --- Zobrist keys ---
+@pytest.mark.parametrize("moves, key", [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+])
+def test_polyglot_keys(moves, key):
+    pos = play(Position(START), moves)
+    assert pos.key == key
+    assert Position(pos.fen()).key == key
+
+
+# --- Make / unmake ---
+@pytest.mark.parametrize("fen", [fen for fen, _ in KIWIPETE_SUITE])
+def test_make_unmake_round_trip(fen):
+    rng = random.Random(fen)
+    pos = Position(fen)
+    states = []
+    for _ in range(60):
+        moves = generate_legal(pos)
+        if not moves:
+            break
+        states.append(state(pos))
+        pos.make_move(rng.choice(moves))
+        # The incremental key and evaluation sums match a recount
+        assert pos.key == position_key(pos)
+        assert (pos.psq_mg, pos.psq_eg, pos.phase) == psq_totals(pos.board)
+        if not pos.is_check() and rng.random() < 0.2:
+            before = state(pos)
+            pos.make_null_move()
+            pos.unmake_null_move()
+            assert state(pos) == before
+    while states:
+        pos.unmake_move()
+        assert state(pos) == states.pop()
+
+
+# --- Static exchange evaluation ---
+@pytest.mark.parametrize("fen, uci, gain", [
+    # The two worked examples of chessprogramming.org's "SEE - The Swap Algorithm"
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -200),
+    ("4k3/8/8/3r4/8/8/3R4/4K3 w - - 0 1", "d2d5", 500),
+    ("4k3/8/4p3/3r4/8/8/3R4/4K3 w - - 0 1", "d2d5", 0),
+    ("4k3/8/4p3/3p4/8/8/3Q4/4K3 w - - 0 1", "d2d5", -800),
+    # The rook behind joins in once the first one has gone
+    ("4k3/8/4p3/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", -300),
+    ("4k3/8/2p5/3n4/8/4N3/3R4/4K3 w - - 0 1", "e3d5", 100),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),
+    # A promotion gains the queen less the pawn as well as the victim
+    ("1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q", 1300),
+    ("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1", "e1g1", 0),
+])
+def test_see(fen, uci, gain):
+    pos = Position(fen)
+    move = next(move for move in generate_legal(pos) if move_uci(move) == uci)
+    assert pos.see(move) == gain
+    assert pos.see_ge(move) == (gain >= 0)
+    assert pos.see_ge(move, gain) and not pos.see_ge(move, gain + 1)
@@ -0,0 +1,62 @@
+# -- The native search --
+import pytest
+
+from bitboard import MOVE_NONE, move_uci
+from movegen import generate_legal
+from position import Position
+from search import MATE, Searcher
+
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+def test_stop_flag_ends_a_helper_first_iteration():
+    # A parallel helper starts at depth 2; a raised stop flag must end that iteration too
+    searcher = Searcher(hash_mb=1)
+    searcher.stop_flag = [1]
+    result = searcher.search(Position(KIWIPETE), max_depth=8, first_depth=2)
+    assert result.depth == 0 and result.move == MOVE_NONE
+    assert searcher.nodes <= 1024
+
+
+def play(pos, uci):
+    """Make the legal move written uci on pos."""
+    pos.make_move(next(move for move in generate_legal(pos) if move_uci(move) == uci))
+
+
+@pytest.mark.parametrize("fen, plies, pv", [
+    # Back-rank mate
+    ("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", 1, ['a1a8']),
+    # Scholar's mate
+    ("r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4", 1, ['h5f7']),
+    # Rook roller: the king has one square left after Rb7
+    ("7k/8/8/8/8/8/R7/1R4K1 w - - 0 1", 3, ['b1b7', 'h8g8', 'a2a8']),
+])
+def test_finds_mate(fen, plies, pv):
+    result = Searcher(hash_mb=1).search(Position(fen), max_depth=5)
+    assert result.score == MATE - plies and result.is_mate()
+    assert [move_uci(move) for move in result.pv] == pv
+
+
+def test_mated_side_sees_the_mate():
+    pos = Position("7k/8/8/8/8/8/R7/1R4K1 w - - 0 1")
+    play(pos, 'b1b7')
+    result = Searcher(hash_mb=1).search(pos, max_depth=4)
+    assert result.score == -(MATE - 2)
+
+
+def test_repeating_a_game_position_is_a_draw():
+    # A queen down, black can only hold by going back to a position of the game
+    pos = Position("8/8/4k3/8/8/8/1K6/Q7 b - - 0 1")
+    searcher = Searcher(hash_mb=1)
+    assert searcher.search(pos, max_depth=4).score < -500
+    play(pos, 'e6d5')
+    history = {pos.key: 1}
+    pos.unmake_move()
+    result = Searcher(hash_mb=1).search(pos, max_depth=4, history=history)
+    assert move_uci(result.move) == 'e6d5' and result.score == 0
+
+
+def test_fifty_move_rule_is_a_draw():
+    # Any move but a capture or a pawn move ends the game drawn
+    pos = Position("8/8/4k3/8/8/8/1K6/Q7 b - - 99 80")
+    assert Searcher(hash_mb=1).search(pos, max_depth=3).score == 0
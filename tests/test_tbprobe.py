@@ -0,0 +1,60 @@
+# -- Syzygy tablebases --
+# Set SYZYGY_PATH to a directory holding at least the KQvK tables to run the
+# probes; the board conversion is checked against python-chess either way.
+import os
+import random
+
+import chess
+import pytest
+
+from movegen import generate_legal
+from position import Position
+from tbprobe import Tablebases, to_chess_board, WDL_LOSS, WDL_DRAW, WDL_WIN
+
+FENS = [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w - - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+]
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_to_chess_board_matches_fen(fen):
+    # Random games; the fullmove number is not copied, so the FENs are compared without it
+    rng = random.Random(fen)
+    pos = Position(fen)
+    for _ in range(60):
+        moves = generate_legal(pos)
+        if not moves:
+            break
+        pos.make_move(rng.choice(moves))
+        board = to_chess_board(pos)
+        expected = chess.Board(pos.fen())
+        expected.castling_rights = chess.BB_EMPTY
+        assert board.fen().rsplit(' ', 1)[0] == expected.fen().rsplit(' ', 1)[0]
+        assert set(board.legal_moves) == set(expected.legal_moves)
+
+
+@pytest.fixture(scope='module')
+def tablebases():
+    tablebases = Tablebases(os.environ.get('SYZYGY_PATH', ''))
+    if 'KQvK' not in tablebases._tables.wdl:
+        pytest.skip("set SYZYGY_PATH to a directory with the KQvK tables")
+    yield tablebases
+    tablebases.close()
+
+
+@pytest.mark.parametrize("fen, wdl", [
+    ("8/8/4k3/8/8/8/1K6/Q7 w - - 0 1", WDL_WIN),
+    ("8/8/4k3/8/8/8/1K6/Q7 b - - 0 1", WDL_LOSS),
+    # Black takes the hanging queen
+    ("8/8/8/8/8/8/1q6/K3k3 w - - 0 1", WDL_DRAW),
+])
+def test_kqk_wdl(tablebases, fen, wdl):
+    hits = tablebases.hits
+    assert tablebases.probe_wdl(Position(fen)) == wdl
+    assert tablebases.hits == hits + 1
+
+
+def test_castling_is_not_covered(tablebases):
+    assert tablebases.probe_wdl(Position("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1")) is None
@@ -0,0 +1,75 @@
+# -- Transposition table --
+from multiprocessing import shared_memory
+
+from tt import TranspositionTable, BOUND_UPPER, BOUND_LOWER, BOUND_EXACT
+
+
+def keys_in_bucket(count, bucket=5):
+    """count distinct keys that all index one bucket (bucket indices are the low bits)."""
+    return [bucket + (n << 40) for n in range(1, count + 1)]
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    key = 0x1234_5678_9ABC_DEF0
+    assert table.probe(key) is None
+    table.store(key, 6, BOUND_EXACT, -150, 0x0F1C)
+    assert table.probe(key) == (6, BOUND_EXACT, -150, 0x0F1C)
+    # Same bucket, another position: no false hit on the full key
+    assert table.probe(key ^ (1 << 63)) is None
+    assert (table.probes, table.hits, table.stores) == (3, 1, 1)
+
+
+def test_update_keeps_the_best_move():
+    table = TranspositionTable(1)
+    table.store(77, 3, BOUND_LOWER, 40, 0x0123)
+    table.store(77, 5, BOUND_UPPER, -10)
+    assert table.probe(77) == (5, BOUND_UPPER, -10, 0x0123)
+    assert table.collisions == 0
+
+
+def test_bucket_replacement():
+    table = TranspositionTable(1)
+    deep, shallow, other, deeper = keys_in_bucket(4)
+    table.store(deep, 8, BOUND_EXACT, 1)
+    # The depth-preferred slot holds on to the deeper entry; the shallow one goes to the other slot
+    table.store(shallow, 2, BOUND_EXACT, 2)
+    assert table.probe(deep) and table.probe(shallow)
+    # The always-replace slot gives way to the next shallow entry
+    table.store(other, 3, BOUND_EXACT, 3)
+    assert table.probe(deep) and table.probe(shallow) is None and table.probe(other)
+    assert table.collisions == 1
+    # A search at least as deep takes the depth-preferred slot
+    table.store(deeper, 8, BOUND_EXACT, 4)
+    assert table.probe(deep) is None and table.probe(deeper) == (8, BOUND_EXACT, 4, 0)
+
+
+def test_old_entries_give_way():
+    table = TranspositionTable(1)
+    deep, shallow = keys_in_bucket(2)
+    table.store(deep, 10, BOUND_EXACT, 1)
+    table.new_search()
+    table.store(shallow, 1, BOUND_EXACT, 2)
+    assert table.probe(deep) is None and table.probe(shallow)
+
+
+def test_clear():
+    table = TranspositionTable(1)
+    table.store(99, 4, BOUND_EXACT, 0)
+    table.clear()
+    assert table.probe(99) is None and table.hashfull() == 0
+
+
+def test_shared_buffer():
+    size = TranspositionTable.buffer_size(1)
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        writer = TranspositionTable(1, memory.buf)
+        reader = TranspositionTable(1, memory.buf)
+        writer.store(1234, 7, BOUND_LOWER, 55, 0x0AAA)
+        assert reader.probe(1234) == (7, BOUND_LOWER, 55, 0x0AAA)
+        writer.release()
+        reader.release()
+    finally:
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,127 @@
+# -- Transposition table --
+# A fixed-size cache of search results, after stockfish/src/tt.cpp: entries
+# hold (key, depth, bound, score, move) in flat arrays grouped into buckets,
+# and a generation number ages out entries from earlier searches. The arrays
+# are typed views of one buffer, which may be shared memory (see smp.py).
+from bitboard import MOVE_NONE
+
+# Bound types, as in Stockfish: what a stored score says about the true value
+BOUND_NONE, BOUND_UPPER, BOUND_LOWER, BOUND_EXACT = 0, 1, 2, 3
+
+
+class TranspositionTable:
+    """Search results keyed by position, in a table that never grows.
+
+    Each bucket has two slots. The first is depth-preferred: it is only
+    replaced by a search at least as deep, or when its entry is left over
+    from an earlier search. The second is always replaced. Full keys are
+    stored, so a probe never returns another position's entry; `collisions`
+    counts stores that evicted a different position.
+
+    Pass `buffer` (at least buffer_size(size_mb) bytes, zeroed) to keep the
+    entries there instead of in memory of the table's own. Processes sharing
+    a buffer write to it without locks: like Stockfish, the search copes
+    with the odd torn entry, since a stored move is only played if legal.
+    """
+    ENTRY_BYTES = 8 + 2 + 2 + 1 + 1 + 1  # key, move, score, depth, bound, generation
+    # Field formats and sizes, widest first so every view stays aligned
+    _FIELDS = (('keys', 'Q', 8), ('moves', 'H', 2), ('scores', 'h', 2), ('depths', 'b', 1), ('bounds', 'B', 1),
+               ('generations', 'B', 1))
+
+    def __init__(self, size_mb=16, buffer=None):
+        self.resize(size_mb, buffer)
+
+    @classmethod
+    def _slots_for(cls, size_mb):
+        buckets = 1
+        while buckets * 4 * cls.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        return 2 * buckets
+
+    @classmethod
+    def buffer_size(cls, size_mb):
+        """Bytes a table of size_mb megabytes keeps its entries in."""
+        return cls._slots_for(size_mb) * cls.ENTRY_BYTES
+
+    def resize(self, size_mb, buffer=None):
+        self.size_mb = size_mb
+        slots = self._slots_for(size_mb)
+        self.mask = slots // 2 - 1
+        self._views = []
+        view = memoryview(buffer if buffer is not None else bytearray(slots * self.ENTRY_BYTES))
+        offset = 0
+        for name, fmt, size in self._FIELDS:
+            field = view[offset:offset + slots * size].cast(fmt)
+            setattr(self, name, field)
+            self._views.append(field)
+            offset += slots * size
+        self._views.append(view)
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def clear(self):
+        """Empty every slot, in place so a shared buffer stays shared."""
+        view = self._views[-1]
+        view[:self.entries * self.ENTRY_BYTES] = bytes(self.entries * self.ENTRY_BYTES)
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def release(self):
+        """Drop the views onto the buffer (shared memory cannot close while they exist)."""
+        for view in self._views:
+            view.release()
+        self._views = []
+
+    def new_search(self):
+        """Start a new search: entries stored before now count as old."""
+        self.generation = (self.generation + 1) & 255
+
+    def probe(self, key):
+        """(depth, bound, score, move) stored for key, or None."""
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        keys, bounds = self.keys, self.bounds
+        for i in (slot, slot + 1):
+            if keys[i] == key and bounds[i]:
+                self.hits += 1
+                return self.depths[i], bounds[i], self.scores[i], self.moves[i]
+        return None
+
+    def store(self, key, depth, bound, score, move=MOVE_NONE):
+        slot = (key & self.mask) << 1
+        keys, depths, bounds, generations = self.keys, self.depths, self.bounds, self.generations
+        # The same position is updated in place wherever it sits
+        if keys[slot + 1] == key and bounds[slot + 1]:
+            slot += 1
+        elif not (keys[slot] == key or not bounds[slot] or depth >= depths[slot]
+                  or generations[slot] != self.generation):
+            slot += 1
+        if keys[slot] == key:
+            if not move:
+                move = self.moves[slot]  # keep the old best move if this search found none
+        elif bounds[slot]:
+            self.collisions += 1
+        keys[slot] = key
+        depths[slot] = depth
+        bounds[slot] = bound
+        self.scores[slot] = score
+        self.moves[slot] = move
+        generations[slot] = self.generation
+        self.stores += 1
+
+    @property
+    def entries(self):
+        return len(self.keys)
+
+    @property
+    def memory_bytes(self):
+        return self.entries * self.ENTRY_BYTES
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def hashfull(self):
+        """Permille of the first 1000 slots used by the current search, as UCI reports it."""
+        sample = min(1000, self.entries)
+        return sum(1 for i in range(sample)
+                   if self.bounds[i] and self.generations[i] == self.generation) * 1000 // sample
@@ -0,0 +1,55 @@
+# -- Zobrist keys --
+# The random numbers are Polyglot's, so a key computed here is also the key
+# Polyglot opening books are indexed by.
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY
+
+from bitboard import WHITE, BLACK, PAWN, KING, PAWN_ATTACKS, make_piece
+
+# ZOBRIST_PSQ[piece code][square]; Polyglot orders kinds black pawn, white pawn, black knight, ...
+ZOBRIST_PSQ = [[0] * 64 for _ in range(16)]
+for _color in (WHITE, BLACK):
+    for _piece_type in range(PAWN, KING + 1):
+        _kind = (_piece_type - 1) * 2 + (_color == WHITE)
+        ZOBRIST_PSQ[make_piece(_color, _piece_type)] = POLYGLOT_RANDOM_ARRAY[64 * _kind:64 * _kind + 64]
+del _color, _piece_type, _kind
+
+# ZOBRIST_CASTLING[rights] for every combination of the four castling bits
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            ZOBRIST_CASTLING[_rights] ^= POLYGLOT_RANDOM_ARRAY[768 + _bit]
+del _rights, _bit
+
+ZOBRIST_EP = POLYGLOT_RANDOM_ARRAY[772:780]
+# Polyglot hashes this in when white is to move
+ZOBRIST_WHITE = POLYGLOT_RANDOM_ARRAY[780]
+
+
+def ep_counts(board, ep_square, us):
+    """Whether an en-passant square enters the key: only if a pawn of `us` can take.
+
+    `board` is a 64-entry mailbox of piece codes, as in Position.board.
+    """
+    own_pawn = make_piece(us, PAWN)
+    attackers = PAWN_ATTACKS[us ^ 1][ep_square]
+    while attackers:
+        bb = attackers & -attackers
+        if board[bb.bit_length() - 1] == own_pawn:
+            return True
+        attackers ^= bb
+    return False
+
+
+def position_key(pos):
+    """Key of a Position computed from scratch."""
+    key = 0
+    for sq, piece in enumerate(pos.board):
+        if piece:
+            key ^= ZOBRIST_PSQ[piece][sq]
+    key ^= ZOBRIST_CASTLING[pos.castling]
+    if pos.ep_square is not None and ep_counts(pos.board, pos.ep_square, pos.turn):
+        key ^= ZOBRIST_EP[pos.ep_square & 7]
+    if pos.turn == WHITE:
+        key ^= ZOBRIST_WHITE
+    return key